@@ -1,23 +1,36 @@
+import base64
 from datetime import datetime, timezone, timedelta
+from functools import lru_cache
+from typing import Iterator, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Row, Select, bindparam, insert, tuple_
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import Session, select
 
-from app.api.auth import get_current_user
-from app.models.entities import Activity, Pet, User
-from app.schemas.activity import ActivityCreate, ActivityRead
+from app.api.auth import Principal, get_current_principal
+from app.models.entities import Activity, ActivityType, Pet
+from app.schemas.activity import (
+    ActivityBatchCreate,
+    ActivityBatchItemResult,
+    ActivityBatchResponse,
+    ActivityCreate,
+    ActivityPage,
+    ActivityRead,
+)
+from app.services import archive
+from app.services.live import publish_daily
+from app.services.rollups import record_activities, record_activity
 from app.utils.db import get_session
+from app.utils.profiling import InstrumentedRoute
+from app.utils.responses import JSONBytesResponse, dumps_lines
 
 
-router = APIRouter()
+router = APIRouter(route_class=InstrumentedRoute)
 
 
-@router.post("", response_model=ActivityRead)
-def create_activity(
-    payload: ActivityCreate,
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user),
-):
+def _build_activity(payload: ActivityCreate, user_id: int) -> Activity:
     # normalize to UTC to avoid naive/aware compare issues
     started_at = (
         payload.started_at
@@ -39,30 +52,331 @@ def create_activity(
     if ended_at < started_at:
         ended_at = started_at
 
-    if payload.pet_id:
-        pet = session.get(Pet, payload.pet_id)
-        if not pet or pet.user_id != current_user.id:
-            raise HTTPException(status_code=404, detail="Pet not found")
-
-    activity = Activity(
-        user_id=current_user.id,
+    return Activity(
+        user_id=user_id,
         started_at=started_at.replace(tzinfo=None),
         ended_at=ended_at.replace(tzinfo=None),
         **payload.dict(exclude={"started_at", "ended_at"}),
     )
 
-    session.add(activity)
-    session.commit()
+
+def _stored_activity(session: Session, user_id: int, key: str) -> Optional[Activity]:
+    return session.exec(
+        select(Activity).where(
+            Activity.user_id == user_id, Activity.idempotency_key == key
+        )
+    ).first()
+
+
+def add_activity(session: Session, payload: ActivityCreate, user_id: int) -> Activity:
+    if payload.idempotency_key:
+        existing = _stored_activity(session, user_id, payload.idempotency_key)
+        if existing:
+            return existing
+
+    if payload.pet_id:
+        pet = session.get(Pet, payload.pet_id)
+        if not pet or pet.user_id != user_id:
+            raise HTTPException(status_code=404, detail="Pet not found")
+
+    activity = _build_activity(payload, user_id)
+    try:
+        session.add(activity)
+        day = record_activity(session, activity).date
+        session.commit()
+    except IntegrityError:
+        # a concurrent request with the same key won the insert; answer with
+        # the row it stored, as a retry after it would have been
+        session.rollback()
+        if payload.idempotency_key:
+            existing = _stored_activity(session, user_id, payload.idempotency_key)
+            if existing:
+                return existing
+        raise
     session.refresh(activity)
+    publish_daily(session, user_id, [day])
     return activity
 
 
-@router.get("", response_model=list[ActivityRead])
+@router.post("", response_model=ActivityRead)
+def create_activity(
+    payload: ActivityCreate,
+    session: Session = Depends(get_session),
+    current_user: Principal = Depends(get_current_principal),
+):
+    return add_activity(session, payload, current_user.id)
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+STREAM_BATCH_SIZE = 500
+
+
+def _encode_cursor(activity: Activity | Row) -> str:
+    raw = f"{activity.started_at.isoformat()}|{activity.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        started_at, activity_id = (
+            base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        )
+        return datetime.fromisoformat(started_at), int(activity_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _naive_utc(value: datetime) -> datetime:
+    if value.tzinfo:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+# ActivityRead's fields, selected as plain columns: no ORM identity map,
+# no relationship machinery and no from_attributes validation on the way out
+ACTIVITY_COLUMNS = tuple(
+    getattr(Activity, field) for field in ActivityRead.model_fields
+)
+
+
+def _stream_ndjson(
+    bind, query, params: dict, archived: bool = False, ascending: bool = False
+) -> Iterator[bytes]:
+    # own session so the cursor outlives the request-scoped one
+    with Session(bind) as session:
+        rows = session.execute(
+            query, params, execution_options={"yield_per": STREAM_BATCH_SIZE}
+        )
+        batches = rows.partitions()
+        if archived:
+            batches = archive.merged_batches(
+                bind, batches, params, STREAM_BATCH_SIZE, ascending
+            )
+        for batch in batches:
+            yield dumps_lines(row._asdict() for row in batch)
+
+
+@lru_cache(maxsize=None)
+def _activities_statement(
+    direction: Optional[str],
+    typed: bool,
+    by_pet: bool,
+    since: bool,
+    until: bool,
+    limited: bool,
+):
+    # one statement per filter shape, built once; values are bound per request
+    query = select(*ACTIVITY_COLUMNS).where(Activity.user_id == bindparam("user_id"))
+    if typed:
+        query = query.where(Activity.type.in_(bindparam("types", expanding=True)))
+    if by_pet:
+        query = query.where(Activity.pet_id == bindparam("pet_id"))
+    if since:
+        query = query.where(Activity.started_at >= bindparam("start"))
+    if until:
+        query = query.where(Activity.started_at < bindparam("end"))
+
+    # keyset on (started_at, id); newest first
+    key = tuple_(Activity.started_at, Activity.id)
+    cursor = tuple_(bindparam("cursor_at"), bindparam("cursor_id"))
+    if direction == "before":
+        query = query.where(key < cursor)
+    if direction == "after":
+        query = query.where(key > cursor)
+        query = query.order_by(Activity.started_at, Activity.id)
+    else:
+        query = query.order_by(Activity.started_at.desc(), Activity.id.desc())
+    if limited:
+        query = query.limit(bindparam("limit"))
+    return query
+
+
+def activities_query(
+    user_id: int,
+    before: Optional[str],
+    after: Optional[str],
+    types: Optional[list[ActivityType]],
+    pet_id: Optional[int],
+    start: Optional[datetime],
+    end: Optional[datetime],
+    limit: Optional[int] = None,
+) -> tuple[Select, dict]:
+    """The cached column-only statement for these filters, and its parameters."""
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either before or after")
+
+    params: dict = {"user_id": user_id}
+    if types:
+        params["types"] = list(types)
+    if pet_id is not None:
+        params["pet_id"] = pet_id
+    if start is not None:
+        params["start"] = _naive_utc(start)
+    if end is not None:
+        params["end"] = _naive_utc(end)
+    if before or after:
+        params["cursor_at"], params["cursor_id"] = _decode_cursor(before or after)
+    if limit is not None:
+        params["limit"] = limit
+    direction = "before" if before else "after" if after else None
+    query = _activities_statement(
+        direction,
+        bool(types),
+        pet_id is not None,
+        start is not None,
+        end is not None,
+        limit is not None,
+    )
+    return query, params
+
+
+def activities_page(
+    rows: list[Row],
+    page_size: int,
+    before: Optional[str],
+    after: Optional[str],
+) -> JSONBytesResponse:
+    # rows were fetched with page_size + 1 to learn whether more exist
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if after:
+        rows.reverse()
+
+    older = has_more or bool(after)
+    newer = bool(before) or (bool(after) and has_more)
+    return JSONBytesResponse(
+        {
+            "items": [row._asdict() for row in rows],
+            "next_cursor": _encode_cursor(rows[-1]) if rows and older else None,
+            "prev_cursor": _encode_cursor(rows[0]) if rows and newer else None,
+        }
+    )
+
+
+@router.get("", response_model=ActivityPage)
 def list_activities(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    types: Optional[list[ActivityType]] = Query(None, alias="type"),
+    pet_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    output: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+    session: Session = Depends(get_session),
+    current_user: Principal = Depends(get_current_principal),
+):
+    ascending = bool(after)
+    if output == "ndjson":
+        query, params = activities_query(
+            current_user.id, before, after, types, pet_id, start, end, limit
+        )
+        archived = archive.reaches_archive(
+            current_user.archived_before, params, ascending
+        )
+        return StreamingResponse(
+            _stream_ndjson(session.get_bind(), query, params, archived, ascending),
+            media_type="application/x-ndjson",
+        )
+
+    page_size = limit or DEFAULT_PAGE_SIZE
+    query, params = activities_query(
+        current_user.id, before, after, types, pet_id, start, end, page_size + 1
+    )
+    rows = session.execute(query, params).all()
+    if archive.reaches_archive(
+        current_user.archived_before, params, ascending, rows, page_size + 1
+    ):
+        rows = archive.merge_page(session, rows, params, ascending, page_size + 1)
+    return activities_page(list(rows), page_size, before, after)
+
+
+def ingest_batch(
+    session: Session, payload: ActivityBatchCreate, user_id: int
+) -> ActivityBatchResponse:
+    try:
+        return _ingest_batch(session, payload, user_id)
+    except IntegrityError:
+        if not any(item.idempotency_key for item in payload.items):
+            raise
+        # a concurrent request stored one of the keys between the lookup and
+        # the insert; nothing was written, so run again and let the lookup
+        # report those items as duplicates
+        session.rollback()
+        return _ingest_batch(session, payload, user_id)
+
+
+def _ingest_batch(
+    session: Session, payload: ActivityBatchCreate, user_id: int
+) -> ActivityBatchResponse:
+    # one ownership query and one idempotency lookup for the whole batch
+    owned_pets: set[int] = set()
+    pet_ids = {item.pet_id for item in payload.items if item.pet_id}
+    if pet_ids:
+        owned_pets = set(
+            session.exec(
+                select(Pet.id).where(Pet.id.in_(pet_ids), Pet.user_id == user_id)
+            ).all()
+        )
+    known_keys: dict[str, int] = {}
+    keys = {item.idempotency_key for item in payload.items if item.idempotency_key}
+    if keys:
+        known_keys = dict(
+            session.exec(
+                select(Activity.idempotency_key, Activity.id).where(
+                    Activity.user_id == user_id,
+                    Activity.idempotency_key.in_(keys),
+                )
+            ).all()
+        )
+
+    results: list[Optional[ActivityBatchItemResult]] = [None] * len(payload.items)
+    pending: list[tuple[int, Activity]] = []
+    batch_keys: dict[str, int] = {}
+    for index, item in enumerate(payload.items):
+        key = item.idempotency_key
+        if key in known_keys:
+            results[index] = ActivityBatchItemResult(
+                index=index, status="duplicate", id=known_keys[key]
+            )
+        elif key in batch_keys:
+            # resolved to the first occurrence's id after the insert
+            results[index] = ActivityBatchItemResult(index=index, status="duplicate")
+        elif item.pet_id and item.pet_id not in owned_pets:
+            results[index] = ActivityBatchItemResult(
+                index=index, status="error", detail="Pet not found"
+            )
+        else:
+            if key:
+                batch_keys[key] = index
+            pending.append((index, _build_activity(item, user_id)))
+
+    if pending:
+        rows = [activity.model_dump(exclude={"id"}) for _, activity in pending]
+        ids = session.exec(
+            insert(Activity).returning(Activity.id, sort_by_parameter_order=True),
+            params=rows,
+        ).scalars().all()
+        for (index, activity), activity_id in zip(pending, ids):
+            activity.id = activity_id
+            results[index] = ActivityBatchItemResult(
+                index=index, status="created", id=activity_id
+            )
+        days = list(record_activities(session, user_id, [act for _, act in pending]))
+        session.commit()
+        publish_daily(session, user_id, days)
+
+    for index, item in enumerate(payload.items):
+        if results[index].status == "duplicate" and results[index].id is None:
+            results[index].id = results[batch_keys[item.idempotency_key]].id
+    return ActivityBatchResponse(created=len(pending), results=results)
+
+
+@router.post("/batch", response_model=ActivityBatchResponse)
+def create_activities_batch(
+    payload: ActivityBatchCreate,
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
-    items = session.exec(
-        select(Activity).where(Activity.user_id == current_user.id).order_by(Activity.started_at.desc())
-    ).all()
-    return items
+    return ingest_batch(session, payload, current_user.id)
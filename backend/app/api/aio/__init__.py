@@ -0,0 +1 @@
+from app.api.aio import activities, auth, pets, stats  # noqa: F401
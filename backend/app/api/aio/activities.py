@@ -0,0 +1,164 @@
+from datetime import datetime
+from itertools import islice
+from operator import attrgetter
+from typing import AsyncIterator, Optional
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.api.aio.auth import get_current_principal
+from app.api.activities import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    STREAM_BATCH_SIZE,
+    activities_page,
+    activities_query,
+    add_activity,
+    ingest_batch,
+)
+from app.api.auth import Principal
+from app.models.entities import ActivityType
+from app.schemas.activity import (
+    ActivityBatchCreate,
+    ActivityBatchResponse,
+    ActivityCreate,
+    ActivityPage,
+    ActivityRead,
+)
+from app.services import archive
+from app.utils.db import get_async_session
+from app.utils.profiling import InstrumentedRoute
+from app.utils.responses import dumps_lines
+
+
+router = APIRouter(route_class=InstrumentedRoute)
+
+
+async def _stream_ndjson(bind, query, params: dict) -> AsyncIterator[bytes]:
+    # own session so the cursor outlives the request-scoped one
+    async with AsyncSession(bind) as session:
+        result = await session.stream(
+            query, params, execution_options={"yield_per": STREAM_BATCH_SIZE}
+        )
+        async for batch in result.partitions():
+            yield dumps_lines(row._asdict() for row in batch)
+
+
+async def _archived_batches(
+    bind, params: dict, ascending: bool
+) -> AsyncIterator[list]:
+    # blocks are decoded on the sync side, one batch per hop onto it
+    async with AsyncSession(bind) as session:
+        rows = archive.archived_activities(session.sync_session, params, ascending)
+        while batch := await session.run_sync(
+            lambda _: list(islice(rows, STREAM_BATCH_SIZE))
+        ):
+            yield batch
+
+
+async def _rows(batches: AsyncIterator[list]) -> AsyncIterator:
+    async for batch in batches:
+        for row in batch:
+            yield row
+
+
+async def _merge_rows(hot, archived, ascending: bool) -> AsyncIterator:
+    # archive.merge_rows for async row streams, both in listing order
+    key = attrgetter("started_at", "id")
+    left, right = await anext(hot, None), await anext(archived, None)
+    while left is not None and right is not None:
+        if (key(left) < key(right)) == ascending:
+            yield left
+            left = await anext(hot, None)
+        else:
+            yield right
+            right = await anext(archived, None)
+    rest, row = (hot, left) if left is not None else (archived, right)
+    while row is not None:
+        yield row
+        row = await anext(rest, None)
+
+
+async def _stream_merged_ndjson(
+    bind, query, params: dict, ascending: bool
+) -> AsyncIterator[bytes]:
+    # live and archived rows are both read a batch at a time and merged as
+    # they arrive, so memory stays bounded however much history matches
+    async with AsyncSession(bind) as session:
+        result = await session.stream(
+            query, params, execution_options={"yield_per": STREAM_BATCH_SIZE}
+        )
+        rows = _merge_rows(
+            _rows(result.partitions()),
+            _rows(_archived_batches(bind, params, ascending)),
+            ascending,
+        )
+        remaining = params.get("limit")
+        batch = []
+        async for row in rows:
+            batch.append(row)
+            if remaining is not None:
+                remaining -= 1
+            if len(batch) == STREAM_BATCH_SIZE or remaining == 0:
+                yield dumps_lines(row._asdict() for row in batch)
+                batch = []
+            if remaining == 0:
+                break
+        if batch:
+            yield dumps_lines(row._asdict() for row in batch)
+
+
+@router.post("", response_model=ActivityRead)
+async def create_activity(
+    payload: ActivityCreate,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: Principal = Depends(get_current_principal),
+):
+    return await session.run_sync(add_activity, payload, current_user.id)
+
+
+@router.get("", response_model=ActivityPage)
+async def list_activities(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    types: Optional[list[ActivityType]] = Query(None, alias="type"),
+    pet_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    output: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+    session: AsyncSession = Depends(get_async_session),
+    current_user: Principal = Depends(get_current_principal),
+):
+    ascending = bool(after)
+    if output == "ndjson":
+        query, params = activities_query(
+            current_user.id, before, after, types, pet_id, start, end, limit
+        )
+        stream = _stream_ndjson(session.bind, query, params)
+        if archive.reaches_archive(current_user.archived_before, params, ascending):
+            stream = _stream_merged_ndjson(session.bind, query, params, ascending)
+        return StreamingResponse(stream, media_type="application/x-ndjson")
+
+    page_size = limit or DEFAULT_PAGE_SIZE
+    query, params = activities_query(
+        current_user.id, before, after, types, pet_id, start, end, page_size + 1
+    )
+    rows = (await session.execute(query, params)).all()
+    if archive.reaches_archive(
+        current_user.archived_before, params, ascending, rows, page_size + 1
+    ):
+        rows = await session.run_sync(
+            archive.merge_page, rows, params, ascending, page_size + 1
+        )
+    return activities_page(list(rows), page_size, before, after)
+
+
+@router.post("/batch", response_model=ActivityBatchResponse)
+async def create_activities_batch(
+    payload: ActivityBatchCreate,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: Principal = Depends(get_current_principal),
+):
+    return await session.run_sync(ingest_batch, payload, current_user.id)
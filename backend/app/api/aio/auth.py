@@ -0,0 +1,172 @@
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.security import OAuth2PasswordRequestForm
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.api.auth import (
+    Principal,
+    _access_claims,
+    _check_user,
+    _update_user,
+    create_tokens,
+    known_users,
+    oauth2_scheme,
+)
+from app.auth.security import (
+    decode_token,
+    get_password_hash,
+    verify_and_update_password,
+)
+from app.models.entities import User
+from app.schemas.auth import (
+    LoginRequest,
+    SignupRequest,
+    TokenResponse,
+    UserRead,
+    UserUpdate,
+)
+from app.utils import db
+from app.utils.db import get_async_session
+from app.utils.profiling import InstrumentedRoute, section
+from app.utils.settings import settings
+from app.utils.workers import cpu_pool
+
+
+router = APIRouter(route_class=InstrumentedRoute)
+
+
+async def authenticate_user(
+    session: AsyncSession, email: str, password: str
+) -> User | None:
+    user = (await session.exec(select(User).where(User.email == email))).first()
+    if not user:
+        return None
+    with section("password_hash"):
+        valid, new_hash = await cpu_pool.run(
+            verify_and_update_password, password, user.password_hash
+        )
+    if not valid:
+        return None
+    if new_hash:
+        user.password_hash = new_hash
+        session.add(user)
+        await session.commit()
+    return user
+
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    session: AsyncSession = Depends(get_async_session),
+) -> User:
+    with section("auth"):
+        user_id, token_version = _access_claims(token)
+        return _check_user(await session.get(User, user_id), token_version)
+
+
+async def get_current_principal(
+    token: str = Depends(oauth2_scheme),
+    session: AsyncSession = Depends(get_async_session),
+) -> Principal:
+    with section("auth"):
+        user_id, token_version = _access_claims(token)
+        known = known_users.get(user_id) if settings.auth_stateless else None
+        if known is not None and known.token_version == token_version:
+            return known
+        user = await session.get(User, user_id)
+        return Principal.of(_check_user(user, token_version))
+
+
+async def get_read_session(
+    token: str = Depends(oauth2_scheme),
+    session: AsyncSession = Depends(get_async_session),
+):
+    user_id, _ = _access_claims(token)
+    if db.reads_from_primary(user_id):
+        yield session
+        return
+    async with AsyncSession(db.async_read_engine, expire_on_commit=False) as replica:
+        yield replica
+
+
+@router.post("/signup", response_model=UserRead)
+async def signup(
+    payload: SignupRequest, session: AsyncSession = Depends(get_async_session)
+):
+    existing = (
+        await session.exec(select(User).where(User.email == payload.email))
+    ).first()
+    if existing:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    with section("password_hash"):
+        password_hash = await cpu_pool.run(get_password_hash, payload.password)
+    user = User(
+        email=payload.email, password_hash=password_hash, timezone=payload.timezone
+    )
+    session.add(user)
+    await session.commit()
+    await session.refresh(user)
+    return user
+
+
+@router.post("/login", response_model=TokenResponse)
+async def login(
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    session: AsyncSession = Depends(get_async_session),
+):
+    user = await authenticate_user(session, form_data.username, form_data.password)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    return create_tokens(user)
+
+
+@router.post("/login/json", response_model=TokenResponse)
+async def login_json(
+    payload: LoginRequest, session: AsyncSession = Depends(get_async_session)
+):
+    user = await authenticate_user(session, payload.email, payload.password)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    return create_tokens(user)
+
+
+@router.post("/refresh", response_model=TokenResponse)
+async def refresh_token(
+    token: str, session: AsyncSession = Depends(get_async_session)
+):
+    payload = decode_token(token)
+    if not payload or payload.get("type") != "refresh":
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    user = await session.get(User, int(payload.get("sub")))
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found")
+    if user.token_version != payload.get("ver", 0):
+        raise HTTPException(status_code=401, detail="Token revoked")
+    return create_tokens(user)
+
+
+@router.get("/me", response_model=UserRead)
+async def me(current_user: User = Depends(get_current_user)):
+    return current_user
+
+
+@router.patch("/me", response_model=UserRead)
+async def update_me(
+    payload: UserUpdate,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user),
+):
+    return await session.run_sync(
+        lambda sync_session: _update_user(sync_session, current_user, payload)
+    )
+
+
+@router.post("/revoke", status_code=204)
+async def revoke_tokens(
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user),
+):
+    current_user.token_version += 1
+    session.add(current_user)
+    await session.commit()
+    known_users.invalidate(current_user.id)
+    return Response(status_code=204)
@@ -0,0 +1,38 @@
+from fastapi import APIRouter, Depends
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.api.aio.auth import get_current_principal
+from app.api.auth import Principal
+from app.api.pets import PETS_STATEMENT
+from app.models.entities import Pet
+from app.schemas.pet import PetCreate, PetRead
+from app.services.rollups import bump_data_version
+from app.utils.db import get_async_session
+from app.utils.profiling import InstrumentedRoute
+from app.utils.responses import JSONBytesResponse
+
+
+router = APIRouter(route_class=InstrumentedRoute)
+
+
+@router.post("", response_model=PetRead)
+async def create_pet(
+    payload: PetCreate,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: Principal = Depends(get_current_principal),
+):
+    pet = Pet(user_id=current_user.id, **payload.dict())
+    session.add(pet)
+    await session.run_sync(bump_data_version, current_user.id)
+    await session.commit()
+    await session.refresh(pet)
+    return pet
+
+
+@router.get("", response_model=list[PetRead])
+async def list_pets(
+    session: AsyncSession = Depends(get_async_session),
+    current_user: Principal = Depends(get_current_principal),
+):
+    rows = (await session.execute(PETS_STATEMENT, {"user_id": current_user.id})).all()
+    return JSONBytesResponse([row._asdict() for row in rows])
@@ -0,0 +1,94 @@
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, Depends, Header, Query
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.api.aio.auth import get_current_principal, get_read_session
+from app.api.auth import Principal
+from app.api.stats import (
+    _cache_key,
+    _cached,
+    _parse_date,
+    _parse_range,
+    _series_key,
+    _store,
+)
+from app.models.entities import ActivityType
+from app.schemas.stats import DailyStats, StatsSeriesResponse, WeeklyReportResponse
+from app.services.rollups import data_state, data_version
+from app.services.stats import daily_stats, stats_series, weekly_stats
+from app.utils.profiling import InstrumentedRoute
+
+
+router = APIRouter(route_class=InstrumentedRoute)
+
+
+# the services are written against a sync Session; run_sync drives them over
+# the async driver without a threadpool hop
+
+
+@router.get("/daily", response_model=DailyStats)
+async def daily(
+    date: str = Query(..., alias="date"),
+    if_none_match: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_read_session),
+    current_user: Principal = Depends(get_current_principal),
+):
+    target_date = _parse_date(date)
+    version = await session.run_sync(data_version, current_user.id)
+    key = _cache_key("daily", current_user.id, version, target_date)
+    headers, cached = _cached(key, if_none_match)
+    if cached is not None:
+        return cached
+    result = await session.run_sync(daily_stats, current_user.id, target_date)
+    return _store(key, headers, result)
+
+
+@router.get("/weekly", response_model=WeeklyReportResponse)
+async def weekly(
+    start: str,
+    if_none_match: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_read_session),
+    current_user: Principal = Depends(get_current_principal),
+):
+    start_date = _parse_date(start)
+    version = await session.run_sync(data_version, current_user.id)
+    key = _cache_key("weekly", current_user.id, version, start_date)
+    headers, cached = _cached(key, if_none_match)
+    if cached is not None:
+        return cached
+    result = await session.run_sync(weekly_stats, current_user.id, start_date)
+    return _store(key, headers, result)
+
+
+@router.get("/series", response_model=StatsSeriesResponse)
+async def series(
+    start: str = Query(..., alias="from"),
+    end: str = Query(..., alias="to"),
+    bucket: Literal["day", "week", "month"] = "day",
+    pet_id: Optional[int] = None,
+    types: Optional[List[ActivityType]] = Query(None),
+    if_none_match: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_read_session),
+    current_user: Principal = Depends(get_current_principal),
+):
+    start_date, end_date = _parse_range(start, end, bucket)
+    version, archived_before = await session.run_sync(data_state, current_user.id)
+    key = _series_key(
+        current_user, version, start_date, end_date, bucket, pet_id, types
+    )
+    headers, cached = _cached(key, if_none_match)
+    if cached is not None:
+        return cached
+    result = await session.run_sync(
+        stats_series,
+        current_user.id,
+        start_date,
+        end_date,
+        bucket,
+        pet_id,
+        types,
+        current_user.timezone,
+        archived_before,
+    )
+    return _store(key, headers, result)
@@ -1,6 +1,9 @@
-from datetime import timedelta
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError
 from sqlmodel import Session, select
@@ -8,89 +11,196 @@ from sqlmodel import Session, select
 from app.auth.security import (
     create_token,
     decode_token,
+    decode_token_cached,
     get_password_hash,
-    verify_password,
+    verify_and_update_password,
 )
 from app.models.entities import User
-from app.schemas.auth import LoginRequest, SignupRequest, TokenResponse, UserRead
+from app.schemas.auth import (
+    LoginRequest,
+    SignupRequest,
+    TokenResponse,
+    UserRead,
+    UserUpdate,
+)
+from app.services.rollups import rebucket_user
+from app.utils.cache import TTLCache
+from app.utils import db
 from app.utils.db import get_session
+from app.utils.profiling import InstrumentedRoute, section
 from app.utils.settings import settings
+from app.utils.timezones import DEFAULT_TIMEZONE
+from app.utils.workers import cpu_pool
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
-router = APIRouter()
+router = APIRouter(route_class=InstrumentedRoute)
+
+# user id -> Principal of users recently confirmed to exist
+known_users = TTLCache(settings.auth_user_cache_ttl_seconds)
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated caller as far as the access token says."""
+
+    id: int
+    token_version: int
+    timezone: str = DEFAULT_TIMEZONE
+    # listings only look into the activity archive when this is set
+    archived_before: Optional[datetime] = None
+
+    @classmethod
+    def of(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            token_version=user.token_version,
+            timezone=user.timezone,
+            archived_before=user.archived_before,
+        )
+
 
+def _find_user(session: Session, email: str) -> User | None:
+    return session.exec(select(User).where(User.email == email)).first()
 
-def authenticate_user(session: Session, email: str, password: str) -> User | None:
-    user = session.exec(select(User).where(User.email == email)).first()
-    if not user or not verify_password(password, user.password_hash):
+
+def _rehash(session: Session, user: User, password_hash: str) -> None:
+    # same password, so tokens and caches stay valid; nothing else to bump
+    user.password_hash = password_hash
+    session.add(user)
+    session.commit()
+
+
+def _add_user(session: Session, user: User) -> User:
+    session.add(user)
+    session.commit()
+    session.refresh(user)
+    return user
+
+
+async def authenticate_user(
+    session: Session, email: str, password: str
+) -> User | None:
+    # DB work on the threadpool, hashing on the CPU pool; the loop stays free
+    user = await run_in_threadpool(_find_user, session, email)
+    if not user:
         return None
+    with section("password_hash"):
+        valid, new_hash = await cpu_pool.run(
+            verify_and_update_password, password, user.password_hash
+        )
+    if not valid:
+        return None
+    if new_hash:
+        await run_in_threadpool(_rehash, session, user, new_hash)
     return user
 
 
-def create_tokens(user_id: int) -> TokenResponse:
+def create_tokens(user: User) -> TokenResponse:
+    claims = {"sub": str(user.id), "ver": user.token_version}
     access_token = create_token(
-        {"sub": str(user_id), "type": "access"},
+        {**claims, "type": "access"},
         expires_delta=timedelta(minutes=settings.access_token_expire_minutes),
     )
     refresh_token = create_token(
-        {"sub": str(user_id), "type": "refresh"},
+        {**claims, "type": "refresh"},
         expires_delta=timedelta(minutes=settings.refresh_token_expire_minutes),
     )
     return TokenResponse(access_token=access_token, refresh_token=refresh_token)
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme), session: Session = Depends(get_session)
-) -> User:
-    payload = decode_token(token)
+def _access_claims(token: str) -> tuple[int, int]:
+    payload = decode_token_cached(token)
     if not payload or payload.get("type") != "access":
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token"
         )
     try:
-        user_id = int(payload.get("sub"))
+        return int(payload.get("sub")), int(payload.get("ver", 0))
     except (TypeError, ValueError, JWTError):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token"
         )
-    user = session.get(User, user_id)
+
+
+def _check_user(user: User | None, token_version: int) -> User:
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found"
         )
+    if user.token_version != token_version:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Token revoked"
+        )
+    known_users.set(user.id, Principal.of(user))
     return user
 
 
+async def get_current_user(
+    token: str = Depends(oauth2_scheme), session: Session = Depends(get_session)
+) -> User:
+    with section("auth"):
+        user_id, token_version = _access_claims(token)
+        return _check_user(session.get(User, user_id), token_version)
+
+
+async def get_current_principal(
+    token: str = Depends(oauth2_scheme), session: Session = Depends(get_session)
+) -> Principal:
+    """Like get_current_user, but in stateless mode a recently confirmed user
+    is trusted from the token alone, with no database round trip."""
+    with section("auth"):
+        user_id, token_version = _access_claims(token)
+        known = known_users.get(user_id) if settings.auth_stateless else None
+        if known is not None and known.token_version == token_version:
+            return known
+        user = await run_in_threadpool(session.get, User, user_id)
+        return Principal.of(_check_user(user, token_version))
+
+
+def get_read_session(
+    token: str = Depends(oauth2_scheme), session: Session = Depends(get_session)
+):
+    """Session for read-only routes: the replica when one is configured,
+    unless this user wrote recently and should read their own writes."""
+    user_id, _ = _access_claims(token)
+    if db.reads_from_primary(user_id):
+        yield session
+        return
+    with Session(db.read_engine) as replica:
+        yield replica
+
+
 @router.post("/signup", response_model=UserRead)
-def signup(payload: SignupRequest, session: Session = Depends(get_session)):
-    existing = session.exec(select(User).where(User.email == payload.email)).first()
+async def signup(payload: SignupRequest, session: Session = Depends(get_session)):
+    existing = await run_in_threadpool(_find_user, session, payload.email)
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
-    user = User(email=payload.email, password_hash=get_password_hash(payload.password))
-    session.add(user)
-    session.commit()
-    session.refresh(user)
-    return user
+    with section("password_hash"):
+        password_hash = await cpu_pool.run(get_password_hash, payload.password)
+    user = User(
+        email=payload.email, password_hash=password_hash, timezone=payload.timezone
+    )
+    return await run_in_threadpool(_add_user, session, user)
 
 
 @router.post("/login", response_model=TokenResponse)
-def login(
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
     session: Session = Depends(get_session),
 ):
-    user = authenticate_user(session, form_data.username, form_data.password)
+    user = await authenticate_user(session, form_data.username, form_data.password)
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    return create_tokens(user.id)
+    return create_tokens(user)
 
 
 @router.post("/login/json", response_model=TokenResponse)
-def login_json(payload: LoginRequest, session: Session = Depends(get_session)):
-    user = authenticate_user(session, payload.email, payload.password)
+async def login_json(payload: LoginRequest, session: Session = Depends(get_session)):
+    user = await authenticate_user(session, payload.email, payload.password)
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    return create_tokens(user.id)
+    return create_tokens(user)
 
 
 @router.post("/refresh", response_model=TokenResponse)
@@ -102,9 +212,45 @@ def refresh_token(token: str, session: Session = Depends(get_session)):
     user = session.get(User, user_id)
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
-    return create_tokens(user.id)
+    if user.token_version != payload.get("ver", 0):
+        raise HTTPException(status_code=401, detail="Token revoked")
+    return create_tokens(user)
 
 
 @router.get("/me", response_model=UserRead)
 def me(current_user: User = Depends(get_current_user)):
     return current_user
+
+
+def _update_user(session: Session, user: User, payload: UserUpdate) -> User:
+    if payload.timezone and payload.timezone != user.timezone:
+        # every stored day bucket moves with the timezone
+        user.timezone = payload.timezone
+        session.add(user)
+        rebucket_user(session, user.id)
+    session.commit()
+    session.refresh(user)
+    known_users.invalidate(user.id)
+    return user
+
+
+@router.patch("/me", response_model=UserRead)
+def update_me(
+    payload: UserUpdate,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+):
+    return _update_user(session, current_user, payload)
+
+
+@router.post("/revoke", status_code=204)
+def revoke_tokens(
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+):
+    # signs the user out everywhere: every token issued so far stops verifying
+    current_user.token_version += 1
+    session.add(current_user)
+    session.commit()
+    known_users.invalidate(current_user.id)
+    return Response(status_code=204)
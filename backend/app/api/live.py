@@ -0,0 +1,119 @@
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from fastapi.security import OAuth2PasswordBearer
+from sqlmodel import Session
+
+from app.api.auth import Principal, get_current_principal
+from app.services.stats import daily_stats
+from app.utils.db import get_session
+from app.utils.profiling import InstrumentedRoute
+from app.utils.pubsub import broker
+from app.utils.settings import settings
+from app.utils.timezones import get_zone, local_date
+
+
+router = APIRouter(route_class=InstrumentedRoute)
+
+# EventSource and WebSocket clients cannot set headers; accept ?access_token=
+optional_bearer = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
+
+
+def _snapshot(session: Session, principal: Principal) -> str:
+    # today's stats as the stream's first message; then the connection is
+    # released, since a stream may stay open for hours holding no DB resources
+    today = local_date(datetime.utcnow(), get_zone(principal.timezone))
+    try:
+        return daily_stats(session, principal.id, today).model_dump_json()
+    finally:
+        session.close()
+
+
+async def _sse(
+    topic: int, snapshot: Callable[[], Awaitable[str]]
+) -> AsyncIterator[bytes]:
+    # subscribing here rather than in the route ties the subscription to this
+    # finally: a stream that never starts iterating never subscribes, and a
+    # failing snapshot still unsubscribes
+    subscription = broker.subscribe(topic)
+    try:
+        # subscribed before the snapshot so no write in between is missed
+        first = await snapshot()
+        yield f"retry: 3000\nevent: daily\ndata: {first}\n\n".encode()
+        async for message in subscription.messages(settings.stream_heartbeat_seconds):
+            if message is None:
+                # comment line; keeps proxies from timing out an idle stream
+                yield b": ping\n\n"
+            else:
+                yield f"event: daily\ndata: {message}\n\n".encode()
+    finally:
+        broker.unsubscribe(subscription)
+
+
+@router.get("/stream")
+async def stats_stream(
+    access_token: Optional[str] = Query(None),
+    bearer: Optional[str] = Depends(optional_bearer),
+    session: Session = Depends(get_session),
+):
+    """Server-Sent Events: today's DailyStats, then the updated DailyStats of
+    every day the user's writes touch."""
+    token = bearer or access_token
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated"
+        )
+    principal = await get_current_principal(token, session)
+    # the snapshot runs inside the stream, on a session of its own: the
+    # request-scoped one is gone by the time the body is iterated
+    bind = session.get_bind()
+    return StreamingResponse(
+        _sse(
+            principal.id,
+            lambda: run_in_threadpool(_snapshot, Session(bind), principal),
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/ws")
+async def stats_websocket(
+    websocket: WebSocket,
+    access_token: str = Query(...),
+    session: Session = Depends(get_session),
+):
+    """The same feed as /stats/stream as JSON frames:
+    {"event": "daily", "data": {...}} and {"event": "ping"}."""
+    try:
+        principal = await get_current_principal(access_token, session)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    subscription = broker.subscribe(principal.id)
+    try:
+        await websocket.accept()
+        snapshot = await run_in_threadpool(_snapshot, session, principal)
+        await websocket.send_text(f'{{"event":"daily","data":{snapshot}}}')
+        async for message in subscription.messages(settings.stream_heartbeat_seconds):
+            if message is None:
+                await websocket.send_text('{"event":"ping"}')
+            else:
+                await websocket.send_text(f'{{"event":"daily","data":{message}}}')
+        # dropped for falling behind; the client should reconnect
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        broker.unsubscribe(subscription)
@@ -1,23 +1,32 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import bindparam
 from sqlmodel import Session, select
 
-from app.api.auth import get_current_user
-from app.models.entities import Pet, User
+from app.api.auth import Principal, get_current_principal
+from app.models.entities import Pet
 from app.schemas.pet import PetCreate, PetRead
+from app.services.rollups import bump_data_version
 from app.utils.db import get_session
+from app.utils.profiling import InstrumentedRoute
+from app.utils.responses import JSONBytesResponse
 
 
-router = APIRouter()
+router = APIRouter(route_class=InstrumentedRoute)
+
+# built once; PetRead's fields as plain columns
+PET_COLUMNS = tuple(getattr(Pet, field) for field in PetRead.model_fields)
+PETS_STATEMENT = select(*PET_COLUMNS).where(Pet.user_id == bindparam("user_id"))
 
 
 @router.post("", response_model=PetRead)
 def create_pet(
     payload: PetCreate,
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
     pet = Pet(user_id=current_user.id, **payload.dict())
     session.add(pet)
+    bump_data_version(session, current_user.id)
     session.commit()
     session.refresh(pet)
     return pet
@@ -26,7 +35,7 @@ def create_pet(
 @router.get("", response_model=list[PetRead])
 def list_pets(
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
-    pets = session.exec(select(Pet).where(Pet.user_id == current_user.id)).all()
-    return pets
+    rows = session.execute(PETS_STATEMENT, {"user_id": current_user.id}).all()
+    return JSONBytesResponse([row._asdict() for row in rows])
@@ -1,34 +1,241 @@
-from datetime import datetime
-from io import BytesIO
-from typing import Optional
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Literal, Optional
 
-from fastapi import APIRouter, Depends
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from sqlmodel import Session
 
-from app.api.auth import get_current_user
-from app.models.entities import User
-from app.services.report import build_weekly_report_image
-from app.services.stats import weekly_stats
+from app.api.activities import activities_query
+from app.api.auth import (
+    Principal,
+    get_current_principal,
+    get_current_user,
+    get_read_session,
+)
+from app.models.entities import ActivityType, ExportJob, JobStatus, User
+from app.schemas.export import ExportJobCreate, ExportJobRead
+from app.services import activity_export, archive
+from app.services.exports import (
+    EXTENSIONS,
+    artifact_path,
+    dedup_key,
+    export_runner,
+    find_reusable,
+    purge_expired,
+)
+from app.services.report import MEDIA_TYPES, render_report
+from app.services.rollups import data_version
+from app.services.stats import MAX_SERIES_BUCKETS, weekly_stats
+from app.utils.cache import build_cache, etag_for, etag_matches
 from app.utils.db import get_session
+from app.utils.profiling import InstrumentedRoute, section
+from app.utils.settings import settings
+from app.utils.timezones import get_zone, local_date
+from app.utils.workers import cpu_pool
 
 
-router = APIRouter()
+router = APIRouter(route_class=InstrumentedRoute)
 
+# bump when the rendered output changes so old ETags stop matching
+REPORT_RENDER_VERSION = 1
 
-@router.get("/weekly-report.png")
-def weekly_report(
-    start: Optional[str] = None,
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user),
-):
+report_cache = build_cache(
+    settings.report_cache_backend,
+    settings.report_cache_dir,
+    settings.report_cache_max_bytes,
+    name="report",
+)
+
+
+async def _weekly_report_response(
+    image_format: str,
+    start: Optional[str],
+    if_none_match: Optional[str],
+    session: Session,
+    current_user: User,
+) -> Response:
+    today = local_date(datetime.utcnow(), get_zone(current_user.timezone))
     if start:
         try:
             start_date = datetime.strptime(start, "%Y-%m-%d").date()
         except ValueError:
-            start_date = datetime.utcnow().date()
+            start_date = today
     else:
-        start_date = datetime.utcnow().date()
-    report = weekly_stats(session, current_user.id, start_date)
-    png_bytes = build_weekly_report_image(report)
-    return StreamingResponse(BytesIO(png_bytes), media_type="image/png")
+        start_date = today
+
+    # the version comes from the session the stats are read from: a lagging
+    # replica must not cache its image under the primary's newer version
+    version = await run_in_threadpool(data_version, session, current_user.id)
+    key = (
+        f"weekly:{image_format}:{current_user.id}:{start_date}:"
+        f"{version}:{REPORT_RENDER_VERSION}"
+    )
+    etag = etag_for(key)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    image_bytes = report_cache.get(key)
+    if image_bytes is None:
+        report = await run_in_threadpool(
+            weekly_stats, session, current_user.id, start_date
+        )
+        with section("render"):
+            image_bytes = await cpu_pool.run(render_report, image_format, report)
+        report_cache.set(key, image_bytes)
+    return Response(
+        content=image_bytes, media_type=MEDIA_TYPES[image_format], headers=headers
+    )
+
+
+@router.get("/weekly-report.png")
+async def weekly_report(
+    start: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    session: Session = Depends(get_read_session),
+    current_user: User = Depends(get_current_user),
+):
+    return await _weekly_report_response(
+        "png", start, if_none_match, session, current_user
+    )
+
+
+@router.get("/weekly-report.webp")
+async def weekly_report_webp(
+    start: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    session: Session = Depends(get_read_session),
+    current_user: User = Depends(get_current_user),
+):
+    return await _weekly_report_response(
+        "webp", start, if_none_match, session, current_user
+    )
+
+
+def _job_params(payload: ExportJobCreate, user: User) -> str:
+    start = payload.start or local_date(datetime.utcnow(), get_zone(user.timezone))
+    params = {"start": start.isoformat()}
+    if payload.kind == "month_png":
+        params["start"] = start.replace(day=1).isoformat()
+    elif payload.kind == "year_png":
+        params["start"] = start.replace(month=1, day=1).isoformat()
+    elif payload.kind == "csv":
+        end = payload.end or start + timedelta(days=30)
+        if (end - start).days >= MAX_SERIES_BUCKETS["day"]:
+            raise HTTPException(status_code=400, detail="Export range too long")
+        params["end"] = end.isoformat()
+    return json.dumps(params, sort_keys=True, separators=(",", ":"))
+
+
+@router.post("/jobs", response_model=ExportJobRead, status_code=202)
+def create_export_job(
+    payload: ExportJobCreate,
+    response: Response,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+):
+    purge_expired(session)
+    params = _job_params(payload, current_user)
+    key = dedup_key(payload.kind, params, current_user.data_version)
+    existing = find_reusable(session, current_user.id, key)
+    if existing is not None:
+        response.status_code = 200
+        return existing
+
+    job = ExportJob(
+        user_id=current_user.id, kind=payload.kind, params=params, dedup_key=key
+    )
+    session.add(job)
+    session.commit()
+    export_runner.submit(session.get_bind(), job.id)
+    session.refresh(job)
+    return job
+
+
+@router.get("/jobs/{job_id}", response_model=ExportJobRead)
+def get_export_job(
+    job_id: int,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+):
+    job = session.get(ExportJob, job_id)
+    if job is None or job.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    status = job.status
+    if status == JobStatus.DONE:
+        if job.expires_at > datetime.utcnow() and os.path.exists(
+            artifact_path(job.artifact)
+        ):
+            return FileResponse(
+                artifact_path(job.artifact),
+                media_type=job.media_type,
+                filename=f"{job.kind}-{job.id}.{EXTENSIONS[job.kind]}",
+                headers={"Cache-Control": "private, no-store"},
+            )
+        status = JobStatus.EXPIRED
+    if status == JobStatus.EXPIRED:
+        raise HTTPException(status_code=410, detail="Export expired")
+    body = ExportJobRead.model_validate(job).model_dump(mode="json")
+    if status == JobStatus.FAILED:
+        return body
+    return JSONResponse(body, status_code=202)
+
+
+def _accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    for token in (accept_encoding or "").split(","):
+        name, _, quality = token.partition(";")
+        if name.strip().lower() == "gzip":
+            _, _, weight = quality.partition("q=")
+            try:
+                return float(weight or 1) > 0
+            except ValueError:
+                return False
+    return False
+
+
+@router.get("/activities.{output}")
+def export_activities(
+    output: Literal["csv", "ndjson", "parquet"],
+    types: Optional[list[ActivityType]] = Query(None, alias="type"),
+    pet_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    accept_encoding: Optional[str] = Header(None),
+    session: Session = Depends(get_read_session),
+    current_user: Principal = Depends(get_current_principal),
+):
+    """Full activity history, archived months included, newest first,
+    streamed in fixed-size batches from a server-side cursor. CSV and NDJSON
+    are gzipped on the fly when the client accepts it; Parquet is compressed
+    per column already."""
+    if output == "parquet" and not activity_export.parquet_available():
+        raise HTTPException(
+            status_code=501, detail="Parquet export needs the pyarrow package"
+        )
+    query, params = activities_query(
+        current_user.id, None, None, types, pet_id, start, end
+    )
+    batches = activity_export.stream_batches(
+        session.get_bind(), query, params, settings.export_batch_rows
+    )
+    if archive.reaches_archive(current_user.archived_before, params):
+        batches = archive.merged_batches(
+            session.get_bind(), batches, params, settings.export_batch_rows
+        )
+    chunks = activity_export.ENCODERS[output](batches)
+    headers = {
+        "Content-Disposition": f'attachment; filename="activities.{output}"',
+        "Cache-Control": "private, no-store",
+    }
+    if output != "parquet":
+        headers["Vary"] = "Accept-Encoding"
+        if _accepts_gzip(accept_encoding):
+            chunks = activity_export.gzip_chunks(chunks, settings.export_gzip_level)
+            headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        chunks, media_type=activity_export.MEDIA_TYPES[output], headers=headers
+    )
@@ -1,40 +1,164 @@
 from datetime import date, datetime
+from typing import List, Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from pydantic import BaseModel
 from sqlmodel import Session
 
-from app.api.auth import get_current_user
-from app.models.entities import User
-from app.schemas.stats import DailyStats, WeeklyReportResponse
-from app.services.stats import daily_stats, weekly_stats
-from app.utils.db import get_session
+from app.api.auth import Principal, get_current_principal, get_read_session
+from app.models.entities import ActivityType
+from app.schemas.stats import DailyStats, StatsSeriesResponse, WeeklyReportResponse
+from app.services.rollups import data_state, data_version
+from app.services.stats import (
+    MAX_SERIES_BUCKETS,
+    daily_stats,
+    series_bucket_count,
+    stats_series,
+    weekly_stats,
+)
+from app.utils.cache import build_cache, etag_for, etag_matches
+from app.utils.metrics import registry
+from app.utils.profiling import InstrumentedRoute
+from app.utils.settings import settings
 
 
-router = APIRouter()
+router = APIRouter(route_class=InstrumentedRoute)
+
+# responses keyed by the user's data_version, so any write invalidates them
+stats_cache = build_cache(
+    settings.stats_cache_backend,
+    settings.stats_cache_dir,
+    settings.stats_cache_max_bytes,
+    name="stats",
+)
+not_modified = registry.counter(
+    "stats_not_modified_total", "stats requests answered with 304"
+)
 
 
 def _parse_date(value: str) -> date:
     try:
-        return datetime.strptime(value, "%Y-%m-%d").date()
+        parsed = datetime.strptime(value, "%Y-%m-%d").date()
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format")
+    # keep a year of slack at both ends: local day bounds, week and month
+    # ends past the date must not overflow datetime
+    if not date.min.year < parsed.year < date.max.year:
+        raise HTTPException(status_code=400, detail="Date out of range")
+    return parsed
+
+
+def _parse_range(start: str, end: str, bucket: str) -> tuple[date, date]:
+    start_date, end_date = _parse_date(start), _parse_date(end)
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="'to' is before 'from'")
+    # counted, not built: a huge range is rejected without walking it
+    if series_bucket_count(start_date, end_date, bucket) > MAX_SERIES_BUCKETS[bucket]:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Range too large: at most {MAX_SERIES_BUCKETS[bucket]} {bucket}s",
+        )
+    return start_date, end_date
+
+
+def _cache_key(endpoint: str, user_id: int, version: int, *params) -> str:
+    return f"stats:{endpoint}:{user_id}:{version}:" + ":".join(map(str, params))
+
+
+def _series_key(
+    user: Principal,
+    version: int,
+    start: date,
+    end: date,
+    bucket: str,
+    pet_id: Optional[int],
+    types: Optional[List[ActivityType]],
+) -> str:
+    kinds = ",".join(sorted(types or ()))
+    params = (start, end, bucket, pet_id, kinds, user.timezone)
+    return _cache_key("series", user.id, version, *params)
+
+
+def _cached(key: str, if_none_match: Optional[str]) -> tuple[dict, Optional[Response]]:
+    """Validator headers for ``key``, and the response when it can be served
+    without computing anything."""
+    etag = etag_for(key)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, etag):
+        not_modified.inc()
+        return headers, Response(status_code=304, headers=headers)
+    body = stats_cache.get(key)
+    if body is None:
+        return headers, None
+    return headers, Response(body, media_type="application/json", headers=headers)
+
+
+def _store(key: str, headers: dict, result: BaseModel) -> Response:
+    body = result.model_dump_json().encode()
+    stats_cache.set(key, body)
+    return Response(body, media_type="application/json", headers=headers)
 
 
 @router.get("/daily", response_model=DailyStats)
 def daily(
     date: str = Query(..., alias="date"),
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None),
+    session: Session = Depends(get_read_session),
+    current_user: Principal = Depends(get_current_principal),
 ):
     target_date = _parse_date(date)
-    return daily_stats(session, current_user.id, target_date)
+    version = data_version(session, current_user.id)
+    key = _cache_key("daily", current_user.id, version, target_date)
+    headers, cached = _cached(key, if_none_match)
+    if cached is not None:
+        return cached
+    return _store(key, headers, daily_stats(session, current_user.id, target_date))
 
 
 @router.get("/weekly", response_model=WeeklyReportResponse)
 def weekly(
     start: str,
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None),
+    session: Session = Depends(get_read_session),
+    current_user: Principal = Depends(get_current_principal),
 ):
     start_date = _parse_date(start)
-    return weekly_stats(session, current_user.id, start_date)
+    version = data_version(session, current_user.id)
+    key = _cache_key("weekly", current_user.id, version, start_date)
+    headers, cached = _cached(key, if_none_match)
+    if cached is not None:
+        return cached
+    return _store(key, headers, weekly_stats(session, current_user.id, start_date))
+
+
+@router.get("/series", response_model=StatsSeriesResponse)
+def series(
+    start: str = Query(..., alias="from"),
+    end: str = Query(..., alias="to"),
+    bucket: Literal["day", "week", "month"] = "day",
+    pet_id: Optional[int] = None,
+    types: Optional[List[ActivityType]] = Query(None),
+    if_none_match: Optional[str] = Header(None),
+    session: Session = Depends(get_read_session),
+    current_user: Principal = Depends(get_current_principal),
+):
+    start_date, end_date = _parse_range(start, end, bucket)
+    version, archived_before = data_state(session, current_user.id)
+    key = _series_key(
+        current_user, version, start_date, end_date, bucket, pet_id, types
+    )
+    headers, cached = _cached(key, if_none_match)
+    if cached is not None:
+        return cached
+    result = stats_series(
+        session,
+        current_user.id,
+        start_date,
+        end_date,
+        bucket,
+        pet_id,
+        types,
+        current_user.timezone,
+        archived_before,
+    )
+    return _store(key, headers, result)
@@ -1,16 +1,68 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional
 
 from jose import jwt, JWTError
+from passlib import registry as hash_registry
 from passlib.context import CryptContext
 
 from app.utils.settings import settings
 
+logger = logging.getLogger("uvicorn.error")
 
-# pbkdf2_sha256 uses pure Python and avoids bcrypt backend issues in restricted envs
-pwd_context = CryptContext(
-    schemes=["pbkdf2_sha256"],
-    deprecated="auto",
+# every scheme a stored hash may use, strongest first; only the configured
+# one hashes, the others verify and are upgraded on the next login
+KNOWN_SCHEMES = ("argon2", "scrypt", "bcrypt", "pbkdf2_sha256")
+FALLBACK_SCHEME = "pbkdf2_sha256"  # hashlib's native pbkdf2_hmac, always there
+
+
+@lru_cache(maxsize=None)
+def hash_scheme_available(name: str) -> bool:
+    passlib_logger = logging.getLogger("passlib")
+    level = passlib_logger.level
+    passlib_logger.setLevel(logging.CRITICAL)  # backend probes log tracebacks
+    try:
+        handler = hash_registry.get_crypt_handler(name)
+        return not hasattr(handler, "has_backend") or handler.has_backend()
+    except Exception:
+        # missing native module, or a backend probe that fails outright
+        # (passlib's bcrypt self-test raises on bcrypt>=5)
+        return False
+    finally:
+        passlib_logger.setLevel(level)
+
+
+def build_pwd_context(
+    scheme: str, rounds: Optional[int] = None, memory_kib: Optional[int] = None
+) -> CryptContext:
+    """Hash with ``scheme`` at exactly ``rounds`` (the scheme's own cost unit:
+    iterations for pbkdf2, time_cost for argon2, log2 cost for bcrypt/scrypt).
+    Hashes in any other scheme or at any other cost report needs_update."""
+    if not hash_scheme_available(scheme):
+        logger.warning(
+            "password hash scheme %s unavailable, using %s", scheme, FALLBACK_SCHEME
+        )
+        scheme = FALLBACK_SCHEME
+    schemes = [scheme] + [
+        name for name in KNOWN_SCHEMES if name != scheme and hash_scheme_available(name)
+    ]
+    options = {}
+    if rounds is not None:
+        for key in ("default_rounds", "min_rounds", "max_rounds"):
+            options[f"{scheme}__{key}"] = rounds
+    if memory_kib is not None and scheme == "argon2":
+        options["argon2__memory_cost"] = memory_kib
+    return CryptContext(schemes=schemes, deprecated="auto", **options)
+
+
+pwd_context = build_pwd_context(
+    settings.password_hash_scheme,
+    settings.password_hash_rounds,
+    settings.password_hash_memory_kib,
 )
 ALGORITHM = "HS256"
 
@@ -19,10 +71,53 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, Optional[str]]:
+    """(valid, replacement hash); the replacement is set when the stored hash
+    uses an old scheme or cost and should be rewritten."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+def calibrate_rounds(scheme: str, target_seconds: float, samples: int = 3) -> int:
+    """Rounds for ``scheme`` whose verify takes about ``target_seconds`` here."""
+    handler = hash_registry.get_crypt_handler(scheme)
+
+    def verify_time(rounds: int) -> float:
+        digest = handler.using(rounds=rounds).hash("calibrate")
+        best = float("inf")
+        for _ in range(samples):
+            started = time.perf_counter()
+            handler.verify("calibrate", digest)
+            best = min(best, time.perf_counter() - started)
+        return best
+
+    if getattr(handler, "rounds_cost", "linear") == "log2":
+        # each step doubles the cost; take the step closest to the target
+        rounds = handler.min_rounds
+        elapsed = verify_time(rounds)
+        while elapsed < target_seconds and rounds < handler.max_rounds:
+            previous = elapsed
+            rounds += 1
+            elapsed = verify_time(rounds)
+            if elapsed >= target_seconds:
+                if target_seconds / previous < elapsed / target_seconds:
+                    rounds -= 1
+                break
+        return rounds
+
+    # cost is linear in rounds: scale from a probe, then correct once
+    rounds = max(handler.min_rounds, handler.default_rounds // 10)
+    for _ in range(2):
+        rounds = int(rounds * target_seconds / verify_time(rounds))
+        rounds = min(max(rounds, handler.min_rounds), handler.max_rounds)
+    return rounds
+
+
 def create_token(data: dict, expires_delta: timedelta) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + expires_delta
@@ -35,3 +130,42 @@ def decode_token(token: str) -> Optional[dict]:
         return jwt.decode(token, settings.secret_key, algorithms=[ALGORITHM])
     except JWTError:
         return None
+
+
+class _DecodedTokenCache:
+    """LRU of verified token payloads; each entry lapses at the token's exp."""
+
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[dict]:
+        with self._lock:
+            payload = self._entries.get(token)
+            if payload is None:
+                return None
+            if payload.get("exp", 0) <= time.time():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return payload
+
+    def set(self, token: str, payload: dict) -> None:
+        with self._lock:
+            self._entries[token] = payload
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+
+
+_decoded_tokens = _DecodedTokenCache(settings.auth_token_cache_size)
+
+
+def decode_token_cached(token: str) -> Optional[dict]:
+    payload = _decoded_tokens.get(token)
+    if payload is None:
+        payload = decode_token(token)
+        if payload:
+            _decoded_tokens.set(token, payload)
+    return payload
@@ -0,0 +1,166 @@
+import argparse
+import os
+from datetime import date, timedelta
+from pathlib import Path
+
+from sqlmodel import Session
+
+from app.auth.security import (
+    KNOWN_SCHEMES,
+    calibrate_rounds,
+    hash_scheme_available,
+)
+from app.services.archival import archive_activities, archive_cutoff
+from app.services.report_batch import render_reports
+from app.services.rollups import rebuild_all_rollups
+from app.services.stats import period_start
+from app.services.streaks import backfill_streaks
+from app.utils.db import engine, init_db
+from app.utils.settings import settings
+
+
+def _backfill_streaks(args: argparse.Namespace) -> None:
+    with Session(engine) as session:
+        count = backfill_streaks(session)
+    print(f"Rebuilt streak state for {count} users")
+
+
+def _rollups(args: argparse.Namespace) -> None:
+    repair = args.command == "rebuild-rollups"
+    with Session(engine) as session:
+        drift = rebuild_all_rollups(session, repair=repair)
+    for item in drift:
+        print(
+            f"user={item.user_id} date={item.date} {item.field}: "
+            f"stored={item.stored} expected={item.expected}"
+        )
+    days = {(item.user_id, item.date) for item in drift}
+    action = "repaired" if repair else "found"
+    print(f"Rollup drift {action} on {len(days)} user-days ({len(drift)} fields)")
+    if drift and not repair:
+        raise SystemExit(1)
+
+
+def _archive(args: argparse.Namespace) -> None:
+    cutoff = archive_cutoff(args.horizon_days)
+    with Session(engine) as session:
+        moved = archive_activities(session, args.horizon_days)
+    print(
+        f"Archived {sum(moved.values())} activities started before "
+        f"{cutoff:%Y-%m-%d} for {len(moved)} users"
+    )
+    if args.vacuum and engine.dialect.name == "sqlite":
+        # deleted pages are only reused, not returned, until a VACUUM
+        with engine.connect() as conn:
+            conn.exec_driver_sql("VACUUM")
+        print("Vacuumed the database file")
+
+
+def _render_reports(args: argparse.Namespace) -> None:
+    # default: the last full period, e.g. last Monday-Sunday for the weekly push
+    current = period_start(args.period, date.today())
+    start = period_start(args.period, args.start or current - timedelta(days=1))
+    out_dir = args.out / f"{args.period}-{start}"
+    result = render_reports(
+        engine,
+        args.period,
+        start,
+        out_dir,
+        image_format=args.format,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+    )
+    print(
+        f"Rendered {result.rendered} {args.period} reports from {start} into "
+        f"{out_dir} ({result.skipped} of {result.users} users had no activity) "
+        f"in {result.seconds:.1f}s, {result.per_second:.0f}/s"
+    )
+
+
+def _calibrate_hash(args: argparse.Namespace) -> None:
+    schemes = [args.scheme] if args.scheme else KNOWN_SCHEMES
+    target = args.target_ms / 1000
+    for scheme in schemes:
+        if not hash_scheme_available(scheme):
+            print(f"{scheme}: backend not available")
+            continue
+        rounds = calibrate_rounds(scheme, target)
+        print(f"{scheme}: PASSWORD_HASH_ROUNDS={rounds}")
+    print(f"(~{args.target_ms:g} ms per verify on this machine)")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backfill = commands.add_parser(
+        "backfill-streaks", help="recompute streak state from existing activities"
+    )
+    backfill.set_defaults(func=_backfill_streaks)
+
+    verify = commands.add_parser(
+        "verify-rollups", help="recompute daily rollups and report drift"
+    )
+    verify.set_defaults(func=_rollups)
+
+    rebuild = commands.add_parser(
+        "rebuild-rollups", help="recompute daily rollups and rewrite any drift"
+    )
+    rebuild.set_defaults(func=_rollups)
+
+    archive = commands.add_parser(
+        "archive-activities",
+        help="fold old activities into the rollups and move them to the archive",
+    )
+    archive.add_argument(
+        "--horizon-days", type=int, default=settings.archive_horizon_days
+    )
+    archive.add_argument(
+        "--vacuum", action="store_true", help="compact the SQLite file afterwards"
+    )
+    archive.set_defaults(func=_archive)
+
+    reports = commands.add_parser(
+        "render-reports",
+        help="render every active user's week/month/year report image in one pass",
+    )
+    reports.add_argument("--period", choices=("week", "month", "year"), default="week")
+    reports.add_argument(
+        "--start",
+        type=date.fromisoformat,
+        default=None,
+        help="first day of the period (default: the last full one)",
+    )
+    reports.add_argument("--out", type=Path, default=Path("./.cache/reports-batch"))
+    reports.add_argument("--format", choices=("png", "webp"), default="png")
+    reports.add_argument("--chunk-size", type=int, default=500)
+    reports.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="render processes; 0 renders in this process",
+    )
+    reports.set_defaults(func=_render_reports)
+
+    calibrate = commands.add_parser(
+        "calibrate-hash",
+        help="suggest PASSWORD_HASH_ROUNDS for a target verify time on this machine",
+    )
+    calibrate.add_argument("--target-ms", type=float, default=100)
+    calibrate.add_argument(
+        "--scheme",
+        choices=KNOWN_SCHEMES,
+        default=None,
+        help="default: every available scheme "
+        f"(configured: {settings.password_hash_scheme})",
+    )
+    calibrate.set_defaults(func=_calibrate_hash, uses_db=False)
+
+    args = parser.parse_args(argv)
+    if getattr(args, "uses_db", True):
+        init_db()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
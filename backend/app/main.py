@@ -1,12 +1,26 @@
-from fastapi import FastAPI
+from typing import Optional
+
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 
-from app.api import auth, pets, activities, stats, report
-from app.utils.db import init_db
+from app.api import auth, pets, activities, stats, report, live
+from app.services.exports import export_runner
+from app.services.report import get_report_renderer
+from app.utils import db
+from app.utils.db import init_db, init_db_async, is_async_url
+from app.utils.metrics import registry
+from app.utils.profiling import InstrumentationMiddleware
 from app.utils.settings import settings
+from app.utils.workers import PoolSaturated, cpu_pool
 
 
-def create_app() -> FastAPI:
+def create_app(async_db: Optional[bool] = None) -> FastAPI:
+    """Build the app; ``async_db`` defaults to whether DATABASE_URL names an
+    async driver (sqlite+aiosqlite, postgresql+asyncpg)."""
+    if async_db is None:
+        async_db = is_async_url(settings.database_url)
     app = FastAPI(title="Pet Time Tracker")
 
     allowed_origins = {settings.frontend_origin, "http://localhost:5173", "http://127.0.0.1:5173"}
@@ -17,17 +31,53 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["Server-Timing", "X-Profile-Status"],
     )
+    app.add_middleware(InstrumentationMiddleware)
+
+    routers = [auth.router, pets.router, activities.router, stats.router]
+    if async_db:
+        from app.api import aio
 
-    app.include_router(auth.router, prefix="/auth", tags=["auth"])
-    app.include_router(pets.router, prefix="/pets", tags=["pets"])
-    app.include_router(activities.router, prefix="/activities", tags=["activities"])
-    app.include_router(stats.router, prefix="/stats", tags=["stats"])
+        routers = [
+            aio.auth.router,
+            aio.pets.router,
+            aio.activities.router,
+            aio.stats.router,
+        ]
+    auth_router, pets_router, activities_router, stats_router = routers
+    app.include_router(auth_router, prefix="/auth", tags=["auth"])
+    app.include_router(pets_router, prefix="/pets", tags=["pets"])
+    app.include_router(activities_router, prefix="/activities", tags=["activities"])
+    app.include_router(stats_router, prefix="/stats", tags=["stats"])
+    app.include_router(live.router, prefix="/stats", tags=["stats"])
     app.include_router(report.router, prefix="/export", tags=["export"])
 
+    @app.exception_handler(PoolSaturated)
+    async def pool_saturated(request: Request, exc: PoolSaturated) -> JSONResponse:
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Server busy, retry shortly"},
+            headers={"Retry-After": str(settings.cpu_pool_retry_after_seconds)},
+        )
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics() -> PlainTextResponse:
+        return PlainTextResponse(registry.render())
+
     @app.on_event("startup")
-    def on_startup() -> None:
-        init_db()
+    async def on_startup() -> None:
+        if async_db:
+            await init_db_async()
+        else:
+            init_db()
+        get_report_renderer()
+        await run_in_threadpool(export_runner.resume, db.engine)
+
+    @app.on_event("shutdown")
+    def on_shutdown() -> None:
+        cpu_pool.shutdown()
+        export_runner.shutdown()
 
     return app
 
@@ -2,6 +2,7 @@ from datetime import datetime, date
 from enum import Enum
 from typing import Optional
 
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field, Relationship
 
 
@@ -31,6 +32,14 @@ class User(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     email: str = Field(unique=True, index=True)
     password_hash: str
+    # IANA name; stats and streaks bucket activities by local date in it
+    timezone: str = "UTC"
+    # bumped on every write to the user's data; keys caches and ETags
+    data_version: int = 0
+    # bumped to revoke every token issued so far
+    token_version: int = 0
+    # activities started before this UTC instant live in ActivityArchive
+    archived_before: Optional[datetime] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
     pets: list["Pet"] = Relationship(back_populates="owner")
@@ -52,8 +61,22 @@ class Pet(SQLModel, table=True):
 
 
 class Activity(SQLModel, table=True):
+    # every hot query filters by user and ranges/sorts on started_at
+    __table_args__ = (
+        Index("ix_activity_user_started", "user_id", "started_at"),
+        Index("ix_activity_user_type_started", "user_id", "type", "started_at"),
+        Index(
+            "ux_activity_user_idempotency_key",
+            "user_id",
+            "idempotency_key",
+            unique=True,
+        ),
+        # archived rows keep their ids: never reuse a deleted row's rowid
+        {"sqlite_autoincrement": True},
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    user_id: int = Field(foreign_key="user.id", index=True)
+    user_id: int = Field(foreign_key="user.id")
     pet_id: Optional[int] = Field(default=None, foreign_key="pet.id", index=True)
     type: ActivityType
     amount: float = 0
@@ -62,6 +85,7 @@ class Activity(SQLModel, table=True):
     ended_at: Optional[datetime] = None
     note: Optional[str] = None
     source: ActivitySource = ActivitySource.MANUAL
+    idempotency_key: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
     user: Optional[User] = Relationship(back_populates="activities")
@@ -69,11 +93,77 @@ class Activity(SQLModel, table=True):
 
 
 class StreakSnapshot(SQLModel, table=True):
+    # materialized per-user daily rollup, maintained on every activity write
+    __table_args__ = (
+        Index("ux_streaksnapshot_user_date", "user_id", "date", unique=True),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    user_id: int = Field(foreign_key="user.id", index=True)
+    user_id: int = Field(foreign_key="user.id")
     date: date
+    walk_min: float = 0
+    play_min: float = 0
+    treat_count: float = 0
+    care_count: float = 0
+    activity_count: int = 0
     total_minutes: int = 0
     total_treats: int = 0
     met_goal: bool = False
 
     user: Optional[User] = Relationship(back_populates="streaks")
+
+
+class StreakState(SQLModel, table=True):
+    user_id: int = Field(foreign_key="user.id", primary_key=True)
+    current_run: int = 0
+    last_active_date: Optional[date] = None
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    EXPIRED = "expired"
+
+
+class ExportJob(SQLModel, table=True):
+    # background export; the table is the queue, so jobs survive restarts
+    __table_args__ = (
+        Index("ix_exportjob_user_dedup", "user_id", "dedup_key"),
+        Index("ix_exportjob_status_expires", "status", "expires_at"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id")
+    kind: str
+    params: str = "{}"  # canonical JSON
+    # kind + params + the user's data_version; equal keys give equal output
+    dedup_key: str
+    status: JobStatus = JobStatus.QUEUED
+    attempts: int = 0
+    error: Optional[str] = None
+    artifact: Optional[str] = None  # file name under export_artifact_dir
+    media_type: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    expires_at: Optional[datetime] = None
+
+
+class ActivityArchive(SQLModel, table=True):
+    # one compressed block of a user's activities per UTC month of started_at;
+    # rows move here from Activity once folded into the daily rollups
+    __table_args__ = (
+        Index("ux_activityarchive_user_month", "user_id", "month", unique=True),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id")
+    month: date  # first day of the month
+    row_count: int
+    # started_at range of the rows, so readers skip blocks without decoding
+    first_started: datetime
+    last_started: datetime
+    payload: bytes  # zlib-compressed JSON, one list per Activity column
+    created_at: datetime = Field(default_factory=datetime.utcnow)
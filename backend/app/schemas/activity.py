@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import Literal, Optional
 
 from pydantic import BaseModel, Field, validator, ConfigDict
 from app.models.entities import ActivityType, ActivityUnit, ActivitySource
@@ -14,6 +14,8 @@ class ActivityCreate(BaseModel):
     ended_at: Optional[datetime] = None
     note: Optional[str] = None
     source: ActivitySource = ActivitySource.MANUAL
+    # client-generated; replays with the same key return the stored row
+    idempotency_key: Optional[str] = Field(default=None, max_length=64)
 
     @validator("unit")
     def validate_unit(cls, v, values):
@@ -42,3 +44,25 @@ class ActivityRead(BaseModel):
     note: Optional[str]
     source: ActivitySource
     created_at: datetime
+
+
+class ActivityPage(BaseModel):
+    items: list[ActivityRead]
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+
+
+class ActivityBatchCreate(BaseModel):
+    items: list[ActivityCreate] = Field(min_length=1, max_length=1000)
+
+
+class ActivityBatchItemResult(BaseModel):
+    index: int
+    status: Literal["created", "duplicate", "error"]
+    id: Optional[int] = None
+    detail: Optional[str] = None
+
+
+class ActivityBatchResponse(BaseModel):
+    created: int
+    results: list[ActivityBatchItemResult]
@@ -1,11 +1,24 @@
 from datetime import datetime
+from typing import Annotated, Optional
 
-from pydantic import BaseModel, EmailStr, Field, ConfigDict
+from pydantic import AfterValidator, BaseModel, EmailStr, Field, ConfigDict
+
+from app.utils.timezones import DEFAULT_TIMEZONE, is_valid_timezone
+
+
+def _known_timezone(value: str) -> str:
+    if not is_valid_timezone(value):
+        raise ValueError("Unknown timezone")
+    return value
+
+
+TimezoneName = Annotated[str, AfterValidator(_known_timezone)]
 
 
 class SignupRequest(BaseModel):
     email: EmailStr
     password: str = Field(min_length=6, max_length=72)
+    timezone: TimezoneName = DEFAULT_TIMEZONE
 
 
 class LoginRequest(BaseModel):
@@ -23,4 +36,9 @@ class UserRead(BaseModel):
     model_config = ConfigDict(from_attributes=True)
     id: int
     email: EmailStr
+    timezone: str
     created_at: datetime
+
+
+class UserUpdate(BaseModel):
+    timezone: Optional[TimezoneName] = None
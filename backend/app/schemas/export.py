@@ -0,0 +1,36 @@
+from datetime import date, datetime
+from typing import Literal, Optional
+
+from pydantic import BaseModel, ConfigDict, model_validator
+
+from app.models.entities import JobStatus
+
+ExportKind = Literal["week_png", "month_png", "year_png", "csv"]
+
+
+class ExportJobCreate(BaseModel):
+    kind: ExportKind
+    # week_png: first day of the week; month_png / year_png: any day in the
+    # month / year; csv: first day of the range. Defaults to the user's local today.
+    start: Optional[date] = None
+    end: Optional[date] = None  # csv only; defaults to start + 30 days
+
+    @model_validator(mode="after")
+    def check_range(self):
+        if self.end is not None:
+            if self.kind != "csv":
+                raise ValueError("end applies to csv exports only")
+            if self.start is not None and self.end < self.start:
+                raise ValueError("end must not be before start")
+        return self
+
+
+class ExportJobRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    id: int
+    kind: ExportKind
+    status: JobStatus
+    attempts: int
+    error: Optional[str] = None
+    created_at: datetime
+    expires_at: Optional[datetime] = None
@@ -1,5 +1,5 @@
 from datetime import date
-from typing import List, Optional
+from typing import List, Literal, Optional
 
 from pydantic import BaseModel, ConfigDict
 
@@ -17,8 +17,50 @@ class WeeklyStatsItem(DailyStats):
     change_vs_last_week: Optional[float] = None
 
 
+class ReportTotals(BaseModel):
+    walk_min: float = 0
+    play_min: float = 0
+    treat_count: float = 0
+    care_count: float = 0
+    best_streak: int = 0
+
+    @classmethod
+    def of(cls, days: List[DailyStats]) -> "ReportTotals":
+        return cls(
+            walk_min=sum(day.walk_min for day in days),
+            play_min=sum(day.play_min for day in days),
+            treat_count=sum(day.treat_count for day in days),
+            care_count=sum(day.care_count for day in days),
+            best_streak=max((day.streak_info or 0 for day in days), default=0),
+        )
+
+
 class WeeklyReportResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
     start: date
     end: date
     days: List[WeeklyStatsItem]
+    # summed once with the stats; renderers read these instead of the days
+    totals: Optional[ReportTotals] = None
+
+
+class SeriesMetrics(BaseModel):
+    """Columnar metrics; index i of every list belongs to ``buckets[i]``."""
+
+    walk_min: List[float]
+    play_min: List[float]
+    treat_count: List[float]
+    care_count: List[float]
+    activity_count: List[int]
+
+
+class PetSeries(SeriesMetrics):
+    pet_id: Optional[int]  # None collects activities not tied to a pet
+
+
+class StatsSeriesResponse(SeriesMetrics):
+    start: date
+    end: date
+    bucket: Literal["day", "week", "month"]
+    buckets: List[date]
+    pets: List[PetSeries]
@@ -0,0 +1,128 @@
+import csv
+import io
+import zlib
+from datetime import datetime
+from enum import Enum
+from typing import Iterable, Iterator
+
+from sqlalchemy import Row, Select
+from sqlmodel import Session
+
+from app.schemas.activity import ActivityRead
+from app.utils.responses import dumps_lines
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional, see the "parquet" extra
+    pa = pq = None
+
+EXPORT_FIELDS = tuple(ActivityRead.model_fields)
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def parquet_available() -> bool:
+    return pq is not None
+
+
+def stream_batches(
+    bind, query: Select, params: dict, batch_rows: int
+) -> Iterator[list[Row]]:
+    """Rows of ``query`` in batches of ``batch_rows``, read through a
+    server-side cursor on a session of its own, so memory is bounded by one
+    batch however many rows match and the cursor outlives the request scope."""
+    with Session(bind) as session:
+        result = session.execute(
+            query, params, execution_options={"yield_per": batch_rows}
+        )
+        for batch in result.partitions():
+            yield batch
+
+
+def _cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def csv_chunks(batches: Iterable[list[Row]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(EXPORT_FIELDS)
+    for batch in batches:
+        writer.writerows([_cell(value) for value in row] for row in batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def ndjson_chunks(batches: Iterable[list[Row]]) -> Iterator[bytes]:
+    for batch in batches:
+        yield dumps_lines(row._asdict() for row in batch)
+
+
+def _parquet_schema():
+    timestamp = pa.timestamp("us")
+    return pa.schema(
+        [
+            ("id", pa.int64()),
+            ("pet_id", pa.int64()),
+            ("type", pa.string()),
+            ("amount", pa.float64()),
+            ("unit", pa.string()),
+            ("started_at", timestamp),
+            ("ended_at", timestamp),
+            ("note", pa.string()),
+            ("source", pa.string()),
+            ("created_at", timestamp),
+        ]
+    )
+
+
+def parquet_chunks(batches: Iterable[list[Row]]) -> Iterator[bytes]:
+    """Parquet written one row group per batch; each group's bytes are sent
+    as soon as it is encoded and only the footer waits for the end."""
+    schema = _parquet_schema()
+    sink = io.BytesIO()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+
+    def drain() -> bytes:
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    try:
+        for batch in batches:
+            columns = list(zip(*batch))
+            arrays = [
+                [v.value if isinstance(v, Enum) else v for v in column]
+                for column in columns
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield drain()
+    finally:
+        writer.close()
+    yield drain()
+
+
+ENCODERS = {"csv": csv_chunks, "ndjson": ndjson_chunks, "parquet": parquet_chunks}
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int) -> Iterator[bytes]:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,97 @@
+from datetime import date, datetime, timedelta
+from itertools import groupby
+from typing import Optional
+
+from sqlalchemy import delete
+from sqlmodel import Session, select
+
+from app.models.entities import Activity, ActivityArchive, User
+from app.services.archive import (
+    ARCHIVE_COLUMNS,
+    decode_block,
+    encode_block,
+    month_of,
+)
+from app.services.rollups import bump_data_version, verify_rollups
+
+# ids per DELETE, under SQLite's default bound-parameter limit
+DELETE_CHUNK_SIZE = 500
+
+
+def archive_cutoff(horizon_days: int, now: Optional[datetime] = None) -> datetime:
+    """Start of the UTC month holding ``now - horizon_days``: only whole
+    months older than the horizon are archived."""
+    moment = (now or datetime.utcnow()) - timedelta(days=horizon_days)
+    return datetime.combine(month_of(moment), datetime.min.time())
+
+
+def _append(session: Session, user_id: int, month: date, rows: list[dict]) -> None:
+    block = session.exec(
+        select(ActivityArchive).where(
+            ActivityArchive.user_id == user_id, ActivityArchive.month == month
+        )
+    ).first()
+    if block is None:
+        block = ActivityArchive(user_id=user_id, month=month, row_count=0)
+    else:
+        # rows backdated into an archived month after it was written
+        rows = decode_block(block.payload) + rows
+    rows.sort(key=lambda row: (row["started_at"], row["id"]))
+    block.payload = encode_block(rows)
+    block.row_count = len(rows)
+    block.first_started = rows[0]["started_at"]
+    block.last_started = rows[-1]["started_at"]
+    session.add(block)
+
+
+def archive_user(session: Session, user_id: int, cutoff: datetime) -> int:
+    """Move the user's activities started before ``cutoff`` into monthly
+    archive blocks and return how many moved; the caller commits.
+
+    The rollups are brought up to date from the raw rows first, so every
+    archived day's totals are already folded in when the rows leave the
+    activity table.
+    """
+    verify_rollups(session, user_id, repair=True)
+    session.flush()
+    rows = [
+        row._asdict()
+        for row in session.execute(
+            select(*ARCHIVE_COLUMNS)
+            .where(Activity.user_id == user_id, Activity.started_at < cutoff)
+            .order_by(Activity.started_at, Activity.id)
+        )
+    ]
+    for month, group in groupby(rows, key=lambda row: month_of(row["started_at"])):
+        _append(session, user_id, month, list(group))
+    # delete exactly the rows copied: one inserted since the SELECT (backdated
+    # past the cutoff) stays live and is picked up by the next run
+    ids = [row["id"] for row in rows]
+    for offset in range(0, len(ids), DELETE_CHUNK_SIZE):
+        session.exec(
+            delete(Activity)
+            .where(Activity.id.in_(ids[offset : offset + DELETE_CHUNK_SIZE]))
+            .execution_options(synchronize_session=False)
+        )
+    user = session.get(User, user_id)
+    if user.archived_before is None or user.archived_before < cutoff:
+        user.archived_before = cutoff
+        session.add(user)
+    bump_data_version(session, user_id)
+    return len(rows)
+
+
+def archive_activities(
+    session: Session, horizon_days: int, now: Optional[datetime] = None
+) -> dict[int, int]:
+    """Archive every user's activities older than the horizon, one
+    transaction per user; returns rows moved per user."""
+    cutoff = archive_cutoff(horizon_days, now)
+    user_ids = session.exec(
+        select(Activity.user_id).where(Activity.started_at < cutoff).distinct()
+    ).all()
+    moved = {}
+    for user_id in sorted(user_ids):
+        moved[user_id] = archive_user(session, user_id, cutoff)
+        session.commit()
+    return moved
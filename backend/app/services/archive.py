@@ -0,0 +1,170 @@
+import heapq
+import json
+import zlib
+from collections import namedtuple
+from datetime import date, datetime
+from itertools import islice
+from typing import Iterable, Iterator, Optional
+
+from sqlalchemy import Row
+from sqlmodel import Session, select
+
+from app.models.entities import (
+    Activity,
+    ActivityArchive,
+    ActivitySource,
+    ActivityType,
+    ActivityUnit,
+)
+from app.schemas.activity import ActivityRead
+from app.utils.responses import dumps
+from app.utils.settings import settings
+
+# every Activity column but user_id, which the block carries once
+ARCHIVE_FIELDS = tuple(
+    column.name for column in Activity.__table__.columns if column.name != "user_id"
+)
+ARCHIVE_COLUMNS = tuple(getattr(Activity, field) for field in ARCHIVE_FIELDS)
+_ENUMS = {"type": ActivityType, "unit": ActivityUnit, "source": ActivitySource}
+_DATETIMES = ("started_at", "ended_at", "created_at")
+
+# shaped like the listing's column rows: same fields, order and _asdict()
+ArchivedActivity = namedtuple("ArchivedActivity", ActivityRead.model_fields)
+
+
+def month_of(moment: datetime) -> date:
+    return moment.date().replace(day=1)
+
+
+def encode_block(rows: list[dict]) -> bytes:
+    # column lists compress far better than a list of records
+    columns = {field: [row[field] for row in rows] for field in ARCHIVE_FIELDS}
+    return zlib.compress(dumps(columns), settings.archive_compress_level)
+
+
+def decode_block(payload: bytes) -> list[dict]:
+    """A block's rows as Activity column dicts, oldest first."""
+    columns = json.loads(zlib.decompress(payload))
+    for field, kind in _ENUMS.items():
+        columns[field] = [kind(value) for value in columns[field]]
+    for field in _DATETIMES:
+        columns[field] = [
+            None if value is None else datetime.fromisoformat(value)
+            for value in columns[field]
+        ]
+    return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+
+def _key(row) -> tuple[datetime, int]:
+    return row.started_at, row.id
+
+
+def _matches(row: ArchivedActivity, params: dict, ascending: bool) -> bool:
+    if "types" in params and row.type not in params["types"]:
+        return False
+    if "pet_id" in params and row.pet_id != params["pet_id"]:
+        return False
+    if "start" in params and row.started_at < params["start"]:
+        return False
+    if "end" in params and row.started_at >= params["end"]:
+        return False
+    if "cursor_at" in params:
+        cursor = (params["cursor_at"], params["cursor_id"])
+        return _key(row) > cursor if ascending else _key(row) < cursor
+    return True
+
+
+def archived_activities(
+    session: Session, params: dict, ascending: bool = False
+) -> Iterator[ArchivedActivity]:
+    """A user's archived activities matching the listing filters in
+    ``params`` (as built by activities_query), in listing order.
+
+    Blocks are decoded one at a time and only when their started_at range
+    can match, so a consumer that stops early skips the rest.
+    """
+    query = select(
+        ActivityArchive.first_started,
+        ActivityArchive.last_started,
+        ActivityArchive.payload,
+    ).where(ActivityArchive.user_id == params["user_id"])
+    if "start" in params:
+        query = query.where(ActivityArchive.last_started >= params["start"])
+    if "end" in params:
+        query = query.where(ActivityArchive.first_started < params["end"])
+    if "cursor_at" in params:
+        if ascending:
+            query = query.where(ActivityArchive.last_started >= params["cursor_at"])
+        else:
+            query = query.where(ActivityArchive.first_started <= params["cursor_at"])
+    month = ActivityArchive.month
+    query = query.order_by(month if ascending else month.desc())
+
+    fields = ArchivedActivity._fields
+    for block in session.exec(query).all():
+        rows = [
+            ArchivedActivity(*(values[field] for field in fields))
+            for values in decode_block(block.payload)
+        ]
+        if not ascending:
+            rows.reverse()
+        yield from (row for row in rows if _matches(row, params, ascending))
+
+
+def reaches_archive(
+    boundary: Optional[datetime],
+    params: dict,
+    ascending: bool = False,
+    hot: Iterable[Row] = (),
+    limit: Optional[int] = None,
+) -> bool:
+    """Whether archived rows (all started before ``boundary``) can belong in
+    a listing with these filters, given the live rows already fetched."""
+    if boundary is None:
+        return False
+    if params.get("start") is not None and params["start"] >= boundary:
+        return False
+    if ascending and "cursor_at" in params and params["cursor_at"] >= boundary:
+        return False
+    hot = list(hot)
+    if not ascending and limit is not None and len(hot) >= limit:
+        # a full newest-first page ending after the boundary is complete
+        return hot[-1].started_at < boundary
+    return True
+
+
+def merge_rows(
+    hot: Iterable, archived: Iterable, ascending: bool = False
+) -> Iterator:
+    """Interleave two listing-ordered row streams by (started_at, id)."""
+    return heapq.merge(hot, archived, key=_key, reverse=not ascending)
+
+
+def merge_page(
+    session: Session,
+    rows: list[Row],
+    params: dict,
+    ascending: bool,
+    limit: Optional[int],
+) -> list:
+    """One listing page of live ``rows`` topped up from the archive."""
+    archived = archived_activities(session, params, ascending)
+    return list(islice(merge_rows(rows, archived, ascending), limit))
+
+
+def merged_batches(
+    bind,
+    batches: Iterable[list[Row]],
+    params: dict,
+    batch_rows: int,
+    ascending: bool = False,
+) -> Iterator[list]:
+    """Batches of live and archived rows together, in listing order and
+    honouring the listing's limit; the archive is read on a session of its
+    own, like the live cursor."""
+    with Session(bind) as session:
+        hot = (row for batch in batches for row in batch)
+        archived = archived_activities(session, params, ascending)
+        rows = islice(merge_rows(hot, archived, ascending), params.get("limit"))
+        while batch := list(islice(rows, batch_rows)):
+            yield batch
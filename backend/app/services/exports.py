@@ -0,0 +1,269 @@
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import update
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+
+from app.models.entities import ExportJob, JobStatus
+from app.services.report import MEDIA_TYPES, render_report
+from app.services.stats import (
+    SERIES_FIELDS,
+    monthly_stats,
+    stats_series,
+    weekly_stats,
+    yearly_stats,
+)
+from app.utils.metrics import registry
+from app.utils.profiling import section
+from app.utils.settings import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+# statuses whose job will still produce (or has produced) a usable artifact
+LIVE_STATUSES = (JobStatus.QUEUED, JobStatus.RUNNING, JobStatus.DONE)
+EXTENSIONS = {"week_png": "png", "month_png": "png", "year_png": "png", "csv": "csv"}
+
+
+def _week_png(session: Session, job: ExportJob, params: dict) -> tuple[bytes, str]:
+    report = weekly_stats(session, job.user_id, date.fromisoformat(params["start"]))
+    with section("render"):
+        return render_report("png", report), MEDIA_TYPES["png"]
+
+
+def _month_png(session: Session, job: ExportJob, params: dict) -> tuple[bytes, str]:
+    report = monthly_stats(session, job.user_id, date.fromisoformat(params["start"]))
+    with section("render"):
+        return render_report("png", report, "month"), MEDIA_TYPES["png"]
+
+
+def _year_png(session: Session, job: ExportJob, params: dict) -> tuple[bytes, str]:
+    report = yearly_stats(session, job.user_id, date.fromisoformat(params["start"]))
+    with section("render"):
+        return render_report("png", report, "year"), MEDIA_TYPES["png"]
+
+
+def _daily_csv(session: Session, job: ExportJob, params: dict) -> tuple[bytes, str]:
+    series = stats_series(
+        session,
+        job.user_id,
+        date.fromisoformat(params["start"]),
+        date.fromisoformat(params["end"]),
+        "day",
+    )
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(("date", *SERIES_FIELDS))
+    columns = [getattr(series, field) for field in SERIES_FIELDS]
+    for day, *values in zip(series.buckets, *columns):
+        writer.writerow((day.isoformat(), *values))
+    return buffer.getvalue().encode(), "text/csv"
+
+
+BUILDERS: dict[str, Callable[[Session, ExportJob, dict], tuple[bytes, str]]] = {
+    "week_png": _week_png,
+    "month_png": _month_png,
+    "year_png": _year_png,
+    "csv": _daily_csv,
+}
+
+
+def dedup_key(kind: str, params: str, data_version: int) -> str:
+    return hashlib.sha256(f"{kind}:{params}:{data_version}".encode()).hexdigest()
+
+
+def find_reusable(session: Session, user_id: int, key: str) -> Optional[ExportJob]:
+    """A pending or still-downloadable job that will produce the same bytes."""
+    now = datetime.utcnow()
+    for job in session.exec(
+        select(ExportJob)
+        .where(ExportJob.user_id == user_id, ExportJob.dedup_key == key)
+        .where(ExportJob.status.in_(LIVE_STATUSES))
+        .order_by(ExportJob.id.desc())
+    ):
+        if job.status != JobStatus.DONE or job.expires_at > now:
+            return job
+    return None
+
+
+def artifact_path(name: str) -> str:
+    return os.path.join(settings.export_artifact_dir, name)
+
+
+def purge_expired(session: Session) -> int:
+    """Delete artifacts past their TTL and mark their jobs expired."""
+    now = datetime.utcnow()
+    jobs = session.exec(
+        select(ExportJob).where(
+            ExportJob.status == JobStatus.DONE, ExportJob.expires_at <= now
+        )
+    ).all()
+    for job in jobs:
+        if job.artifact:
+            try:
+                os.remove(artifact_path(job.artifact))
+            except FileNotFoundError:
+                pass
+        job.status = JobStatus.EXPIRED
+        job.artifact = None
+        job.updated_at = now
+        session.add(job)
+    if jobs:
+        session.commit()
+    return len(jobs)
+
+
+class JobRunner:
+    """Runs export jobs on a small thread pool, with the ExportJob table as
+    the queue.
+
+    A worker claims a job with a conditional UPDATE, so a job resubmitted
+    twice (a retry racing a restart) still runs once. Failures are retried
+    with exponential backoff up to ``max_attempts``. ``workers=0`` runs jobs
+    inline in submit(), which keeps tests deterministic.
+    """
+
+    def __init__(self, workers: int, max_attempts: int, retry_seconds: float):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.completed = registry.counter(
+            "export_jobs_completed_total", "Export jobs that produced an artifact"
+        )
+        self.retried = registry.counter(
+            "export_jobs_retried_total",
+            "Export job attempts that failed and were retried",
+        )
+        self.failed = registry.counter(
+            "export_jobs_failed_total", "Export jobs that exhausted their attempts"
+        )
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="export"
+                )
+            return self._executor
+
+    def submit(self, bind: Engine, job_id: int, delay: float = 0.0) -> None:
+        if self.workers <= 0:
+            self.run(bind, job_id)
+        elif delay > 0:
+            timer = threading.Timer(delay, self.submit, (bind, job_id))
+            timer.daemon = True
+            timer.start()
+        else:
+            self.executor.submit(self.run, bind, job_id)
+
+    def _claim(self, session: Session, job_id: int) -> bool:
+        claimed = session.exec(
+            update(ExportJob)
+            .where(ExportJob.id == job_id, ExportJob.status == JobStatus.QUEUED)
+            .values(
+                status=JobStatus.RUNNING,
+                attempts=ExportJob.attempts + 1,
+                updated_at=datetime.utcnow(),
+            )
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        session.commit()
+        return claimed == 1
+
+    def run(self, bind: Engine, job_id: int) -> None:
+        with Session(bind) as session:
+            if not self._claim(session, job_id):
+                return
+            job = session.get(ExportJob, job_id)
+            try:
+                content, media_type = BUILDERS[job.kind](
+                    session, job, json.loads(job.params)
+                )
+                name = f"{job.id}-{job.dedup_key[:16]}.{EXTENSIONS[job.kind]}"
+                os.makedirs(settings.export_artifact_dir, exist_ok=True)
+                temp = artifact_path(f".{name}.tmp")
+                with open(temp, "wb") as handle:
+                    handle.write(content)
+                os.replace(temp, artifact_path(name))
+            except Exception as exc:
+                session.rollback()
+                self._failed(session, job, exc)
+                return
+            now = datetime.utcnow()
+            job.status = JobStatus.DONE
+            job.artifact = name
+            job.media_type = media_type
+            job.error = None
+            job.updated_at = now
+            ttl = timedelta(seconds=settings.export_artifact_ttl_seconds)
+            job.expires_at = now + ttl
+            session.add(job)
+            session.commit()
+            self.completed.inc()
+
+    def _failed(self, session: Session, job: ExportJob, exc: Exception) -> None:
+        job.error = f"{type(exc).__name__}: {exc}"[:500]
+        job.updated_at = datetime.utcnow()
+        retry = job.attempts < self.max_attempts
+        job.status = JobStatus.QUEUED if retry else JobStatus.FAILED
+        session.add(job)
+        session.commit()
+        if retry:
+            self.retried.inc()
+            delay = self.retry_seconds * 2 ** (job.attempts - 1)
+            logger.warning("export job %s failed, retrying: %s", job.id, job.error)
+            self.submit(session.get_bind(), job.id, delay)
+        else:
+            self.failed.inc()
+            logger.error("export job %s failed: %s", job.id, job.error)
+
+    def resume(self, bind: Engine) -> int:
+        """Requeue jobs interrupted by a restart and clear expired artifacts.
+
+        Every worker process calls this at startup, so only RUNNING jobs older
+        than ``export_job_stale_seconds`` are requeued; QUEUED ones are safe to
+        submit anywhere since run() claims them atomically.
+        """
+        stale = datetime.utcnow() - timedelta(seconds=settings.export_job_stale_seconds)
+        with Session(bind) as session:
+            purge_expired(session)
+            session.exec(
+                update(ExportJob)
+                .where(
+                    ExportJob.status == JobStatus.RUNNING,
+                    ExportJob.updated_at < stale,
+                )
+                .values(status=JobStatus.QUEUED)
+                .execution_options(synchronize_session=False)
+            )
+            session.commit()
+            job_ids = session.exec(
+                select(ExportJob.id).where(ExportJob.status == JobStatus.QUEUED)
+            ).all()
+        for job_id in job_ids:
+            self.submit(bind, job_id)
+        return len(job_ids)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+export_runner = JobRunner(
+    settings.export_workers,
+    settings.export_job_max_attempts,
+    settings.export_job_retry_seconds,
+)
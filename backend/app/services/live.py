@@ -0,0 +1,16 @@
+from datetime import date
+from typing import Iterable
+
+from sqlmodel import Session
+
+from app.services.stats import daily_stats
+from app.utils.pubsub import broker
+
+
+def publish_daily(session: Session, user_id: int, days: Iterable[date]) -> None:
+    """Push the fresh DailyStats of each touched day to the user's open
+    streams; call after the write commits. Costs nothing without listeners."""
+    if not broker.has_subscribers(user_id):
+        return
+    for day in sorted(days):
+        broker.publish(user_id, daily_stats(session, user_id, day).model_dump_json())
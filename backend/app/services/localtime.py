@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from app.models.entities import Activity, User
+from app.utils.timezones import DEFAULT_TIMEZONE, get_zone, local_day
+
+
+def user_zone(session: Session, user_id: int) -> ZoneInfo:
+    user = session.get(User, user_id)
+    return get_zone(user.timezone if user else DEFAULT_TIMEZONE)
+
+
+def user_zone_and_archive(
+    session: Session, user_id: int
+) -> tuple[ZoneInfo, Optional[datetime]]:
+    """The user's zone and archived_before from a single lookup (the
+    identity map does not keep the User alive between calls)."""
+    user = session.get(User, user_id)
+    if user is None:
+        return get_zone(DEFAULT_TIMEZONE), None
+    return get_zone(user.timezone), user.archived_before
+
+
+def activity_day(
+    session: Session,
+    user_id: int,
+    zone: ZoneInfo,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    bucket: str = "day",
+):
+    """Local day (or bucket start) of Activity.started_at for one user's rows
+    in [start, end); open bounds are closed over the user's data."""
+    if zone.key != DEFAULT_TIMEZONE and (start is None or end is None):
+        low, high = session.exec(
+            select(
+                func.min(Activity.started_at), func.max(Activity.started_at)
+            ).where(Activity.user_id == user_id)
+        ).one()
+        now = datetime.utcnow()
+        start = start or low or now
+        end = end or (high or now) + timedelta(seconds=1)
+    dialect = session.get_bind().dialect.name
+    return local_day(Activity.started_at, zone, start, end, dialect, bucket)
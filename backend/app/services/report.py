@@ -1,74 +1,163 @@
-from datetime import date
+from functools import lru_cache
 from io import BytesIO
-from typing import Iterable
 
 from PIL import Image, ImageDraw, ImageFont
 
-from app.schemas.stats import WeeklyReportResponse
+from app.schemas.stats import ReportTotals, WeeklyReportResponse
+from app.utils.settings import settings
 
+WIDTH, HEIGHT = 800, 420
+# per-day bar chart of month and year reports: left, top, right, bottom
+CHART_BOX = (300, 130, 780, 340)
+MEDIA_TYPES = {"png": "image/png", "webp": "image/webp"}
 
-def build_weekly_report_image(report: WeeklyReportResponse) -> bytes:
-    width, height = 800, 420
-    img = Image.new("RGB", (width, height), color="#0d1b2a")
-    draw = ImageDraw.Draw(img)
-
-    try:
-        font_big = ImageFont.truetype("DejaVuSans-Bold.ttf", 26)
-        font_small = ImageFont.truetype("DejaVuSans.ttf", 18)
-    except OSError:
-        font_big = ImageFont.load_default()
-        font_small = ImageFont.load_default()
-
-    draw.text((20, 20), "Pet Time Tracker", fill="white", font=font_big)
-    draw.text(
-        (20, 60),
-        f"Week: {report.start} - {report.end}",
-        fill="#a1c6ea",
-        font=font_small,
-    )
 
-    y = 110
-    total_walk = sum(d.walk_min for d in report.days)
-    total_play = sum(d.play_min for d in report.days)
-    total_treat = sum(d.treat_count for d in report.days)
-    streak_best = max((d.streak_info or 0) for d in report.days)
-    change_pct = report.days[0].change_vs_last_week
-
-    summary_lines = [
-        f"Walk: {total_walk:.0f} min",
-        f"Play: {total_play:.0f} min",
-        f"Treats: {total_treat:.0f} times",
-        f"Streak best: {streak_best} days",
-    ]
-    if change_pct is not None:
-        arrow = "↑" if change_pct >= 0 else "↓"
-        summary_lines.append(f"Vs last week: {arrow}{abs(change_pct)*100:.1f}%")
-
-    for line in summary_lines:
-        draw.text((20, y), line, fill="white", font=font_small)
-        y += 28
-
-    bar_origin = (400, 140)
-    bar_width = 320
-    max_min = max(total_walk + total_play, 1)
-    for idx, label, value in [
-        (0, "Walk", total_walk),
-        (1, "Play", total_play),
-        (2, "Treat", total_treat),
-    ]:
-        bar_len = int((value / max_min) * bar_width)
-        y_pos = bar_origin[1] + idx * 60
-        draw.rectangle(
-            [
-                (bar_origin[0], y_pos),
-                (bar_origin[0] + bar_len, y_pos + 30),
-            ],
-            fill="#1b9aaa",
+class WeeklyReportRenderer:
+    """Holds loaded fonts and the static chrome so each render only draws data."""
+
+    def __init__(
+        self,
+        image_format: str = "png",
+        png_compress_level: int = 6,
+        webp_quality: int = 80,
+    ):
+        if image_format not in MEDIA_TYPES:
+            raise ValueError(f"Unsupported report format: {image_format}")
+        self.image_format = image_format
+        self.png_compress_level = png_compress_level
+        self.webp_quality = webp_quality
+
+        try:
+            self.font_big = ImageFont.truetype("DejaVuSans-Bold.ttf", 26)
+            self.font_small = ImageFont.truetype("DejaVuSans.ttf", 18)
+        except OSError:
+            self.font_big = ImageFont.load_default()
+            self.font_small = ImageFont.load_default()
+
+        self.base = Image.new("RGB", (WIDTH, HEIGHT), color="#0d1b2a")
+        draw = ImageDraw.Draw(self.base)
+        draw.text((20, 20), "Pet Time Tracker", fill="white", font=self.font_big)
+        draw.text((20, HEIGHT - 40), "#PetTime", fill="#a1c6ea", font=self.font_small)
+
+    @property
+    def media_type(self) -> str:
+        return MEDIA_TYPES[self.image_format]
+
+    def render(self, report: WeeklyReportResponse, period: str = "week") -> bytes:
+        img = self.base.copy()
+        draw = ImageDraw.Draw(img)
+        font_small = self.font_small
+
+        draw.text(
+            (20, 60),
+            f"{period.capitalize()}: {report.start} - {report.end}",
+            fill="#a1c6ea",
+            font=font_small,
         )
-        draw.text((bar_origin[0] + bar_len + 10, y_pos), f"{label}: {value:.0f}", fill="white", font=font_small)
 
-    draw.text((20, height - 40), "#PetTime", fill="#a1c6ea", font=font_small)
+        y = 110
+        totals = report.totals or ReportTotals.of(report.days)
+        change_pct = report.days[0].change_vs_last_week
+
+        summary_lines = [
+            f"Walk: {totals.walk_min:.0f} min",
+            f"Play: {totals.play_min:.0f} min",
+            f"Treats: {totals.treat_count:.0f} times",
+            f"Streak best: {totals.best_streak} days",
+        ]
+        if change_pct is not None:
+            arrow = "↑" if change_pct >= 0 else "↓"
+            summary_lines.append(f"Vs last {period}: {arrow}{abs(change_pct)*100:.1f}%")
+
+        for line in summary_lines:
+            draw.text((20, y), line, fill="white", font=font_small)
+            y += 28
+
+        if period == "week":
+            self._draw_totals(draw, totals)
+        else:
+            self._draw_days(draw, report)
+        return self.encode(img)
 
-    buffer = BytesIO()
-    img.save(buffer, format="PNG")
-    return buffer.getvalue()
+    def _draw_totals(self, draw: ImageDraw.ImageDraw, totals: ReportTotals) -> None:
+        bar_origin = (400, 140)
+        bar_width = 320
+        max_min = max(totals.walk_min + totals.play_min, 1)
+        for idx, label, value in [
+            (0, "Walk", totals.walk_min),
+            (1, "Play", totals.play_min),
+            (2, "Treat", totals.treat_count),
+        ]:
+            bar_len = int((value / max_min) * bar_width)
+            y_pos = bar_origin[1] + idx * 60
+            draw.rectangle(
+                [
+                    (bar_origin[0], y_pos),
+                    (bar_origin[0] + bar_len, y_pos + 30),
+                ],
+                fill="#1b9aaa",
+            )
+            draw.text(
+                (bar_origin[0] + bar_len + 10, y_pos),
+                f"{label}: {value:.0f}",
+                fill="white",
+                font=self.font_small,
+            )
+
+    def _draw_days(
+        self, draw: ImageDraw.ImageDraw, report: WeeklyReportResponse
+    ) -> None:
+        # one bar per day, walk minutes stacked under play minutes
+        left, top, right, bottom = CHART_BOX
+        step = (right - left) / len(report.days)
+        gap = 1 if step >= 4 else 0
+        peak = max((day.walk_min + day.play_min for day in report.days), default=0)
+        scale = (bottom - top) / max(peak, 1)
+        draw.line([(left, bottom), (right, bottom)], fill="#415a77")
+        for index, day in enumerate(report.days):
+            x0 = left + int(index * step)
+            x1 = max(x0, left + int((index + 1) * step) - 1 - gap)
+            walk_top = bottom - round(day.walk_min * scale)
+            play_top = walk_top - round(day.play_min * scale)
+            if day.walk_min:
+                draw.rectangle([(x0, walk_top), (x1, bottom - 1)], fill="#1b9aaa")
+            if day.play_min:
+                draw.rectangle([(x0, play_top), (x1, walk_top - 1)], fill="#f4a259")
+        font = self.font_small
+        for position, text, colour in [
+            ((left, bottom + 8), f"{report.start:%b %d}", "#a1c6ea"),
+            ((right - 70, bottom + 8), f"{report.end:%b %d}", "#a1c6ea"),
+            ((left, top - 26), "Walk", "#1b9aaa"),
+            ((left + 60, top - 26), "Play", "#f4a259"),
+            ((right - 120, top - 26), f"peak {peak:.0f} min", "white"),
+        ]:
+            draw.text(position, text, fill=colour, font=font)
+
+    def encode(self, img: Image.Image) -> bytes:
+        buffer = BytesIO()
+        if self.image_format == "webp":
+            img.save(buffer, format="WEBP", quality=self.webp_quality)
+        else:
+            img.save(buffer, format="PNG", compress_level=self.png_compress_level)
+        return buffer.getvalue()
+
+
+@lru_cache(maxsize=None)
+def get_report_renderer(image_format: str = "png") -> WeeklyReportRenderer:
+    return WeeklyReportRenderer(
+        image_format=image_format,
+        png_compress_level=settings.report_png_compress_level,
+        webp_quality=settings.report_webp_quality,
+    )
+
+
+def render_report(
+    image_format: str, report: WeeklyReportResponse, period: str = "week"
+) -> bytes:
+    # module-level so it can be shipped to a worker process; each worker
+    # keeps its own warmed renderer
+    return get_report_renderer(image_format).render(report, period)
+
+
+def build_weekly_report_image(report: WeeklyReportResponse) -> bytes:
+    return render_report("png", report)
@@ -0,0 +1,122 @@
+import os
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+from typing import Optional
+
+from sqlmodel import Session, select
+
+from app.models.entities import User
+from app.schemas.stats import WeeklyReportResponse
+from app.services.report import render_report
+from app.services.stats import period_length, period_stats_many
+from app.utils.metrics import registry
+
+reports_rendered = registry.counter(
+    "batch_reports_rendered_total", "Report images written by batch runs"
+)
+
+
+@dataclass
+class BatchResult:
+    users: int = 0
+    rendered: int = 0
+    skipped: int = 0  # no activity in the period
+    seconds: float = 0.0
+
+    @property
+    def per_second(self) -> float:
+        return self.rendered / self.seconds if self.seconds else 0.0
+
+
+def render_chunk(
+    image_format: str,
+    period: str,
+    directory: str,
+    reports: list[tuple[int, WeeklyReportResponse]],
+) -> int:
+    # runs in a pool worker: render, then write each file atomically so a
+    # reader never picks up half an image
+    for user_id, report in reports:
+        path = os.path.join(directory, f"{user_id}.{image_format}")
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as out:
+            out.write(render_report(image_format, report, period))
+        os.replace(tmp, path)
+    return len(reports)
+
+
+def _user_chunks(session: Session, chunk_size: int, user_ids=None):
+    if user_ids is not None:
+        ordered = sorted(user_ids)
+        for offset in range(0, len(ordered), chunk_size):
+            yield ordered[offset : offset + chunk_size]
+        return
+    last = 0
+    while True:
+        chunk = session.exec(
+            select(User.id).where(User.id > last).order_by(User.id).limit(chunk_size)
+        ).all()
+        if not chunk:
+            return
+        yield list(chunk)
+        last = chunk[-1]
+
+
+def render_reports(
+    bind,
+    period: str,
+    start: date,
+    out_dir: Path,
+    image_format: str = "png",
+    chunk_size: int = 500,
+    workers: int = 2,
+    user_ids: Optional[list[int]] = None,
+) -> BatchResult:
+    """Render every user's (or ``user_ids``') report for the period starting
+    at ``start`` into ``out_dir/<user_id>.<format>``.
+
+    Users are read in chunks of ``chunk_size``: one rollup query and one
+    streak query per chunk build all of its reports, which then render on
+    ``workers`` processes (0 renders inline) while the next chunk is read.
+    Users without activity in the period are skipped.
+    """
+    length = period_length(period, start)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    result = BatchResult()
+    began = time.perf_counter()
+    executor: Optional[Executor] = None
+    if workers > 0:
+        executor = ProcessPoolExecutor(max_workers=workers)
+    pending: list[Future] = []
+    try:
+        with Session(bind) as session:
+            for chunk in _user_chunks(session, chunk_size, user_ids):
+                reports = period_stats_many(session, chunk, start, length)
+                session.expunge_all()
+                # every day with activity carries a streak of at least one
+                active = [
+                    (user_id, report)
+                    for user_id, report in reports.items()
+                    if any(day.streak_info for day in report.days)
+                ]
+                result.users += len(chunk)
+                result.skipped += len(chunk) - len(active)
+                args = (image_format, period, str(out_dir), active)
+                if executor is None:
+                    result.rendered += render_chunk(*args)
+                    continue
+                pending.append(executor.submit(render_chunk, *args))
+                # keep the workers fed without holding every chunk in memory
+                while len(pending) > 2 * workers:
+                    result.rendered += pending.pop(0).result()
+        for future in pending:
+            result.rendered += future.result()
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    reports_rendered.inc(result.rendered)
+    result.seconds = time.perf_counter() - began
+    return result
@@ -0,0 +1,318 @@
+import math
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import bindparam, case, func, update
+from sqlmodel import Session, select
+
+from app.models.entities import (
+    Activity,
+    ActivityArchive,
+    ActivityType,
+    StreakSnapshot,
+    User,
+)
+from app.services.archive import archived_activities
+from app.services.localtime import activity_day, user_zone, user_zone_and_archive
+from app.services.streaks import rebuild_streak, record_activity_day, streak_for
+from app.utils.db import note_write
+from app.utils.timezones import day_bounds, local_date
+
+TOTAL_FIELDS = ("walk_min", "play_min", "treat_count", "care_count")
+GOAL_STREAK_DAYS = 3
+
+
+@dataclass
+class RollupDrift:
+    user_id: int
+    date: date
+    field: str
+    stored: Optional[float]
+    expected: Optional[float]
+
+
+def _contribution(activity: Activity) -> dict[str, float]:
+    if activity.type == ActivityType.WALK:
+        return {"walk_min": activity.amount}
+    if activity.type == ActivityType.PLAY:
+        return {"play_min": activity.amount}
+    if activity.type == ActivityType.TREAT:
+        return {"treat_count": activity.amount}
+    if activity.type == ActivityType.CARE:
+        return {"care_count": activity.amount or 1}
+    return {}
+
+
+def fold_totals(totals: dict, key, activity) -> None:
+    """Add one activity to ``totals[key]`` the way metric_columns sums it."""
+    bucket = totals.get(key)
+    if bucket is None:
+        bucket = totals[key] = {field: 0.0 for field in TOTAL_FIELDS}
+        bucket["activity_count"] = 0
+    for field, amount in _contribution(activity).items():
+        bucket[field] += amount
+    bucket["activity_count"] += 1
+
+
+def _refresh_summary(rollup: StreakSnapshot, streak: int) -> None:
+    rollup.total_minutes = round(rollup.walk_min + rollup.play_min)
+    rollup.total_treats = round(rollup.treat_count)
+    rollup.met_goal = streak >= GOAL_STREAK_DAYS
+
+
+_DATA_VERSION = select(User.data_version).where(User.id == bindparam("user_id"))
+
+
+def data_version(session: Session, user_id: int) -> int:
+    return session.execute(_DATA_VERSION, {"user_id": user_id}).scalar_one()
+
+
+_DATA_STATE = select(User.data_version, User.archived_before).where(
+    User.id == bindparam("user_id")
+)
+
+
+def data_state(session: Session, user_id: int) -> tuple[int, Optional[datetime]]:
+    """data_version and the archive cutoff, read together: a result cached
+    under a version must be computed with the cutoff of that version, not
+    one from a principal cached before an archive run."""
+    return tuple(session.execute(_DATA_STATE, {"user_id": user_id}).one())
+
+
+def bump_data_version(session: Session, user_id: int) -> None:
+    session.exec(
+        update(User)
+        .where(User.id == user_id)
+        .values(data_version=User.data_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    note_write(user_id)
+
+
+def record_activities(
+    session: Session, user_id: int, activities: Iterable[Activity]
+) -> dict[date, StreakSnapshot]:
+    """Fold new activities into their days' rollups and the user's streak state.
+
+    Nothing is committed here, so the rollups land in the same transaction
+    as the activity rows themselves.
+    """
+    zone = user_zone(session, user_id)
+    by_day: dict[date, list[Activity]] = defaultdict(list)
+    for activity in activities:
+        by_day[local_date(activity.started_at, zone)].append(activity)
+    rollups = {
+        rollup.date: rollup
+        for rollup in session.exec(
+            select(StreakSnapshot).where(
+                StreakSnapshot.user_id == user_id,
+                StreakSnapshot.date.in_(list(by_day)),
+            )
+        )
+    }
+
+    new_days = []
+    for day in sorted(by_day):
+        rollup = rollups.get(day) or StreakSnapshot(user_id=user_id, date=day)
+        if not rollup.activity_count:
+            new_days.append(day)
+        for activity in by_day[day]:
+            for field, amount in _contribution(activity).items():
+                setattr(rollup, field, getattr(rollup, field) + amount)
+            rollup.activity_count += 1
+        rollups[day] = rollup
+        session.add(rollup)
+
+    for day in new_days:
+        state = record_activity_day(session, user_id, day)
+    for day in sorted(by_day):
+        _refresh_summary(rollups[day], streak_for(session, user_id, day))
+    for day in new_days:
+        if day >= state.last_active_date:
+            continue
+        # a backdated day lengthens the streak of every day in the run after it
+        streak = streak_for(session, user_id, day)
+        later = read_rollups(
+            session, user_id, day + timedelta(days=1), state.last_active_date
+        )
+        next_day = day + timedelta(days=1)
+        while next_day in later:
+            streak += 1
+            _refresh_summary(later[next_day], streak)
+            next_day += timedelta(days=1)
+
+    bump_data_version(session, user_id)
+    return rollups
+
+
+def record_activity(session: Session, activity: Activity) -> StreakSnapshot:
+    (rollup,) = record_activities(session, activity.user_id, [activity]).values()
+    return rollup
+
+
+def read_rollups(
+    session: Session, user_id: int, first: date, last: date
+) -> dict[date, StreakSnapshot]:
+    query = select(StreakSnapshot).where(
+        StreakSnapshot.user_id == user_id,
+        StreakSnapshot.date >= first,
+        StreakSnapshot.date <= last,
+        StreakSnapshot.activity_count > 0,
+    )
+    return {rollup.date: rollup for rollup in session.exec(query)}
+
+
+def metric_columns() -> list:
+    """SUM/CASE aggregates for each rollup field plus the activity count."""
+
+    def amount_of(kind: ActivityType, amount=Activity.amount):
+        return func.sum(case((Activity.type == kind, amount), else_=0.0))
+
+    # care entries without an amount count as one
+    care = case((Activity.amount == 0, 1.0), else_=Activity.amount)
+    return [
+        amount_of(ActivityType.WALK).label("walk_min"),
+        amount_of(ActivityType.PLAY).label("play_min"),
+        amount_of(ActivityType.TREAT).label("treat_count"),
+        amount_of(ActivityType.CARE, care).label("care_count"),
+        func.count(Activity.id).label("activity_count"),
+    ]
+
+
+def raw_daily_totals(
+    session: Session,
+    user_id: int,
+    first: Optional[date] = None,
+    last: Optional[date] = None,
+) -> dict[date, dict[str, float]]:
+    # one grouped SUM/CASE query over raw activities, bucketed by local day;
+    # archived ones are decoded and folded in here
+    zone, boundary = user_zone_and_archive(session, user_id)
+    start = None if first is None else day_bounds(first, first, zone)[0]
+    end = None if last is None else day_bounds(last, last, zone)[1]
+    day = activity_day(session, user_id, zone, start, end).label("day")
+    query = select(day, *metric_columns()).where(Activity.user_id == user_id)
+    if start is not None:
+        query = query.where(Activity.started_at >= start)
+    if end is not None:
+        query = query.where(Activity.started_at < end)
+    fields = (*TOTAL_FIELDS, "activity_count")
+    totals = {
+        row.day: {field: getattr(row, field) for field in fields}
+        for row in session.exec(query.group_by(day))
+    }
+    if boundary is not None and (start is None or start < boundary):
+        params = {"user_id": user_id, "start": start, "end": end}
+        params = {key: value for key, value in params.items() if value is not None}
+        for activity in archived_activities(session, params):
+            fold_totals(totals, local_date(activity.started_at, zone), activity)
+    return totals
+
+
+def _expected_rollups(session: Session, user_id: int) -> dict[date, StreakSnapshot]:
+    expected = {}
+    run = 0
+    previous: Optional[date] = None
+    for day, totals in sorted(raw_daily_totals(session, user_id).items()):
+        run = run + 1 if previous == day - timedelta(days=1) else 1
+        previous = day
+        rollup = StreakSnapshot(user_id=user_id, date=day, **totals)
+        _refresh_summary(rollup, run)
+        expected[day] = rollup
+    return expected
+
+
+def _same(stored, expected) -> bool:
+    if isinstance(stored, float) and isinstance(expected, float):
+        # SQL SUM may add in a different order than the incremental rollup
+        return math.isclose(stored, expected, rel_tol=1e-9, abs_tol=1e-9)
+    return stored == expected
+
+
+def verify_rollups(
+    session: Session, user_id: int, repair: bool = False
+) -> list[RollupDrift]:
+    """Recompute a user's rollups from raw activities and report any drift.
+
+    With ``repair`` the stored rows are rewritten to match; the caller commits.
+    """
+    expected = _expected_rollups(session, user_id)
+    stored = {
+        rollup.date: rollup
+        for rollup in session.exec(
+            select(StreakSnapshot).where(StreakSnapshot.user_id == user_id)
+        )
+    }
+    fields = (*TOTAL_FIELDS, "activity_count", "met_goal")
+    drift: list[RollupDrift] = []
+    for day in sorted(expected.keys() | stored.keys()):
+        want, have = expected.get(day), stored.get(day)
+        if have is not None and want is None and not have.activity_count:
+            # empty legacy snapshot; not drift, but no longer needed
+            continue
+        for field in fields:
+            want_value = getattr(want, field) if want else None
+            have_value = getattr(have, field) if have else None
+            if not _same(have_value, want_value):
+                drift.append(RollupDrift(user_id, day, field, have_value, want_value))
+
+    if repair:
+        for day, have in stored.items():
+            if day not in expected:
+                session.delete(have)
+        for day, want in expected.items():
+            have = stored.get(day)
+            if have is None:
+                session.add(want)
+                continue
+            for field in (*fields, "total_minutes", "total_treats"):
+                setattr(have, field, getattr(want, field))
+            session.add(have)
+    return drift
+
+
+def rebuild_all_rollups(session: Session, repair: bool = False) -> list[RollupDrift]:
+    user_ids = sorted(
+        set(session.exec(select(Activity.user_id).distinct()).all())
+        | set(session.exec(select(ActivityArchive.user_id).distinct()).all())
+        | set(session.exec(select(StreakSnapshot.user_id).distinct()).all())
+    )
+    drift: list[RollupDrift] = []
+    for user_id in user_ids:
+        drift.extend(verify_rollups(session, user_id, repair=repair))
+    if repair:
+        session.commit()
+    return drift
+
+
+def backfill_rollups(session: Session) -> list[int]:
+    """Build rollups and streak state for users who have activities but no
+    rollup rows, as on a database from before rollups existed; stats read
+    nothing else, so they would report zero totals. Returns the user ids;
+    the caller commits."""
+    has_activity = select(Activity.id).where(Activity.user_id == User.id).exists()
+    has_rollup = (
+        select(StreakSnapshot.id)
+        .where(StreakSnapshot.user_id == User.id, StreakSnapshot.activity_count > 0)
+        .exists()
+    )
+    user_ids = session.exec(
+        select(User.id).where(has_activity, ~has_rollup).order_by(User.id)
+    ).all()
+    for user_id in user_ids:
+        verify_rollups(session, user_id, repair=True)
+        session.flush()
+        rebuild_streak(session, user_id)
+        bump_data_version(session, user_id)
+    return list(user_ids)
+
+
+def rebucket_user(session: Session, user_id: int) -> None:
+    """Re-derive a user's day rollups and streak after their timezone moved
+    the local day boundaries; the caller commits."""
+    verify_rollups(session, user_id, repair=True)
+    session.flush()
+    rebuild_streak(session, user_id)
+    bump_data_version(session, user_id)
@@ -1,110 +1,339 @@
-from collections import defaultdict
 from datetime import date, datetime, timedelta
-from typing import List
+from typing import Iterable, List, Optional, Sequence
 
 from sqlmodel import Session, select
 
-from app.models.entities import Activity, StreakSnapshot, ActivityType
-from app.schemas.stats import DailyStats, WeeklyStatsItem, WeeklyReportResponse
+from app.models.entities import Activity, ActivityType, StreakSnapshot, StreakState
+from app.schemas.stats import (
+    DailyStats,
+    PetSeries,
+    ReportTotals,
+    StatsSeriesResponse,
+    WeeklyReportResponse,
+    WeeklyStatsItem,
+)
+from app.services.archive import archived_activities
+from app.services.localtime import activity_day, user_zone_and_archive
+from app.services.rollups import (
+    TOTAL_FIELDS,
+    fold_totals,
+    metric_columns,
+    read_rollups,
+)
+from app.services.streaks import streak_for, streak_from_state
+from app.utils.profiling import section
+from app.utils.timezones import day_bounds, get_zone, local_date
 
 
-def _date_bounds(target: date) -> tuple[datetime, datetime]:
-    start = datetime.combine(target, datetime.min.time())
-    end = start + timedelta(days=1)
-    return start, end
+def _totals(rollup) -> dict[str, float]:
+    if rollup is None:
+        return {field: 0.0 for field in TOTAL_FIELDS}
+    return {field: getattr(rollup, field) for field in TOTAL_FIELDS}
 
 
-def _aggregate_daily(session: Session, user_id: int, target: date) -> DailyStats:
-    start, end = _date_bounds(target)
-    query = select(Activity).where(
-        Activity.user_id == user_id,
-        Activity.started_at >= start,
-        Activity.started_at < end,
-    )
-    records = session.exec(query).all()
-    totals = defaultdict(float)
-    for act in records:
-        if act.type == ActivityType.WALK:
-            totals["walk_min"] += act.amount
-        elif act.type == ActivityType.PLAY:
-            totals["play_min"] += act.amount
-        elif act.type == ActivityType.TREAT:
-            totals["treat_count"] += act.amount
-        elif act.type == ActivityType.CARE:
-            totals["care_count"] += act.amount or 1
-    streak_info = _streak(session, user_id, target)
+@section("stats")
+def daily_stats(session: Session, user_id: int, target: date) -> DailyStats:
+    rollup = read_rollups(session, user_id, target, target).get(target)
     return DailyStats(
         date=target,
-        walk_min=totals["walk_min"],
-        play_min=totals["play_min"],
-        treat_count=totals["treat_count"],
-        care_count=totals["care_count"],
-        streak_info=streak_info,
+        **_totals(rollup),
+        streak_info=streak_for(session, user_id, target),
     )
 
 
-def _streak(session: Session, user_id: int, target: date) -> int:
-    # counts consecutive days with any activity ending at target
-    days = 0
-    check_day = target
-    while True:
-        start, end = _date_bounds(check_day)
-        has_activity = session.exec(
-            select(Activity.id).where(
-                Activity.user_id == user_id,
-                Activity.started_at >= start,
-                Activity.started_at < end,
-            ).limit(1)
-        ).first()
-        if not has_activity:
-            break
-        days += 1
-        check_day = check_day - timedelta(days=1)
-    # persist streak snapshot for lightweight history (optional)
-    snapshot = session.exec(
-        select(StreakSnapshot).where(
-            StreakSnapshot.user_id == user_id, StreakSnapshot.date == target
-        )
-    ).first()
-    if not snapshot:
-        snapshot = StreakSnapshot(
-            user_id=user_id,
-            date=target,
-            total_minutes=0,
-            total_treats=0,
-            met_goal=days >= 3,
-        )
-        session.add(snapshot)
-        session.commit()
-    return days
-
-
-def daily_stats(session: Session, user_id: int, target: date) -> DailyStats:
-    return _aggregate_daily(session, user_id, target)
+def _streak_window(
+    rollups: dict, start: date, length: int
+) -> tuple[int, Optional[date]]:
+    """Active days in a row ending the day before ``start``, counted within
+    the previous period; when the run fills it, also the day before it,
+    whose stored streak has to be added."""
+    last_period_start = start - timedelta(days=length)
+    streak = 0
+    check_day = start - timedelta(days=1)
+    while check_day >= last_period_start and check_day in rollups:
+        streak += 1
+        check_day -= timedelta(days=1)
+    return streak, check_day if check_day < last_period_start else None
 
 
-def weekly_stats(session: Session, user_id: int, start: date) -> WeeklyReportResponse:
+def _period_report(
+    rollups: dict, start: date, length: int, streak: int
+) -> WeeklyReportResponse:
+    # rollups cover the period and the same number of days before it;
+    # streak is the run entering the period
+    last_period_start = start - timedelta(days=length)
     days: List[WeeklyStatsItem] = []
-    for i in range(7):
+    for i in range(length):
         day_date = start + timedelta(days=i)
-        day_stats = _aggregate_daily(session, user_id, day_date)
-        days.append(WeeklyStatsItem(**day_stats.dict()))
+        rollup = rollups.get(day_date)
+        streak = streak + 1 if rollup else 0
+        days.append(
+            WeeklyStatsItem(date=day_date, **_totals(rollup), streak_info=streak)
+        )
 
-    last_week_start = start - timedelta(days=7)
-    last_week_totals = defaultdict(float)
-    for i in range(7):
-        prev_day = last_week_start + timedelta(days=i)
-        prev = _aggregate_daily(session, user_id, prev_day)
-        last_week_totals["walk_min"] += prev.walk_min + prev.play_min
+    last_period_total = 0.0
+    for i in range(length):
+        prev = rollups.get(last_period_start + timedelta(days=i))
+        if prev:
+            last_period_total += prev.walk_min + prev.play_min
 
-    current_total = sum(d.walk_min + d.play_min for d in days)
+    totals = ReportTotals.of(days)
+    current_total = totals.walk_min + totals.play_min
     change = None
-    if last_week_totals["walk_min"] > 0:
-        change = (current_total - last_week_totals["walk_min"]) / last_week_totals[
-            "walk_min"
-        ]
+    if last_period_total > 0:
+        change = (current_total - last_period_total) / last_period_total
 
     for d in days:
         d.change_vs_last_week = change
 
-    return WeeklyReportResponse(start=start, end=start + timedelta(days=6), days=days)
+    return WeeklyReportResponse(
+        start=start, end=start + timedelta(days=length - 1), days=days, totals=totals
+    )
+
+
+@section("stats")
+def period_stats(
+    session: Session, user_id: int, start: date, length: int
+) -> WeeklyReportResponse:
+    """Per-day stats for ``length`` days from ``start``, compared with the
+    same number of days before it; both periods come from one rollup read."""
+    first = start - timedelta(days=length)
+    rollups = read_rollups(session, user_id, first, start + timedelta(days=length - 1))
+    # only consult the stored streak when the whole previous period was
+    # active, otherwise the window holds the answer
+    streak, before = _streak_window(rollups, start, length)
+    if before is not None:
+        streak += streak_for(session, user_id, before)
+    return _period_report(rollups, start, length, streak)
+
+
+# how far back a chunked report looks for a streak the stored state cannot
+# answer before asking per user
+STREAK_LOOKBACK_DAYS = 62
+
+
+def _runs_ending_at(
+    session: Session, user_ids: list[int], target: date
+) -> dict[int, Optional[int]]:
+    # one query over a bounded window; None when a run may reach past it
+    first = target - timedelta(days=STREAK_LOOKBACK_DAYS - 1)
+    active: dict[int, set[date]] = {user_id: set() for user_id in user_ids}
+    for user_id, day in session.exec(
+        select(StreakSnapshot.user_id, StreakSnapshot.date).where(
+            StreakSnapshot.user_id.in_(user_ids),
+            StreakSnapshot.date >= first,
+            StreakSnapshot.date <= target,
+            StreakSnapshot.activity_count > 0,
+        )
+    ):
+        active[user_id].add(day)
+    runs: dict[int, Optional[int]] = {}
+    for user_id, days in active.items():
+        run = 0
+        while target - timedelta(days=run) in days:
+            run += 1
+        runs[user_id] = None if run == STREAK_LOOKBACK_DAYS else run
+    return runs
+
+
+@section("stats")
+def period_stats_many(
+    session: Session, user_ids: Sequence[int], start: date, length: int
+) -> dict[int, WeeklyReportResponse]:
+    """period_stats for a chunk of users from one rollup query and one
+    streak-state query, instead of two round trips per user. Streaks the
+    state cannot answer take one more query for the chunk."""
+    first = start - timedelta(days=length)
+    last = start + timedelta(days=length - 1)
+    by_user: dict[int, dict] = {user_id: {} for user_id in user_ids}
+    for rollup in session.exec(
+        select(StreakSnapshot).where(
+            StreakSnapshot.user_id.in_(user_ids),
+            StreakSnapshot.date >= first,
+            StreakSnapshot.date <= last,
+            StreakSnapshot.activity_count > 0,
+        )
+    ):
+        by_user[rollup.user_id][rollup.date] = rollup
+
+    windows = {
+        user_id: _streak_window(rollups, start, length)
+        for user_id, rollups in by_user.items()
+    }
+    streaks = {user_id: streak for user_id, (streak, _) in windows.items()}
+    # with a fixed start, every user that needs it looks up the same day
+    before = first - timedelta(days=1)
+    waiting = [user_id for user_id, (_, day) in windows.items() if day is not None]
+    if waiting:
+        states = {
+            state.user_id: state
+            for state in session.exec(
+                select(StreakState).where(StreakState.user_id.in_(waiting))
+            )
+        }
+        unknown = []
+        for user_id in waiting:
+            run = streak_from_state(states.get(user_id), before)
+            if run is None:
+                unknown.append(user_id)
+            else:
+                streaks[user_id] += run
+        if unknown:
+            for user_id, run in _runs_ending_at(session, unknown, before).items():
+                if run is None:
+                    run = streak_for(session, user_id, before)
+                streaks[user_id] += run
+
+    return {
+        user_id: _period_report(rollups, start, length, streaks[user_id])
+        for user_id, rollups in by_user.items()
+    }
+
+
+def weekly_stats(session: Session, user_id: int, start: date) -> WeeklyReportResponse:
+    return period_stats(session, user_id, start, 7)
+
+
+def period_length(period: str, start: date) -> int:
+    """Days in the week, calendar month or calendar year starting at ``start``."""
+    if period == "week":
+        return 7
+    if period == "month":
+        return ((start + timedelta(days=31)).replace(day=1) - start).days
+    if period == "year":
+        return (start.replace(year=start.year + 1) - start).days
+    raise ValueError(f"Unknown report period: {period}")
+
+
+def period_start(period: str, day: date) -> date:
+    """First day of the week (Monday), month or year holding ``day``."""
+    if period == "year":
+        return day.replace(month=1, day=1)
+    return bucket_start(day, period)
+
+
+def monthly_stats(session: Session, user_id: int, month: date) -> WeeklyReportResponse:
+    first = month.replace(day=1)
+    return period_stats(session, user_id, first, period_length("month", first))
+
+
+def yearly_stats(session: Session, user_id: int, year: date) -> WeeklyReportResponse:
+    first = year.replace(month=1, day=1)
+    return period_stats(session, user_id, first, period_length("year", first))
+
+
+SERIES_FIELDS = (*TOTAL_FIELDS, "activity_count")
+# longest range a single series request may cover, in buckets
+MAX_SERIES_BUCKETS = {"day": 366, "week": 156, "month": 60}
+
+
+def bucket_start(day: date, bucket: str) -> date:
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+def series_bucket_count(start: date, end: date, bucket: str) -> int:
+    """len(series_buckets(...)), without building them."""
+    first = bucket_start(start, bucket)
+    if end < first:
+        return 0
+    if bucket == "month":
+        return (end.year - first.year) * 12 + end.month - first.month + 1
+    return (end - first).days // (7 if bucket == "week" else 1) + 1
+
+
+def series_buckets(start: date, end: date, bucket: str) -> List[date]:
+    buckets = []
+    current = bucket_start(start, bucket)
+    while current <= end:
+        buckets.append(current)
+        if bucket == "month":
+            current = (current + timedelta(days=31)).replace(day=1)
+        else:
+            current += timedelta(days=7 if bucket == "week" else 1)
+    return buckets
+
+
+def _empty_metrics(size: int) -> dict[str, list]:
+    metrics = {field: [0.0] * size for field in TOTAL_FIELDS}
+    metrics["activity_count"] = [0] * size
+    return metrics
+
+
+@section("stats")
+def stats_series(
+    session: Session,
+    user_id: int,
+    start: date,
+    end: date,
+    bucket: str = "day",
+    pet_id: Optional[int] = None,
+    types: Optional[Iterable[ActivityType]] = None,
+    timezone: Optional[str] = None,
+    archived: Optional[datetime] = None,
+) -> StatsSeriesResponse:
+    """Totals per local-date bucket over [start, end], overall and per pet,
+    from a single query grouped by (bucket, pet).
+
+    Pass the user's ``timezone`` (and ``archived``, their archived_before)
+    when the caller already knows them to save looking them up.
+    """
+    if timezone:
+        zone = get_zone(timezone)
+    else:
+        zone, archived = user_zone_and_archive(session, user_id)
+    first, until = day_bounds(start, end, zone)
+    column = activity_day(session, user_id, zone, first, until, bucket).label("bucket")
+    query = select(column, Activity.pet_id, *metric_columns()).where(
+        Activity.user_id == user_id,
+        Activity.started_at >= first,
+        Activity.started_at < until,
+    )
+    if pet_id is not None:
+        query = query.where(Activity.pet_id == pet_id)
+    if types:
+        query = query.where(Activity.type.in_(list(types)))
+
+    buckets = series_buckets(start, end, bucket)
+    position = {bucket_day: index for index, bucket_day in enumerate(buckets)}
+    totals = _empty_metrics(len(buckets))
+    pets: dict[int, dict[str, list]] = {}
+    for row in session.exec(query.group_by(column, Activity.pet_id)):
+        index = position[row.bucket]
+        per_pet = pets.setdefault(row.pet_id, _empty_metrics(len(buckets)))
+        for field in SERIES_FIELDS:
+            value = getattr(row, field)
+            totals[field][index] += value
+            per_pet[field][index] += value
+
+    if archived is not None and first < archived:
+        params = {"user_id": user_id, "start": first, "end": until}
+        if pet_id is not None:
+            params["pet_id"] = pet_id
+        if types:
+            params["types"] = list(types)
+        folded: dict[tuple[date, Optional[int]], dict] = {}
+        for activity in archived_activities(session, params):
+            day = bucket_start(local_date(activity.started_at, zone), bucket)
+            fold_totals(folded, (day, activity.pet_id), activity)
+        for (day, pet), values in folded.items():
+            index = position[day]
+            per_pet = pets.setdefault(pet, _empty_metrics(len(buckets)))
+            for field in SERIES_FIELDS:
+                totals[field][index] += values[field]
+                per_pet[field][index] += values[field]
+
+    return StatsSeriesResponse(
+        start=start,
+        end=end,
+        bucket=bucket,
+        buckets=buckets,
+        **totals,
+        pets=[
+            PetSeries(pet_id=pet, **pets[pet])
+            for pet in sorted(pets, key=lambda pet: (pet is None, pet or 0))
+        ],
+    )
@@ -0,0 +1,130 @@
+import heapq
+from datetime import date, datetime, timedelta
+from itertools import groupby
+from typing import Iterable, Optional
+
+from sqlmodel import Session, select
+
+from app.models.entities import Activity, ActivityArchive, StreakSnapshot, StreakState
+from app.services.localtime import activity_day, user_zone_and_archive
+from app.utils.timezones import day_bounds, local_date
+
+
+def _active_days(
+    session: Session, user_id: int, upto: Optional[date] = None
+) -> Iterable[date]:
+    # distinct active local days, newest first; callers stop at the first gap,
+    # so rows are only read as far back as the run reaches
+    zone, archived_before = user_zone_and_archive(session, user_id)
+    end = None if upto is None else day_bounds(upto, upto, zone)[1]
+    day = activity_day(session, user_id, zone, archived_before, end).label("day")
+    query = select(day).where(Activity.user_id == user_id)
+    if end is not None:
+        query = query.where(Activity.started_at < end)
+    if archived_before is None:
+        return session.exec(query.group_by(day).order_by(day.desc()))
+    # archived rows are folded into the day rollups before they leave the
+    # activity table, so the days up to the cutoff come from the rollups
+    # (which hold live rows backdated past it too) without decoding blocks
+    query = query.where(Activity.started_at >= archived_before)
+    recent = session.exec(query.group_by(day).order_by(day.desc()))
+    last = local_date(archived_before, zone)
+    if upto is not None:
+        last = min(last, upto)
+    older = session.exec(
+        select(StreakSnapshot.date)
+        .where(
+            StreakSnapshot.user_id == user_id,
+            StreakSnapshot.date <= last,
+            StreakSnapshot.activity_count > 0,
+        )
+        .order_by(StreakSnapshot.date.desc())
+    )
+    # the cutoff's own day can come from both
+    return (key for key, _ in groupby(heapq.merge(recent, older, reverse=True)))
+
+
+def _run_ending_at(days: Iterable[date], target: date) -> int:
+    run = 0
+    expected = target
+    for day in days:
+        if day != expected:
+            break
+        run += 1
+        expected -= timedelta(days=1)
+    return run
+
+
+def compute_streak(session: Session, user_id: int, target: date) -> int:
+    # counts consecutive days with any activity ending at target
+    return _run_ending_at(_active_days(session, user_id, target), target)
+
+
+def rebuild_streak(session: Session, user_id: int) -> StreakState:
+    state = session.get(StreakState, user_id) or StreakState(user_id=user_id)
+    days = iter(_active_days(session, user_id))
+    last = next(days, None)
+    state.last_active_date = last
+    state.current_run = 0 if last is None else 1 + _run_ending_at(
+        days, last - timedelta(days=1)
+    )
+    state.updated_at = datetime.utcnow()
+    session.add(state)
+    return state
+
+
+def record_activity_day(session: Session, user_id: int, day: date) -> StreakState:
+    """Fold a newly added activity day into the user's streak state.
+
+    Runs inside the caller's transaction; the activity row must already be
+    added to the session so a repair can see it.
+    """
+    state = session.get(StreakState, user_id)
+    if state is None or state.last_active_date is None:
+        return rebuild_streak(session, user_id)
+
+    last = state.last_active_date
+    run_start = last - timedelta(days=state.current_run - 1)
+    if day > last:
+        consecutive = day == last + timedelta(days=1)
+        state.current_run = state.current_run + 1 if consecutive else 1
+        state.last_active_date = day
+    elif day == run_start - timedelta(days=1):
+        # backdated insert bridging the gap before the current run; the run
+        # may now join an older one, so recount it
+        state.current_run = compute_streak(session, user_id, last)
+    else:
+        return state
+    state.updated_at = datetime.utcnow()
+    session.add(state)
+    return state
+
+
+def streak_from_state(state: Optional[StreakState], target: date) -> Optional[int]:
+    """The streak at ``target`` if the stored state alone can tell, else None."""
+    if state is None:
+        return None
+    if state.last_active_date is None or target > state.last_active_date:
+        return 0
+    run_start = state.last_active_date - timedelta(days=state.current_run - 1)
+    if target >= run_start:
+        return (target - run_start).days + 1
+    return None
+
+
+def streak_for(session: Session, user_id: int, target: date) -> int:
+    streak = streak_from_state(session.get(StreakState, user_id), target)
+    if streak is None:
+        return compute_streak(session, user_id, target)
+    return streak
+
+
+def backfill_streaks(session: Session) -> int:
+    user_ids = sorted(
+        set(session.exec(select(Activity.user_id).distinct()).all())
+        | set(session.exec(select(ActivityArchive.user_id).distinct()).all())
+    )
+    for user_id in user_ids:
+        rebuild_streak(session, user_id)
+    session.commit()
+    return len(user_ids)
@@ -0,0 +1,183 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Hashable, Optional, Protocol
+
+from .metrics import registry
+
+
+class CacheBackend(Protocol):
+    def get(self, key: str) -> Optional[bytes]: ...
+
+    def set(self, key: str, value: bytes) -> None: ...
+
+    def clear(self) -> None: ...
+
+
+class MemoryCache:
+    """Process-local LRU bounded by entry count and total payload size."""
+
+    def __init__(self, max_items: int = 1024, max_bytes: int = 64 * 1024 * 1024):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = value
+            self._size += len(value)
+            while len(self._entries) > self.max_items or self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+class DiskCache:
+    """One file per entry in a directory; least recently read files go first."""
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / hashlib.sha256(key.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            value = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        # mtime doubles as the LRU clock
+        os.utime(path)
+        return value
+
+    def set(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        path = self._path(key)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(value)
+        os.replace(tmp, path)
+        with self._lock:
+            self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            for path in self.directory.iterdir():
+                path.unlink(missing_ok=True)
+
+    def _evict(self) -> None:
+        entries = []
+        for path in self.directory.iterdir():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+class TTLCache:
+    """Small in-process map whose entries expire after ``ttl_seconds``."""
+
+    def __init__(self, ttl_seconds: float, max_items: int = 10_000):
+        self.ttl_seconds = ttl_seconds
+        self.max_items = max_items
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class CountingCache:
+    """Any backend, with hits and misses counted in the metrics registry."""
+
+    def __init__(self, backend: CacheBackend, name: str):
+        self.backend = backend
+        self.hits = registry.counter(f"{name}_cache_hits_total", f"{name} cache hits")
+        self.misses = registry.counter(
+            f"{name}_cache_misses_total", f"{name} cache misses"
+        )
+
+    def get(self, key: str) -> Optional[bytes]:
+        value = self.backend.get(key)
+        (self.misses if value is None else self.hits).inc()
+        return value
+
+    def set(self, key: str, value: bytes) -> None:
+        self.backend.set(key, value)
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+
+def build_cache(
+    backend: str, directory: str, max_bytes: int, name: Optional[str] = None
+) -> CacheBackend:
+    if backend == "memory":
+        cache = MemoryCache(max_bytes=max_bytes)
+    elif backend == "disk":
+        cache = DiskCache(directory, max_bytes=max_bytes)
+    else:
+        raise ValueError(f"Unknown cache backend: {backend}")
+    return CountingCache(cache, name) if name else cache
+
+
+def etag_for(key: str) -> str:
+    return f'"{hashlib.sha256(key.encode()).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {tag.strip() for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
@@ -1,14 +1,236 @@
+import logging
+
+from sqlalchemy import event, inspect, literal, make_url
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.pool import QueuePool
 from sqlmodel import SQLModel, create_engine, Session
+from .cache import TTLCache
 from .settings import settings
 
+# async driver -> the sync driver the CLI and sync routes fall back to
+ASYNC_DRIVERS = {"aiosqlite": "pysqlite", "asyncpg": "psycopg2", "asyncmy": "pymysql"}
+
+
+def is_async_url(url: str) -> bool:
+    return make_url(url).get_driver_name() in ASYNC_DRIVERS
+
+
+def sync_url(url: str) -> str:
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_driver_name())
+    if driver is None:
+        return url
+    drivername = f"{parsed.get_backend_name()}+{driver}"
+    return parsed.set(drivername=drivername).render_as_string(hide_password=False)
+
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def _engine_options(url: str) -> dict:
+    parsed = make_url(url)
+    options = {
+        "echo": False,
+        "query_cache_size": settings.db_statement_cache_size,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "pool_recycle": settings.db_pool_recycle_seconds,
+    }
+    connect_args = {}
+    if parsed.get_backend_name() == "sqlite":
+        connect_args["check_same_thread"] = False
+        if parsed.database in (None, "", ":memory:"):
+            # in-memory databases use a singleton pool without overflow
+            return {**options, "connect_args": connect_args}
+    if parsed.get_driver_name() == "asyncpg":
+        connect_args["prepared_statement_cache_size"] = settings.db_statement_cache_size
+    return {
+        **options,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "connect_args": connect_args,
+    }
+
+
+def _sqlite_pragmas() -> dict:
+    return {
+        "journal_mode": settings.sqlite_journal_mode,
+        "synchronous": settings.sqlite_synchronous,
+        "busy_timeout": settings.sqlite_busy_timeout_ms,
+        "mmap_size": settings.sqlite_mmap_size,
+    }
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    for name, value in _sqlite_pragmas().items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def build_engine(url: str) -> Engine:
+    engine = create_engine(url, **_engine_options(url))
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _apply_sqlite_pragmas)
+    return engine
+
+
+def build_async_engine(url: str):
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    engine = create_async_engine(url, **_engine_options(url))
+    if engine.dialect.name == "sqlite":
+        event.listen(engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    return engine
+
+
+engine = build_engine(sync_url(settings.database_url))
+async_engine = None
+if is_async_url(settings.database_url):
+    async_engine = build_async_engine(settings.database_url)
+
+read_engine = engine
+async_read_engine = async_engine
+if settings.read_database_url:
+    read_engine = build_engine(sync_url(settings.read_database_url))
+    if is_async_url(settings.read_database_url):
+        async_read_engine = build_async_engine(settings.read_database_url)
+
+# users who wrote within the sticky window read from the primary, so they see
+# their own writes even while the replica lags
+recent_writers = TTLCache(settings.read_sticky_seconds, max_items=100_000)
+
 
-engine = create_engine(settings.database_url, echo=False, connect_args={"check_same_thread": False} if settings.database_url.startswith("sqlite") else {})
+def note_write(user_id: int) -> None:
+    recent_writers.set(user_id, True)
+
+
+def reads_from_primary(user_id: int) -> bool:
+    if not settings.read_database_url:
+        return True
+    return recent_writers.get(user_id) is not None
+
+
+def describe_engine(conn: Connection) -> dict:
+    """Effective pool and connection settings, as reported by the database."""
+    pool = conn.engine.pool
+    queued = isinstance(pool, QueuePool)
+    effective = {
+        "pool": type(pool).__name__,
+        "pool_size": pool.size() if queued else None,
+        "max_overflow": pool._max_overflow if queued else None,
+        "pool_recycle": pool._recycle,
+        "pool_pre_ping": pool._pre_ping,
+        "statement_cache_size": settings.db_statement_cache_size,
+    }
+    if conn.dialect.name == "sqlite":
+        for name in _sqlite_pragmas():
+            effective[name] = conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+    return effective
+
+
+def _log_engine(conn: Connection) -> None:
+    values = " ".join(f"{key}={value}" for key, value in describe_engine(conn).items())
+    logger.info("database %s: %s", conn.engine.url.render_as_string(), values)
+
+
+def _add_missing_columns(conn: Connection) -> None:
+    # create_all only creates missing tables; add columns introduced since
+    inspector = inspect(conn)
+    quote = conn.dialect.identifier_preparer.quote
+    for table in SQLModel.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            # quoted as the dialect requires: "user" is reserved on Postgres
+            ddl = f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} "
+            ddl += column.type.compile(dialect=conn.dialect)
+            if column.default is not None and column.default.is_scalar:
+                default = literal(column.default.arg, column.type).compile(
+                    dialect=conn.dialect, compile_kwargs={"literal_binds": True}
+                )
+                ddl += f" NOT NULL DEFAULT {default}"
+            conn.exec_driver_sql(ddl)
+
+
+def _add_missing_indexes(conn: Connection) -> None:
+    # likewise, indexes declared after a table was created are not added by it
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def _add_sqlite_autoincrement(conn: Connection) -> None:
+    # AUTOINCREMENT cannot be added in place: rebuild tables that declare
+    # sqlite_autoincrement but were created before they did, so rowids of
+    # deleted rows are never handed out again
+    if conn.dialect.name != "sqlite":
+        return
+    quote = conn.dialect.identifier_preparer.quote
+    for table in SQLModel.metadata.sorted_tables:
+        if not table.dialect_options["sqlite"]["autoincrement"]:
+            continue
+        ddl = conn.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+            (table.name,),
+        ).scalar()
+        if ddl is None or "AUTOINCREMENT" in ddl.upper():
+            continue
+        old = f"_{table.name}_rebuild"
+        conn.exec_driver_sql(f"ALTER TABLE {quote(table.name)} RENAME TO {old}")
+        for index in inspect(conn).get_indexes(old):
+            conn.exec_driver_sql(f"DROP INDEX {quote(index['name'])}")
+        table.create(conn)
+        columns = ", ".join(
+            quote(column["name"]) for column in inspect(conn).get_columns(old)
+        )
+        conn.exec_driver_sql(
+            f"INSERT INTO {quote(table.name)} ({columns}) SELECT {columns} FROM {old}"
+        )
+        conn.exec_driver_sql(f"DROP TABLE {old}")
+
+
+def _backfill_rollups(conn: Connection) -> None:
+    # stats read only the daily rollups, so a database upgraded from before
+    # they existed must have them built before anything is served
+    from app.services.rollups import backfill_rollups  # that module imports this
+
+    with Session(bind=conn) as session:
+        user_ids = backfill_rollups(session)
+        session.flush()
+    if user_ids:
+        logger.info("built daily rollups for %d users", len(user_ids))
+
+
+def _migrate(conn: Connection) -> None:
+    SQLModel.metadata.create_all(conn)
+    _add_missing_columns(conn)
+    _add_sqlite_autoincrement(conn)
+    _add_missing_indexes(conn)
+    _backfill_rollups(conn)
 
 
 def init_db() -> None:
-    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        _migrate(conn)
+        _log_engine(conn)
+
+
+async def init_db_async() -> None:
+    async with async_engine.begin() as conn:
+        await conn.run_sync(_migrate)
+        await conn.run_sync(_log_engine)
 
 
 def get_session():
     with Session(engine) as session:
         yield session
+
+
+async def get_async_session():
+    from sqlmodel.ext.asyncio.session import AsyncSession
+
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
@@ -0,0 +1,159 @@
+import threading
+from bisect import bisect_left
+from typing import Callable, Optional, Sequence
+
+# seconds; spans cached reads (ms) to cold report renders (s)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+
+def _label_value(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self.kind = "counter"
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def samples(self) -> list[tuple[str, float]]:
+        return [(self.name, self._value)]
+
+
+class Gauge:
+    def __init__(
+        self, name: str, help_text: str, func: Optional[Callable[[], float]] = None
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.kind = "gauge"
+        self._value = 0.0
+        self._func = func
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.inc(-amount)
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    @property
+    def value(self) -> float:
+        return self._func() if self._func else self._value
+
+    def samples(self) -> list[tuple[str, float]]:
+        return [(self.name, self.value)]
+
+
+class Histogram:
+    """Cumulative-bucket histogram, optionally split by label values."""
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        labelnames: Sequence[str] = (),
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.kind = "histogram"
+        self.buckets = tuple(sorted(buckets))
+        self.labelnames = tuple(labelnames)
+        # label values -> per-bucket counts (last is +Inf), sum, count
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def total(self, *labels: str) -> float:
+        series = self._series.get(labels)
+        return series[1] if series else 0.0
+
+    def samples(self) -> list[tuple[str, float]]:
+        samples = []
+        with self._lock:
+            series = sorted(
+                (labels, list(counts), total, count)
+                for labels, (counts, total, count) in self._series.items()
+            )
+        for labels, counts, total, count in series:
+            pairs = [
+                f'{name}="{_label_value(value)}"'
+                for name, value in zip(self.labelnames, labels)
+            ]
+            running = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                running += bucket_count
+                le = bound if isinstance(bound, str) else f"{bound:g}"
+                labelset = ",".join([*pairs, f'le="{le}"'])
+                samples.append((f"{self.name}_bucket{{{labelset}}}", running))
+            suffix = "{" + ",".join(pairs) + "}" if pairs else ""
+            samples.append((f"{self.name}_sum{suffix}", total))
+            samples.append((f"{self.name}_count{suffix}", count))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, object] = {}
+
+    def register(self, metric):
+        # idempotent so modules can be re-imported (tests, reloads)
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self.register(Counter(name, help_text))
+
+    def gauge(
+        self, name: str, help_text: str, func: Optional[Callable[[], float]] = None
+    ) -> Gauge:
+        return self.register(Gauge(name, help_text, func))
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        labelnames: Sequence[str] = (),
+    ) -> Histogram:
+        return self.register(Histogram(name, help_text, buckets, labelnames))
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample, value in metric.samples():
+                lines.append(f"{sample} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
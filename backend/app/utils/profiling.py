@@ -0,0 +1,246 @@
+import cProfile
+import functools
+import inspect
+import io
+import marshal
+import pstats
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Optional
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .metrics import registry
+from .settings import settings
+
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+request_seconds = registry.histogram(
+    "http_request_duration_seconds",
+    "Request latency until the last body byte is sent",
+    labelnames=("method", "route"),
+)
+request_statements = registry.histogram(
+    "http_request_sql_statements",
+    "SQL statements issued per request",
+    buckets=STATEMENT_BUCKETS,
+    labelnames=("method", "route"),
+)
+request_sql_seconds = registry.histogram(
+    "http_request_sql_seconds",
+    "Time spent executing SQL per request",
+    labelnames=("method", "route"),
+)
+statements_total = registry.counter("db_statements_total", "SQL statements executed")
+statement_seconds = registry.histogram(
+    "db_statement_duration_seconds", "Duration of single SQL statements"
+)
+section_seconds = registry.histogram(
+    "section_duration_seconds",
+    "Time spent in named hot sections",
+    labelnames=("section",),
+)
+
+
+@dataclass
+class RequestStats:
+    statements: int = 0
+    sql_seconds: float = 0.0
+    sections: dict[str, float] = field(default_factory=lambda: defaultdict(float))
+    # per-thread profilers of a profiled request; None when not profiling
+    profiles: Optional[list[cProfile.Profile]] = None
+
+
+# one loop-thread profiler at a time; a second X-Profile request is served
+# normally rather than clobbering the first one's profile
+_profiling = threading.Lock()
+
+# mutable per-request record; sync routes run on threadpool copies of the
+# request's context, so they see (and update) the same object
+current_request: ContextVar[Optional[RequestStats]] = ContextVar(
+    "current_request", default=None
+)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("statement_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["statement_started"].pop()
+    statements_total.inc()
+    statement_seconds.observe(elapsed)
+    stats = current_request.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.sql_seconds += elapsed
+
+
+@contextmanager
+def section(name: str):
+    """Time a named hot section; also usable as a decorator on sync code."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        section_seconds.observe(elapsed, name)
+        stats = current_request.get()
+        if stats is not None:
+            stats.sections[name] += elapsed
+
+
+def _profiled_in_thread(call):
+    # cProfile only sees the thread that enabled it; sync endpoints run on a
+    # threadpool worker, so a profiled request profiles that call there too
+    @functools.wraps(call)
+    def wrapper(*args, **kwargs):
+        stats = current_request.get()
+        if stats is None or stats.profiles is None:
+            return call(*args, **kwargs)
+        profile = cProfile.Profile()
+        stats.profiles.append(profile)
+        return profile.runcall(call, *args, **kwargs)
+
+    return wrapper
+
+
+class InstrumentedRoute(APIRoute):
+    """Route class for every API router: lets X-Profile see into sync
+    endpoints. Async ones run on the loop thread, which the middleware
+    profiles directly."""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        if not inspect.iscoroutinefunction(endpoint):
+            endpoint = _profiled_in_thread(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+def _route_label(scope) -> str:
+    """The matched route's template, e.g. /export/jobs/{job_id}, so label
+    cardinality stays bounded."""
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if template is None:
+        return "unmatched"
+    # the route may be relative to an include prefix; recover the prefix as
+    # the part of the path in front of what the route's own pattern matches
+    path = scope["path"]
+    for start in range(len(path)):
+        if path[start] == "/" and route.path_regex.fullmatch(path[start:]):
+            return path[:start] + template
+    return template
+
+
+def _server_timing(stats: RequestStats) -> bytes:
+    sql_ms = stats.sql_seconds * 1000
+    entries = [f'sql;dur={sql_ms:.2f};desc="{stats.statements} queries"']
+    entries += [
+        f"{name};dur={seconds * 1000:.2f}" for name, seconds in stats.sections.items()
+    ]
+    return ", ".join(entries).encode()
+
+
+def _profile_response(
+    profiles: list[cProfile.Profile], mode: str
+) -> tuple[bytes, str]:
+    merged = pstats.Stats(profiles[0])
+    for profile in profiles[1:]:
+        merged.add(profile)
+    if mode == "prof":
+        # the format pstats.Stats(path) / snakeviz load
+        return marshal.dumps(merged.stats), "application/octet-stream"
+    out = io.StringIO()
+    merged.stream = out
+    merged.sort_stats("cumulative").print_stats(settings.profiling_top_functions)
+    return out.getvalue().encode(), "text/plain; charset=utf-8"
+
+
+class InstrumentationMiddleware:
+    """Per-route latency, SQL count/time and hot-section timings, recorded
+    into the metrics registry and echoed in a Server-Timing header.
+
+    With ``profiling_enabled``, a request sent with ``X-Profile: text`` (or
+    ``prof`` for the binary pstats dump) runs under cProfile and answers with
+    the profile instead of its normal body; the route's own status goes in
+    ``X-Profile-Status``.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        mode = None
+        if settings.profiling_enabled:
+            for name, value in scope["headers"]:
+                if name == b"x-profile":
+                    mode = "prof" if value.strip().lower() == b"prof" else "text"
+        token = current_request.set(stats)
+        started = time.perf_counter()
+
+        async def send_timed(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"server-timing", _server_timing(stats)),
+                ]
+            await send(message)
+
+        try:
+            if mode is not None and _profiling.acquire(blocking=False):
+                try:
+                    await self._profiled(scope, receive, send, stats, mode)
+                finally:
+                    _profiling.release()
+            else:
+                await self.app(scope, receive, send_timed)
+        finally:
+            current_request.reset(token)
+            elapsed = time.perf_counter() - started
+            labels = (scope["method"], _route_label(scope))
+            request_seconds.observe(elapsed, *labels)
+            request_statements.observe(stats.statements, *labels)
+            request_sql_seconds.observe(stats.sql_seconds, *labels)
+
+    async def _profiled(self, scope, receive, send, stats: RequestStats, mode: str):
+        status = 500
+        stats.profiles = [cProfile.Profile()]
+
+        async def discard(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        loop_profile = stats.profiles[0]
+        loop_profile.enable()
+        try:
+            await self.app(scope, receive, discard)
+        finally:
+            loop_profile.disable()
+        body, media_type = _profile_response(stats.profiles, mode)
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", media_type.encode()),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"x-profile-status", str(status).encode()),
+                    (b"server-timing", _server_timing(stats)),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,102 @@
+import asyncio
+import threading
+from collections import defaultdict
+from typing import AsyncIterator, Hashable, Optional
+
+from .metrics import registry
+from .settings import settings
+
+
+class Subscription:
+    """One connection's bounded mailbox on the event loop that created it.
+
+    A consumer that falls a whole queue behind is dropped rather than
+    buffered: it stops receiving and should reconnect to resync.
+    """
+
+    def __init__(self, broker: "Broker", topic: Hashable, maxsize: int):
+        self.broker = broker
+        self.topic = topic
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue[Optional[str]] = asyncio.Queue(maxsize)
+        self.dropped = False
+
+    def offer(self, message: str) -> None:
+        # runs on self.loop
+        if self.dropped:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped = True
+            self.broker.dropped.inc()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def messages(self, heartbeat: float) -> AsyncIterator[Optional[str]]:
+        """Published messages, with None every ``heartbeat`` seconds of quiet;
+        ends when the consumer is dropped."""
+        while True:
+            try:
+                message = await asyncio.wait_for(self.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            if message is None:
+                return
+            yield message
+
+
+class Broker:
+    """In-process pub/sub fanning messages out to per-connection queues.
+
+    publish() may be called from any thread (sync routes run on the
+    threadpool); delivery hops onto each subscriber's loop.
+    """
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._topics: dict[Hashable, set[Subscription]] = defaultdict(set)
+        self._lock = threading.Lock()
+        self.dropped = registry.counter(
+            "stream_dropped_total", "stream consumers dropped for falling behind"
+        )
+        registry.gauge(
+            "stream_subscribers", "open stream connections", func=self.subscriber_count
+        )
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(subs) for subs in self._topics.values())
+
+    def has_subscribers(self, topic: Hashable) -> bool:
+        with self._lock:
+            return bool(self._topics.get(topic))
+
+    def subscribe(self, topic: Hashable) -> Subscription:
+        subscription = Subscription(self, topic, self.queue_size)
+        with self._lock:
+            self._topics[topic].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subs = self._topics.get(subscription.topic)
+            if subs is not None:
+                subs.discard(subscription)
+                if not subs:
+                    del self._topics[subscription.topic]
+
+    def publish(self, topic: Hashable, message: str) -> None:
+        with self._lock:
+            subs = list(self._topics.get(topic, ()))
+        for subscription in subs:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, message)
+            except RuntimeError:
+                # the subscriber's loop has closed
+                self.unsubscribe(subscription)
+
+
+broker = Broker(settings.stream_queue_size)
@@ -0,0 +1,47 @@
+import json
+from datetime import date, datetime
+from enum import Enum
+from typing import Any
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional, see the "orjson" extra
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value: Any) -> bytes:
+    """JSON bytes for plain data (dicts, lists, rows' mappings), formatted like
+    pydantic's own output for the same values."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, default=_default, separators=(",", ":")).encode()
+
+
+def dumps_lines(values) -> bytes:
+    """NDJSON: one document per line, newline-terminated."""
+    if orjson is not None:
+        option = orjson.OPT_APPEND_NEWLINE
+        return b"".join(orjson.dumps(value, option=option) for value in values)
+    return b"".join(dumps(value) + b"\n" for value in values)
+
+
+class JSONBytesResponse(Response):
+    """JSON response rendered straight from plain data, without a pydantic
+    validation pass; routes return it to skip response_model handling."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
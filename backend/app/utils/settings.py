@@ -1,12 +1,73 @@
+from typing import Optional
+
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
     secret_key: str = "dev-key"
     database_url: str = "sqlite:///./pet_tracker.db"
+    # optional replica for read-only stats/export routes; a user's reads stay
+    # on the primary for read_sticky_seconds after they write
+    read_database_url: Optional[str] = None
+    read_sticky_seconds: float = 5.0
+    # connection pool; ignored where the dialect pools differently (sqlite://)
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_recycle_seconds: int = 1800
+    db_pool_pre_ping: bool = True
+    db_statement_cache_size: int = 500  # compiled SQL, and asyncpg statements
+    # applied to every new SQLite connection
+    sqlite_journal_mode: str = "wal"
+    sqlite_synchronous: str = "normal"
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    # argon2 | scrypt | bcrypt | pbkdf2_sha256; falls back to pbkdf2_sha256
+    # when the scheme's backend is missing. Rounds are in the scheme's own
+    # unit (None: passlib's default); `python -m app.cli calibrate-hash`
+    # suggests a value. Stored hashes are upgraded on successful login.
+    password_hash_scheme: str = "pbkdf2_sha256"
+    password_hash_rounds: Optional[int] = None
+    password_hash_memory_kib: Optional[int] = None  # argon2 only
     access_token_expire_minutes: int = 15
     refresh_token_expire_minutes: int = 60 * 24 * 7
     frontend_origin: str = "http://localhost:5173"
+    # trust verified access tokens for users seen within the TTL, skipping
+    # the per-request User lookup; revocation is immediate in this process
+    auth_stateless: bool = False
+    auth_user_cache_ttl_seconds: int = 60
+    auth_token_cache_size: int = 10_000
+    stats_cache_backend: str = "memory"  # memory | disk
+    stats_cache_dir: str = "./.cache/stats"
+    stats_cache_max_bytes: int = 16 * 1024 * 1024
+    report_cache_backend: str = "memory"  # memory | disk
+    report_cache_dir: str = "./.cache/reports"
+    report_cache_max_bytes: int = 64 * 1024 * 1024
+    report_png_compress_level: int = 6  # 0-9; lower encodes faster, larger
+    report_webp_quality: int = 80
+    stream_queue_size: int = 16  # per connection; a full queue drops the consumer
+    stream_heartbeat_seconds: float = 15.0
+    cpu_pool_workers: int = 2  # processes for hashing/rendering; 0 uses threads
+    cpu_pool_max_pending: int = 32
+    cpu_pool_retry_after_seconds: int = 1
+    export_workers: int = 2  # threads running export jobs; 0 runs them inline
+    export_artifact_dir: str = "./.cache/exports"
+    export_artifact_ttl_seconds: int = 3600
+    export_job_max_attempts: int = 3
+    export_job_retry_seconds: float = 2.0  # doubled after each failed attempt
+    # a RUNNING job untouched this long lost its worker and is requeued on
+    # startup; younger ones may still be running in another process
+    export_job_stale_seconds: int = 900
+    # rows per cursor fetch, streamed chunk and Parquet row group
+    export_batch_rows: int = 10_000
+    export_gzip_level: int = 6
+    # archive-activities moves whole UTC months older than this out of the
+    # activity table; in stateless auth mode, listings may take up to
+    # auth_user_cache_ttl_seconds to start reading a freshly archived month
+    archive_horizon_days: int = 365
+    archive_compress_level: int = 9  # zlib, 1-9
+    # honour X-Profile request headers; exposes internals, keep off in production
+    profiling_enabled: bool = False
+    profiling_top_functions: int = 40
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,120 @@
+from datetime import date, datetime, time, timedelta, timezone
+from functools import lru_cache
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlalchemy import Date, case, cast, func
+
+DEFAULT_TIMEZONE = "UTC"
+EPOCH = datetime(1970, 1, 1)
+
+# SQLite date() modifiers that move a local date to its bucket start
+BUCKET_MODIFIERS = {
+    "day": (),
+    "week": ("weekday 0", "-6 days"),  # Monday, matching date.weekday()
+    "month": ("start of month",),
+}
+
+Segments = tuple[tuple[Optional[datetime], int], ...]
+
+
+@lru_cache(maxsize=None)
+def get_zone(name: str) -> ZoneInfo:
+    return ZoneInfo(name)
+
+
+def is_valid_timezone(name: str) -> bool:
+    try:
+        get_zone(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+    return True
+
+
+def _offset(zone: ZoneInfo, moment: datetime) -> int:
+    # UTC offset in seconds at a naive UTC instant
+    aware = moment.replace(tzinfo=timezone.utc).astimezone(zone)
+    return int(aware.utcoffset().total_seconds())
+
+
+def local_date(moment: datetime, zone: ZoneInfo) -> date:
+    """Local calendar date of a naive UTC timestamp."""
+    return (moment + timedelta(seconds=_offset(zone, moment))).date()
+
+
+def local_midnight(day: date, zone: ZoneInfo) -> datetime:
+    """Naive UTC instant at which ``day`` starts in ``zone``."""
+    aware = datetime.combine(day, time(), tzinfo=zone)
+    return aware.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def day_bounds(first: date, last: date, zone: ZoneInfo) -> tuple[datetime, datetime]:
+    """Half-open naive UTC range covering local days ``first``..``last``."""
+    return local_midnight(first, zone), local_midnight(last + timedelta(days=1), zone)
+
+
+@lru_cache(maxsize=4096)
+def offset_segments(zone: ZoneInfo, start: datetime, end: datetime) -> Segments:
+    """The zone's UTC offsets over [start, end) as (segment end, offset) pairs.
+
+    Every segment but the last ends at the first UTC second of the next
+    offset; the last one is open-ended. Probing once a day finds each DST
+    transition, which is then pinned down to the second by bisection.
+    """
+    segments = []
+    current = _offset(zone, start)
+    probe = start
+    while probe < end:
+        step = min(probe + timedelta(days=1), end)
+        offset = _offset(zone, step)
+        if offset != current:
+            low = int((probe - EPOCH).total_seconds())
+            high = int((step - EPOCH).total_seconds())
+            while high - low > 1:
+                middle = (low + high) // 2
+                if _offset(zone, EPOCH + timedelta(seconds=middle)) == current:
+                    low = middle
+                else:
+                    high = middle
+            segments.append((EPOCH + timedelta(seconds=high), current))
+            current = offset
+        probe = step
+    segments.append((None, current))
+    return tuple(segments)
+
+
+def _shifted_date(column, offset: int, dialect: str, bucket: str):
+    if dialect == "postgresql":
+        moment = column + timedelta(seconds=offset) if offset else column
+        return cast(func.date_trunc(bucket, moment), Date)
+    modifiers = (f"{offset:+d} seconds",) if offset else ()
+    return func.date(column, *modifiers, *BUCKET_MODIFIERS[bucket], type_=Date)
+
+
+def local_day(
+    column,
+    zone: ZoneInfo,
+    start: datetime,
+    end: datetime,
+    dialect: str,
+    bucket: str = "day",
+):
+    """SQL expression for the local date (or bucket start) of a naive UTC
+    column, valid for rows in [start, end).
+
+    The offsets are precomputed for the range, so the database only picks a
+    fixed shift per row instead of converting timezones.
+    """
+    if zone.key == DEFAULT_TIMEZONE:
+        return _shifted_date(column, 0, dialect, bucket)
+    segments = offset_segments(zone, start, end)
+    last = _shifted_date(column, segments[-1][1], dialect, bucket)
+    if len(segments) == 1:
+        return last
+    return case(
+        *[
+            (column < until, _shifted_date(column, offset, dialect, bucket))
+            for until, offset in segments[:-1]
+        ],
+        else_=last,
+    )
@@ -0,0 +1,73 @@
+import asyncio
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from .metrics import registry
+from .settings import settings
+
+
+class PoolSaturated(Exception):
+    """Raised instead of queueing when the CPU pool is at its pending limit."""
+
+
+class CpuPool:
+    """Bounded executor for CPU-bound work (password hashing, image encoding).
+
+    ``workers`` processes run the work; ``max_pending`` caps running plus
+    queued jobs so a burst is rejected up front instead of piling up.
+    ``workers=0`` runs jobs on threads, which keeps tests and dev servers light.
+    """
+
+    def __init__(self, name: str, workers: int, max_pending: int):
+        self.name = name
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[Executor] = None
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        registry.gauge(
+            f"{name}_in_flight", "Jobs running or queued", lambda: self._in_flight
+        )
+        registry.gauge(
+            f"{name}_queue_depth",
+            "Jobs waiting for a free worker",
+            lambda: max(0, self._in_flight - max(self.workers, 1)),
+        )
+        registry.gauge(
+            f"{name}_capacity", "Pending job limit", lambda: self.max_pending
+        )
+        self.rejected = registry.counter(
+            f"{name}_rejected_total", "Jobs rejected because the pool was full"
+        )
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.workers > 0:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(thread_name_prefix=self.name)
+        return self._executor
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        with self._lock:
+            if self._in_flight >= self.max_pending:
+                self.rejected.inc()
+                raise PoolSaturated(self.name)
+            self._in_flight += 1
+        try:
+            return await asyncio.wrap_future(self.executor.submit(func, *args))
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+cpu_pool = CpuPool(
+    "cpu_pool", settings.cpu_pool_workers, settings.cpu_pool_max_pending
+)
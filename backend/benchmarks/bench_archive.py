@@ -0,0 +1,142 @@
+"""Hot-path query time and SQLite file size before and after archiving.
+
+Generates a multi-year dataset, copies it, and runs the archive-activities
+job (then VACUUM) on the copy. The same statements the endpoints issue are
+then timed against both files, alternating between them so drift in machine
+load hits both sides alike. Each sample runs the statement for every user on
+a fresh connection, so SQLite's page cache starts cold as it would for a
+request landing on a new pooled connection.
+
+Reads that reach into archived months and the full export are timed too:
+they decode compressed blocks and are the price of the smaller live table.
+
+Run from backend/: python -m benchmarks.bench_archive [users] [years] [horizon]
+"""
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, time as day_time, timedelta
+from pathlib import Path
+
+from sqlalchemy import create_engine, func
+from sqlalchemy.pool import NullPool
+from sqlmodel import Session, select
+
+from app.api.activities import activities_query
+from app.models.entities import Activity, User
+from app.services import archive
+from app.services.activity_export import stream_batches
+from app.services.archival import archive_activities
+from app.services.rollups import raw_daily_totals
+from app.services.stats import stats_series
+from benchmarks.datagen import END, generate
+
+SAMPLES = 15
+
+
+def _first_page(session: Session, user: User) -> int:
+    query, params = activities_query(user.id, None, None, None, None, None, None, 51)
+    rows = session.execute(query, params).all()
+    if archive.reaches_archive(user.archived_before, params, False, rows, 51):
+        rows = archive.merge_page(session, rows, params, False, 51)
+    return len(rows)
+
+
+def _archived_page(session: Session, user: User) -> int:
+    end = datetime.combine(END - timedelta(days=600), day_time())
+    query, params = activities_query(user.id, None, None, None, None, None, end, 51)
+    rows = session.execute(query, params).all()
+    if archive.reaches_archive(user.archived_before, params, False, rows, 51):
+        rows = archive.merge_page(session, rows, params, False, 51)
+    return len(rows)
+
+
+def _series_quarter(session: Session, user: User) -> int:
+    series = stats_series(
+        session, user.id, END - timedelta(days=89), END, "day", None, None,
+        user.timezone, user.archived_before,
+    )
+    return sum(series.activity_count)
+
+
+def _recent_totals(session: Session, user: User) -> int:
+    # what verify-rollups and a timezone change recompute, last 90 days
+    return len(raw_daily_totals(session, user.id, END - timedelta(days=89), END))
+
+
+def _export(session: Session, user: User) -> int:
+    query, params = activities_query(user.id, None, None, None, None, None, None)
+    bind = session.get_bind()
+    batches = stream_batches(bind, query, params, 10_000)
+    if archive.reaches_archive(user.archived_before, params):
+        batches = archive.merged_batches(bind, batches, params, 10_000)
+    return sum(len(batch) for batch in batches)
+
+
+SCENARIOS = {
+    "activities_first_page": _first_page,
+    "stats_series_quarter": _series_quarter,
+    "raw_totals_quarter": _recent_totals,
+    "activities_archived_page": _archived_page,
+    "export_all": _export,
+}
+
+
+def _sample(engine, scenario) -> tuple[float, int]:
+    with Session(engine) as session:
+        users = session.exec(select(User)).all()
+    started = time.perf_counter()
+    rows = 0
+    for user in users:
+        with Session(engine) as session:
+            rows += scenario(session, user)
+    return (time.perf_counter() - started) * 1000, rows
+
+
+def main(users: int = 20, years: float = 3, horizon: int = 365) -> None:
+    directory = Path(tempfile.mkdtemp())
+    live, archived = directory / "live.db", directory / "archived.db"
+    count = generate(create_engine(f"sqlite:///{live}"), users, 2, years)
+    shutil.copy(live, archived)
+    engine = create_engine(f"sqlite:///{archived}")
+    with Session(engine) as session:
+        moved = archive_activities(session, horizon, datetime.combine(END, day_time()))
+    with engine.connect() as conn:
+        conn.exec_driver_sql("VACUUM")
+    engine.dispose()
+    print(
+        f"{users} users, {years:g} years, {count} activities; "
+        f"archived {sum(moved.values())} older than {horizon} days"
+    )
+
+    engines = {
+        path: create_engine(f"sqlite:///{path}", poolclass=NullPool)
+        for path in (live, archived)
+    }
+    print(f"{'all users, median ms':<26} {'before':>9} {'after':>9} {'change':>7}")
+    for name, scenario in SCENARIOS.items():
+        samples = {path: [] for path in engines}
+        rows = {}
+        for _ in range(SAMPLES):
+            for path, engine in engines.items():
+                elapsed, rows[path] = _sample(engine, scenario)
+                samples[path].append(elapsed)
+        if rows[live] != rows[archived]:
+            raise RuntimeError(
+                f"{name}: {rows[live]} rows before, {rows[archived]} after"
+            )
+        before, after = (statistics.median(samples[path]) for path in engines)
+        change = (after - before) / before * 100
+        print(f"{name:<26} {before:>9.1f} {after:>9.1f} {change:>+6.0f}%")
+
+    for path, engine in engines.items():
+        with Session(engine) as session:
+            rows = session.exec(select(func.count(Activity.id))).one()
+        size = path.stat().st_size / 2**20
+        print(f"{path.name:<14} {size:>7.1f} MiB, {rows} live activity rows")
+
+
+if __name__ == "__main__":
+    main(*(float(arg) if i == 1 else int(arg) for i, arg in enumerate(sys.argv[1:])))
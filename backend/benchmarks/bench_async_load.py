@@ -0,0 +1,117 @@
+"""Throughput of the sync and async database modes under concurrent clients.
+
+Starts uvicorn against a throwaway SQLite file once per mode and drives a mix
+of list and stats reads plus activity writes from N concurrent clients.
+
+Run from backend/: python -m benchmarks.bench_async_load [requests_per_level]
+"""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+
+LEVELS = (50, 200, 1000)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(database_url: str, port: int) -> subprocess.Popen:
+    env = {**os.environ, "DATABASE_URL": database_url, "AUTH_STATELESS": "true"}
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--port", str(port), "--log-level", "warning",
+        ],
+        env=env,
+    )
+    deadline = time.monotonic() + 20
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/metrics", timeout=1)
+            return process
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"server for {database_url} did not start")
+
+
+async def _prepare(client: httpx.AsyncClient) -> tuple[dict, int]:
+    credentials = {"email": "load@example.com", "password": "secret123"}
+    await client.post("/auth/signup", json=credentials)
+    res = await client.post("/auth/login/json", json=credentials)
+    headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+    res = await client.post("/pets", json={"name": "Milo"}, headers=headers)
+    return headers, res.json()["id"]
+
+
+async def _run_level(
+    client: httpx.AsyncClient, headers: dict, pet_id: int, concurrency: int, total: int
+) -> tuple[float, int]:
+    today = datetime.utcnow().date().isoformat()
+    payload = {
+        "pet_id": pet_id,
+        "type": "walk",
+        "amount": 10,
+        "unit": "min",
+        "started_at": datetime.utcnow().isoformat(),
+    }
+    gate = asyncio.Semaphore(concurrency)
+    errors = 0
+
+    async def one(index: int) -> None:
+        nonlocal errors
+        async with gate:
+            if index % 10 == 0:
+                request = client.post("/activities", json=payload, headers=headers)
+            elif index % 2:
+                request = client.get(f"/stats/daily?date={today}", headers=headers)
+            else:
+                request = client.get("/activities?limit=20", headers=headers)
+            try:
+                res = await request
+                errors += res.status_code >= 400
+            except httpx.HTTPError:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(total)))
+    return total / (time.perf_counter() - start), errors
+
+
+async def _drive(port: int, total: int) -> None:
+    limits = httpx.Limits(max_connections=max(LEVELS))
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60
+    ) as client:
+        headers, pet_id = await _prepare(client)
+        for concurrency in LEVELS:
+            rate, errors = await _run_level(client, headers, pet_id, concurrency, total)
+            print(f"  {concurrency:>5} clients: {rate:8.0f} req/s {errors} errors")
+
+
+def main(total: int = 3000) -> None:
+    directory = Path(tempfile.mkdtemp())
+    for label, scheme in (("sync", "sqlite"), ("async", "sqlite+aiosqlite")):
+        port = _free_port()
+        server = _start_server(f"{scheme}:///{directory / label}.db", port)
+        print(f"{label} ({scheme})")
+        try:
+            asyncio.run(_drive(port, total))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,40 @@
+"""Per-request cost of authentication: User lookup versus stateless claims.
+
+Run from backend/: python -m benchmarks.bench_auth [requests]
+"""
+import sys
+import time
+
+from sqlalchemy import event
+
+from app.utils.settings import settings
+from benchmarks.common import auth_headers, build_client
+
+
+def main(requests: int = 2000) -> None:
+    client, engine = build_client()
+    headers = auth_headers(client)
+    statements = []
+    event.listen(
+        engine,
+        "before_cursor_execute",
+        lambda *args: statements.append(args[2]),
+    )
+
+    for stateless in (False, True):
+        settings.auth_stateless = stateless
+        client.get("/pets", headers=headers)
+        statements.clear()
+        start = time.perf_counter()
+        for _ in range(requests):
+            client.get("/pets", headers=headers)
+        elapsed = time.perf_counter() - start
+        label = "stateless" if stateless else "lookup"
+        print(
+            f"{label:>9}: {elapsed / requests * 1e6:8.0f} us/request "
+            f"{len(statements) / requests:.1f} queries/request"
+        )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
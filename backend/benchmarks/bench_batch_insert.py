@@ -0,0 +1,50 @@
+"""Single-row POST /activities versus POST /activities/batch.
+
+Run from backend/: python -m benchmarks.bench_batch_insert [rows]
+"""
+import sys
+from datetime import datetime, timedelta
+
+from benchmarks.common import auth_headers, build_client, timed
+
+BATCH_SIZE = 500
+
+
+def _payloads(count: int, prefix: str) -> list[dict]:
+    now = datetime.utcnow()
+    return [
+        {
+            "type": "walk",
+            "amount": 1,
+            "unit": "min",
+            "started_at": (now - timedelta(minutes=i)).isoformat(),
+            "source": "auto_gps",
+            "idempotency_key": f"{prefix}-{i}",
+        }
+        for i in range(count)
+    ]
+
+
+def main(rows: int = 2000) -> None:
+    client, _ = build_client()
+    results: dict[str, float] = {}
+
+    headers = auth_headers(client, "single@example.com")
+    with timed("single", results):
+        for payload in _payloads(rows, "single"):
+            client.post("/activities", json=payload, headers=headers)
+
+    headers = auth_headers(client, "batch@example.com")
+    payloads = _payloads(rows, "batch")
+    with timed("batch", results):
+        for offset in range(0, rows, BATCH_SIZE):
+            chunk = payloads[offset : offset + BATCH_SIZE]
+            client.post("/activities/batch", json={"items": chunk}, headers=headers)
+
+    for label, seconds in results.items():
+        print(f"{label:>6}: {rows / seconds:10.0f} rows/s ({seconds:.2f}s)")
+    print(f"speedup: {results['single'] / results['batch']:.1f}x")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,93 @@
+"""Peak RSS of GET /export/activities.csv against row count.
+
+Each measurement runs in a fresh process so ru_maxrss belongs to that export
+alone. "stream" is the export path (server-side cursor, fixed-size batches);
+"materialize" fetches every row first, like paging through list_activities.
+
+Run from backend/: python -m benchmarks.bench_export_rss [rows ...]
+"""
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from benchmarks.common import build_client
+
+
+def _seed(path: Path, rows: int) -> None:
+    _, engine = build_client(path)
+    engine.dispose()
+    start = datetime(2020, 1, 1)
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "INSERT INTO user (id, email, password_hash, timezone, data_version,"
+            " token_version, created_at) VALUES (1, 'rss@example.com', 'x', 'UTC',"
+            " 0, 0, ?)",
+            (start.isoformat(sep=" "),),
+        )
+        conn.executemany(
+            "INSERT INTO activity (user_id, type, amount, unit, started_at,"
+            " note, source, created_at) VALUES (1, 'WALK', 10, 'MIN', ?, ?,"
+            " 'MANUAL', ?)",
+            (
+                (
+                    (start + timedelta(minutes=i)).isoformat(sep=" "),
+                    f"walk {i}",
+                    start.isoformat(sep=" "),
+                )
+                for i in range(rows)
+            ),
+        )
+
+
+def _child(path: str, mode: str) -> None:
+    from sqlmodel import Session, create_engine
+
+    from app.api.activities import activities_query
+    from app.services.activity_export import csv_chunks, stream_batches
+    from app.utils.settings import settings
+
+    engine = create_engine(f"sqlite:///{path}")
+    query, params = activities_query(1, None, None, None, None, None, None)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    began = time.perf_counter()
+    if mode == "stream":
+        batches = stream_batches(engine, query, params, settings.export_batch_rows)
+    else:
+        with Session(engine) as session:
+            batches = iter([session.execute(query, params).all()])
+    size = sum(len(chunk) for chunk in csv_chunks(batches))
+    elapsed = time.perf_counter() - began
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux
+    print(f"{(peak - baseline) / 1024:.1f} {size / 2**20:.1f} {elapsed:.2f}")
+
+
+def main(*counts: int) -> None:
+    counts = counts or (10_000, 100_000, 500_000)
+    directory = Path(tempfile.mkdtemp())
+    print(f"{'rows':>9} {'mode':>12} {'peak RSS +MiB':>14} {'CSV MiB':>8} {'s':>6}")
+    for rows in counts:
+        path = directory / f"export-{rows}.db"
+        _seed(path, rows)
+        for mode in ("stream", "materialize"):
+            command = [sys.executable, "-m", "benchmarks.bench_export_rss"]
+            out = subprocess.run(
+                [*command, "--child", str(path), mode],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.split()
+            rss, size, elapsed = out
+            print(f"{rows:>9} {mode:>12} {rss:>14} {size:>8} {elapsed:>6}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        _child(*sys.argv[2:4])
+    else:
+        main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,46 @@
+"""Verify cost per hash scheme, at passlib's default rounds and at rounds
+calibrated to a target verify time.
+
+Login throughput per core is about 1 / verify time, so this shows what a
+login spike costs and what calibration buys on this machine.
+
+Run from backend/: python -m benchmarks.bench_password_hash [target_ms]
+"""
+import sys
+import time
+
+from passlib import registry
+
+from app.auth.security import (
+    KNOWN_SCHEMES,
+    calibrate_rounds,
+    hash_scheme_available,
+)
+
+
+def _verify_ms(handler, rounds: int, repeat: int = 5) -> float:
+    digest = handler.using(rounds=rounds).hash("secret123")
+    started = time.perf_counter()
+    for _ in range(repeat):
+        handler.verify("secret123", digest)
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main(target_ms: float = 50) -> None:
+    print(f"{'scheme':<15} {'rounds':>8} {'verify ms':>10} {'logins/s/core':>14}")
+    for scheme in KNOWN_SCHEMES:
+        if not hash_scheme_available(scheme):
+            print(f"{scheme:<15} {'(backend not installed)':>34}")
+            continue
+        handler = registry.get_crypt_handler(scheme)
+        tuned = calibrate_rounds(scheme, target_ms / 1000)
+        for label, rounds in (("default", handler.default_rounds), ("tuned", tuned)):
+            elapsed = _verify_ms(handler, rounds)
+            print(
+                f"{scheme:<15} {rounds:>8} {elapsed:>10.1f} {1000 / elapsed:>14.1f}"
+                f"  {label}"
+            )
+
+
+if __name__ == "__main__":
+    main(*(float(arg) for arg in sys.argv[1:]))
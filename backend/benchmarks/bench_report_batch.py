@@ -0,0 +1,82 @@
+"""Throughput of rendering every user's weekly report, per-user vs batched.
+
+"per-user" is what N API calls would do: weekly_stats (its own queries) and
+one render per user, in one process. "batch" is render_reports: one rollup
+and one streak query per chunk of users, renders on a process pool.
+The per-user path is timed on a sample and extrapolated.
+
+Run from backend/: python -m benchmarks.bench_report_batch [users] [workers ...]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from sqlalchemy import create_engine, event
+from sqlmodel import Session
+
+from app.services.report import render_report
+from app.services.report_batch import render_reports
+from app.services.stats import period_start, weekly_stats
+from benchmarks.datagen import END, generate
+
+SAMPLE_USERS = 500
+
+
+def _count_statements(engine) -> list[int]:
+    statements = [0]
+
+    def count(*_):
+        statements[0] += 1
+
+    event.listen(engine, "before_cursor_execute", count)
+    return statements
+
+
+def main(users: int = 10_000, *workers: int) -> None:
+    workers = workers or (0, os.cpu_count() or 1)
+    directory = Path(tempfile.mkdtemp())
+    path = directory / "reports.db"
+    began = time.perf_counter()
+    # three weeks of history: the reported week, the one it is compared
+    # with, and a lead-in for streaks
+    count = generate(create_engine(f"sqlite:///{path}"), users, 2, 21 / 365)
+    print(f"{users} users, {count} activities ({time.perf_counter() - began:.0f}s)")
+    week = period_start("week", END - timedelta(days=7))
+
+    engine = create_engine(f"sqlite:///{path}")
+    statements = _count_statements(engine)
+    sample = min(users, SAMPLE_USERS)
+    began = time.perf_counter()
+    with Session(engine) as session:
+        for user_id in range(1, sample + 1):
+            render_report("png", weekly_stats(session, user_id, week), "week")
+    elapsed = time.perf_counter() - began
+    print(
+        f"{'per-user':<18} {sample / elapsed:>8.0f} reports/s "
+        f"{statements[0] / sample:>6.2f} queries/user "
+        f"~{elapsed / sample * users:>6.0f}s for {users} users"
+    )
+
+    for count_workers in workers:
+        statements[0] = 0
+        result = render_reports(
+            engine,
+            "week",
+            week,
+            directory / f"week-{count_workers}",
+            workers=count_workers,
+        )
+        label = f"batch workers={count_workers}"
+        print(
+            f"{label:<18} {result.per_second:>8.0f} reports/s "
+            f"{statements[0] / result.users:>6.2f} queries/user "
+            f"{result.seconds:>7.0f}s for {result.users} users "
+            f"({result.skipped} idle skipped)"
+        )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
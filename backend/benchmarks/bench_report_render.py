@@ -0,0 +1,55 @@
+"""Per-request renderer construction (the old behaviour) versus a shared one.
+
+Run from backend/: python -m benchmarks.bench_report_render [iterations]
+"""
+import sys
+import time
+from datetime import date, timedelta
+
+from app.schemas.stats import WeeklyReportResponse, WeeklyStatsItem
+from app.services.report import WeeklyReportRenderer
+
+
+def _sample_report() -> WeeklyReportResponse:
+    start = date(2024, 1, 1)
+    days = [
+        WeeklyStatsItem(
+            date=start + timedelta(days=i),
+            walk_min=30 + i,
+            play_min=15,
+            treat_count=3,
+            care_count=1,
+            streak_info=i + 1,
+            change_vs_last_week=0.12,
+        )
+        for i in range(7)
+    ]
+    return WeeklyReportResponse(start=start, end=start + timedelta(days=6), days=days)
+
+
+def _measure(label: str, iterations: int, render) -> None:
+    report = _sample_report()
+    size = len(render(report))
+    start = time.perf_counter()
+    for _ in range(iterations):
+        render(report)
+    per_call = (time.perf_counter() - start) / iterations * 1000
+    print(f"{label:<28} {per_call:7.2f} ms/render {size:8d} bytes")
+
+
+def main(iterations: int = 200) -> None:
+    _measure(
+        "fresh renderer (old path)",
+        iterations,
+        lambda report: WeeklyReportRenderer().render(report),
+    )
+    for label, renderer in [
+        ("shared png level 6", WeeklyReportRenderer()),
+        ("shared png level 1", WeeklyReportRenderer(png_compress_level=1)),
+        ("shared webp q80", WeeklyReportRenderer(image_format="webp")),
+    ]:
+        _measure(label, iterations, renderer.render)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,75 @@
+"""Fetching and serializing activities: ORM objects through ActivityRead versus
+column-only rows through the orjson fast path.
+
+Run from backend/: python -m benchmarks.bench_serialize [rows] [repeats]
+"""
+import sys
+from datetime import datetime, timedelta
+
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from app.api.activities import activities_query
+from app.models.entities import Activity, User
+from app.schemas.activity import ActivityPage, ActivityRead
+from app.utils.responses import dumps
+from benchmarks.common import timed
+
+
+def _seed(session: Session, rows: int) -> None:
+    session.add(User(email="bench@example.com", password_hash="x"))
+    session.commit()
+    start = datetime(2024, 1, 1)
+    session.add_all(
+        Activity(
+            user_id=1,
+            type="walk",
+            amount=i % 60,
+            unit="min",
+            started_at=start + timedelta(minutes=i),
+            note="evening loop" if i % 3 == 0 else None,
+        )
+        for i in range(rows)
+    )
+    session.commit()
+
+
+def _orm(session: Session, rows: int) -> bytes:
+    items = session.exec(
+        select(Activity)
+        .where(Activity.user_id == 1)
+        .order_by(Activity.started_at.desc(), Activity.id.desc())
+        .limit(rows)
+    ).all()
+    page = ActivityPage(items=[ActivityRead.model_validate(item) for item in items])
+    # FastAPI then validates the returned model against response_model again
+    return ActivityPage.model_validate(page.model_dump()).model_dump_json().encode()
+
+
+def _rows(session: Session, rows: int) -> bytes:
+    query, params = activities_query(1, None, None, None, None, None, None, rows)
+    items = session.execute(query, params).all()
+    return dumps({"items": [item._asdict() for item in items]})
+
+
+def main(rows: int = 10_000, repeats: int = 5) -> None:
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        _seed(session, rows)
+
+    results: dict[str, float] = {}
+    for label, fetch in (("orm", _orm), ("rows", _rows)):
+        fetch(Session(engine), rows)  # warm statement caches
+        with timed(label, results):
+            for _ in range(repeats):
+                with Session(engine) as session:
+                    body = fetch(session, rows)
+        print(
+            f"{label:>5}: {results[label] / repeats * 1000:8.1f} ms per {rows} rows "
+            f"({len(body) / 1024:.0f} KiB)"
+        )
+    print(f"speedup: {results['orm'] / results['rows']:.1f}x")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,51 @@
+"""Memory held by idle /stats/stream connections, and fan-out latency.
+
+Opens N subscriptions driven through the real SSE generator, all waiting for
+messages, then publishes one message to each user from a worker thread.
+
+Run from backend/: python -m benchmarks.bench_stream_idle [connections]
+"""
+import asyncio
+import sys
+import threading
+import time
+import tracemalloc
+
+from app.api.live import _sse
+from app.utils.pubsub import broker
+
+
+async def _run(connections: int) -> None:
+    tracemalloc.start()
+    baseline = tracemalloc.take_snapshot()
+    streams = []
+    for user_id in range(connections):
+        stream = _sse(broker.subscribe(user_id), "{}")
+        await anext(stream)  # snapshot sent; now idle
+        streams.append(stream)
+    waiters = [asyncio.ensure_future(anext(stream)) for stream in streams]
+    await asyncio.sleep(0.1)
+    held = sum(
+        stat.size_diff
+        for stat in tracemalloc.take_snapshot().compare_to(baseline, "filename")
+    )
+    print(f"{connections} idle streams: {held / connections / 1024:.1f} KiB each")
+
+    start = time.perf_counter()
+    publisher = threading.Thread(
+        target=lambda: [broker.publish(user_id, "{}") for user_id in range(connections)]
+    )
+    publisher.start()
+    await asyncio.gather(*waiters)
+    publisher.join()
+    print(f"fan-out to all: {(time.perf_counter() - start) * 1000:.1f} ms")
+    for stream in streams:
+        await stream.aclose()
+
+
+def main(connections: int = 5000) -> None:
+    asyncio.run(_run(connections))
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
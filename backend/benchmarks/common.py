@@ -0,0 +1,42 @@
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from sqlmodel import SQLModel, Session, create_engine
+
+from app.main import create_app
+from app.utils import db as db_utils
+
+
+def build_client(path: Path | None = None) -> tuple[TestClient, object]:
+    """App client backed by a throwaway SQLite file, like a real deployment."""
+    if path is None:
+        path = Path(tempfile.mkdtemp()) / "bench.db"
+    engine = create_engine(
+        f"sqlite:///{path}", connect_args={"check_same_thread": False}
+    )
+    SQLModel.metadata.create_all(engine)
+
+    def get_session_override():
+        with Session(engine) as session:
+            yield session
+
+    app = create_app()
+    app.dependency_overrides[db_utils.get_session] = get_session_override
+    return TestClient(app), engine
+
+
+def auth_headers(client: TestClient, email: str = "bench@example.com") -> dict:
+    credentials = {"email": email, "password": "secret123"}
+    client.post("/auth/signup", json=credentials)
+    res = client.post("/auth/login/json", json=credentials)
+    return {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+
+@contextmanager
+def timed(label: str, results: dict):
+    start = time.perf_counter()
+    yield
+    results[label] = time.perf_counter() - start
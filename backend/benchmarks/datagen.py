@@ -0,0 +1,177 @@
+"""Reproducible synthetic dataset: N users with M pets and years of history.
+
+Every ActivityType and ActivitySource appears, with daily habits that vary per
+user (how often they log, how long they walk, which sources they use), rest
+days and multi-day gaps so streaks break, and users spread over timezones.
+The same arguments and seed always produce the same rows.
+
+Run from backend/: python -m benchmarks.datagen PATH [users] [pets] [years]
+"""
+import random
+import sys
+from datetime import date, datetime, time, timedelta, timezone
+from pathlib import Path
+
+from sqlalchemy import insert
+from sqlalchemy.engine import Engine
+from sqlmodel import SQLModel, Session, create_engine
+
+from app.auth.security import get_password_hash
+from app.models.entities import (
+    Activity,
+    ActivitySource,
+    ActivityType,
+    ActivityUnit,
+    Pet,
+    User,
+)
+from app.services.rollups import rebuild_all_rollups
+from app.services.streaks import backfill_streaks
+from app.utils.timezones import get_zone
+
+PASSWORD = "secret123"
+# last generated day; fixed so a seed always means the same rows
+END = date(2025, 12, 28)
+TIMEZONES = (
+    "UTC",
+    "Asia/Tokyo",
+    "America/New_York",
+    "Europe/London",
+    "Australia/Sydney",
+)
+SPECIES = ("dog", "cat", "rabbit")
+INSERT_CHUNK = 10_000
+
+
+def email_for(index: int) -> str:
+    return f"user{index}@bench.example"
+
+
+def _sources(rng: random.Random) -> tuple[list[ActivitySource], list[float]]:
+    # each user leans on a couple of input methods; GPS only tracks walks
+    sources = [s for s in ActivitySource if s != ActivitySource.AUTO_GPS]
+    weights = [rng.uniform(0.05, 1) ** 2 for _ in sources]
+    return sources, weights
+
+
+def _day_activities(
+    rng: random.Random, habits: dict, pet_id: int, day_start: datetime
+) -> list[dict]:
+    rows = []
+
+    def add(kind: ActivityType, unit: ActivityUnit, amount: float, note=None):
+        started = day_start + timedelta(minutes=rng.randint(6 * 60, 22 * 60))
+        source = rng.choices(*habits["sources"])[0]
+        if kind == ActivityType.WALK and rng.random() < habits["gps"]:
+            source = ActivitySource.AUTO_GPS
+        minutes = amount if unit == ActivityUnit.MIN else 0
+        rows.append(
+            {
+                "pet_id": pet_id,
+                "type": kind,
+                "unit": unit,
+                "amount": amount,
+                "started_at": started,
+                "ended_at": started + timedelta(minutes=minutes),
+                "note": note,
+                "source": source,
+                "created_at": started + timedelta(seconds=rng.randint(0, 3600)),
+            }
+        )
+
+    for _ in range(rng.choices((0, 1, 2, 3), habits["walks"])[0]):
+        minutes = max(5, round(rng.gauss(habits["walk_min"], 8)))
+        add(ActivityType.WALK, ActivityUnit.MIN, minutes)
+    for _ in range(rng.choices((0, 1, 2), (0.4, 0.45, 0.15))[0]):
+        add(ActivityType.PLAY, ActivityUnit.MIN, rng.randint(5, 40))
+    for _ in range(rng.randint(0, 4)):
+        add(ActivityType.TREAT, ActivityUnit.COUNT, rng.randint(1, 3))
+    if rng.random() < 0.1:
+        unit = rng.choice((ActivityUnit.COUNT, ActivityUnit.NONE))
+        add(ActivityType.CARE, unit, 1 if unit == ActivityUnit.COUNT else 0)
+    if rng.random() < 0.05:
+        note = rng.choice(("vet", "bath", "new toy"))
+        add(ActivityType.NOTE, ActivityUnit.NONE, 0, note=note)
+    return rows
+
+
+def generate(
+    engine: Engine,
+    users: int = 20,
+    pets: int = 2,
+    years: float = 2,
+    seed: int = 0,
+    end: date = END,
+) -> int:
+    """Populate ``engine``'s database (tables are created) and build rollups
+    and streak state; returns the number of activities written."""
+    SQLModel.metadata.create_all(engine)
+    rng = random.Random(seed)
+    password_hash = get_password_hash(PASSWORD)
+    first = end - timedelta(days=int(years * 365) - 1)
+    total = 0
+    with Session(engine) as session:
+        for index in range(users):
+            user = User(
+                email=email_for(index),
+                password_hash=password_hash,
+                timezone=TIMEZONES[index % len(TIMEZONES)],
+                created_at=datetime.combine(first, time()),
+            )
+            session.add(user)
+            session.flush()
+            pet_ids = []
+            for number in range(pets):
+                pet = Pet(
+                    user_id=user.id,
+                    name=f"pet{number}",
+                    species=rng.choice(SPECIES),
+                    weight=round(rng.uniform(2, 35), 1),
+                )
+                session.add(pet)
+                session.flush()
+                pet_ids.append(pet.id)
+
+            habits = {
+                "active": rng.uniform(0.6, 0.95),  # share of days with any logging
+                "walks": [0.1, rng.uniform(0.3, 0.6), 0.3, 0.1],
+                "walk_min": rng.uniform(20, 50),
+                "gps": rng.uniform(0, 0.5),
+                "sources": _sources(rng),
+            }
+            zone = get_zone(user.timezone)
+            rows: list[dict] = []
+            day, gap = first, 0
+            while day <= end:
+                if gap:
+                    gap -= 1
+                elif rng.random() < 0.01:
+                    gap = rng.randint(2, 10)  # trips, sick days
+                elif rng.random() < habits["active"]:
+                    local = datetime.combine(day, time(), tzinfo=zone)
+                    day_start = local.astimezone(timezone.utc).replace(tzinfo=None)
+                    for pet_id in pet_ids:
+                        rows.extend(_day_activities(rng, habits, pet_id, day_start))
+                day += timedelta(days=1)
+            for row in rows:
+                row["user_id"] = user.id
+            for offset in range(0, len(rows), INSERT_CHUNK):
+                session.execute(insert(Activity), rows[offset : offset + INSERT_CHUNK])
+            total += len(rows)
+        session.commit()
+        rebuild_all_rollups(session, repair=True)
+        backfill_streaks(session)
+    return total
+
+
+def main(path: str, users: int = 20, pets: int = 2, years: float = 2) -> None:
+    target = Path(path)
+    if target.exists():
+        raise SystemExit(f"{target} exists; choose a new path")
+    engine = create_engine(f"sqlite:///{target}")
+    count = generate(engine, int(users), int(pets), float(years))
+    print(f"{users} users, {pets} pets each, {count} activities -> {target}")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,196 @@
+"""Endpoint benchmark suite over a generated dataset, with a saved baseline.
+
+For each scenario it reports p50/p95/p99 latency, SQL statements per request
+and the peak Python allocation of a single request, traced in a separate pass
+so tracemalloc does not skew the timings. Response caches are cleared before
+every request so the cold path is what gets measured.
+
+  python -m benchmarks.suite            compare against benchmarks/baseline.json
+  python -m benchmarks.suite --save     record a new baseline
+
+A comparison exits non-zero when a scenario's p95 or peak allocation grows beyond
+--tolerance (and --slack-ms for latency), or it issues more queries than the
+baseline. Baselines are per machine: record one before changing code.
+"""
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable
+
+from sqlalchemy import create_engine, event
+
+from app.api import report, stats
+from benchmarks.common import build_client
+from benchmarks.datagen import END, PASSWORD, email_for, generate
+
+BASELINE = Path(__file__).with_name("baseline.json")
+# traced requests per scenario; the largest peak is reported
+TRACED_REQUESTS = 5
+
+
+def _scenarios(client, headers) -> dict[str, Callable[[int], object]]:
+    week = END - timedelta(days=END.weekday() + 7)
+    year_ago = END - timedelta(days=364)
+    cursor = client.get("/activities?limit=50", headers=headers).json()["next_cursor"]
+
+    def get(path: str) -> Callable[[int], object]:
+        return lambda _: client.get(path, headers=headers)
+
+    def walk(i: int):
+        started = (END - timedelta(minutes=i)).isoformat()
+        payload = {"type": "walk", "amount": 5, "unit": "min", "started_at": started}
+        return client.post("/activities", json=payload, headers=headers)
+
+    return {
+        "stats_daily": get(f"/stats/daily?date={END}"),
+        "stats_weekly": get(f"/stats/weekly?start={week}"),
+        "stats_series_year_weekly": get(
+            f"/stats/series?from={year_ago}&to={END}&bucket=week"
+        ),
+        "activities_first_page": get("/activities?limit=50"),
+        "activities_next_page": get(f"/activities?limit=50&before={cursor}"),
+        "pets": get("/pets"),
+        "weekly_report_png": get(f"/export/weekly-report.png?start={week}"),
+        "activity_create": walk,
+    }
+
+
+def _percentile(samples: list[float], q: float) -> float:
+    return statistics.quantiles(samples, n=100, method="inclusive")[q - 1]
+
+
+def _clear_caches() -> None:
+    stats.stats_cache.clear()
+    report.report_cache.clear()
+
+
+def _peak_kib(call: Callable[[int], object], first: int) -> int:
+    # per request rather than the process-lifetime ru_maxrss, which only ever
+    # grows and so reports the earlier scenarios' peak for every later one
+    peak = 0
+    tracemalloc.start()
+    try:
+        for i in range(first, first + TRACED_REQUESTS):
+            _clear_caches()
+            tracemalloc.reset_peak()
+            call(i)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+    finally:
+        tracemalloc.stop()
+    return round(peak / 1024)
+
+
+def run(users: int, pets: int, years: float, requests: int) -> dict:
+    path = Path(tempfile.mkdtemp()) / "suite.db"
+    generate(create_engine(f"sqlite:///{path}"), users, pets, years)
+    client, engine = build_client(path)
+    res = client.post(
+        "/auth/login/json", json={"email": email_for(0), "password": PASSWORD}
+    )
+    headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+    statements = [0]
+
+    def count(*_):
+        statements[0] += 1
+
+    event.listen(engine, "before_cursor_execute", count)
+    results = {}
+    for name, call in _scenarios(client, headers).items():
+        call(0)  # warm up
+        samples = []
+        statements[0] = 0
+        for i in range(1, requests + 1):
+            _clear_caches()
+            start = time.perf_counter()
+            response = call(i)
+            samples.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{name}: HTTP {response.status_code}")
+        results[name] = {
+            "p50_ms": round(_percentile(samples, 50), 3),
+            "p95_ms": round(_percentile(samples, 95), 3),
+            "p99_ms": round(_percentile(samples, 99), 3),
+            "queries": round(statements[0] / requests, 2),
+            "alloc_kib": _peak_kib(call, requests + 1),
+        }
+    return {
+        "dataset": {"users": users, "pets": pets, "years": years},
+        "requests": requests,
+        "scenarios": results,
+    }
+
+
+def regressions(
+    current: dict, baseline: dict, tolerance: float, slack_ms: float
+) -> list[str]:
+    found = []
+    for name, base in baseline["scenarios"].items():
+        now = current["scenarios"].get(name)
+        if now is None:
+            continue
+        if now["p95_ms"] > base["p95_ms"] * (1 + tolerance) + slack_ms:
+            found.append(f"{name}: p95 {base['p95_ms']} -> {now['p95_ms']} ms")
+        if now["queries"] > base["queries"]:
+            found.append(f"{name}: queries {base['queries']} -> {now['queries']}")
+        if now["alloc_kib"] > base["alloc_kib"] * (1 + tolerance):
+            found.append(
+                f"{name}: allocation {base['alloc_kib']} -> {now['alloc_kib']} KiB"
+            )
+    return found
+
+
+def _print(result: dict, baseline: dict | None) -> None:
+    print(
+        f"{'scenario':<26} {'p50':>8} {'p95':>8} {'p99':>8} "
+        f"{'queries':>8} {'alloc KiB':>9} {'base p95':>9}"
+    )
+    for name, row in result["scenarios"].items():
+        base = (baseline or {}).get("scenarios", {}).get(name, {})
+        print(
+            f"{name:<26} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} "
+            f"{row['p99_ms']:>8.2f} {row['queries']:>8} {row['alloc_kib']:>9} "
+            f"{base.get('p95_ms', '-'):>9}"
+        )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.suite")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--pets", type=int, default=2)
+    parser.add_argument("--years", type=float, default=2)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--save", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--slack-ms", type=float, default=1.0)
+    args = parser.parse_args(argv)
+
+    result = run(args.users, args.pets, args.years, args.requests)
+    baseline = None
+    if args.baseline.exists() and not args.save:
+        baseline = json.loads(args.baseline.read_text())
+        if baseline["dataset"] != result["dataset"]:
+            print("baseline was recorded on a different dataset; not comparing")
+            baseline = None
+    _print(result, baseline)
+
+    if args.save:
+        args.baseline.write_text(json.dumps(result, indent=2) + "\n")
+        print(f"baseline saved to {args.baseline}")
+    elif baseline is not None:
+        found = regressions(result, baseline, args.tolerance, args.slack_ms)
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
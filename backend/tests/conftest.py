@@ -0,0 +1,11 @@
+import pytest
+
+from app.api import report, stats
+
+
+@pytest.fixture(autouse=True)
+def clear_response_caches():
+    # every test database restarts ids and data versions, so cached responses
+    # from an earlier test would match the next one's keys
+    stats.stats_cache.clear()
+    report.report_cache.clear()
@@ -1,15 +1,28 @@
-from datetime import datetime, timedelta
+import json
+import shutil
+import time
+from datetime import date, datetime, timedelta
 
 from fastapi.testclient import TestClient
-from sqlmodel import SQLModel, create_engine, Session
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, create_engine, Session, select
 
+from app.api import activities as activities_api, stats as stats_api
 from app.main import create_app
-from app.utils import db as db_utils
+from app.schemas.activity import ActivityBatchCreate, ActivityCreate
+from app.utils import db as db_utils, responses
+from app.utils.settings import settings
+from app.utils.workers import cpu_pool
 from app.models import entities
 
 
 def build_test_client():
-    test_engine = create_engine("sqlite://")
+    test_engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
     SQLModel.metadata.create_all(test_engine)
 
     def get_session_override():
@@ -53,3 +66,426 @@ def test_signup_login_and_activity_flow():
     assert res.status_code == 200
     data = res.json()
     assert data["walk_min"] == 15
+
+
+def test_stats_series_caps_range():
+    client = build_test_client()
+    credentials = {"email": "a@example.com", "password": "secret123"}
+    client.post("/auth/signup", json=credentials)
+    res = client.post("/auth/login/json", json=credentials)
+    headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+    def status(start, end, bucket):
+        params = {"from": start, "to": end, "bucket": bucket}
+        return client.get("/stats/series", params=params, headers=headers).status_code
+
+    params = {"from": "2024-01-01", "to": "2024-12-31", "bucket": "week"}
+    res = client.get("/stats/series", params=params, headers=headers)
+    assert res.status_code == 200
+    assert len(res.json()["buckets"]) == len(res.json()["walk_min"]) == 53
+    assert status("2020-01-01", "2024-12-31", "day") == 400
+    assert status("2024-01-01", "2024-01-31", "hour") == 422
+    # rejected from the bucket count alone, without building the buckets
+    started = time.perf_counter()
+    assert status("0002-01-01", "9998-12-31", "day") == 400
+    assert time.perf_counter() - started < 0.5
+    # dates whose day bounds would overflow datetime are a client error
+    assert status("2024-01-01", "9999-12-31", "month") == 400
+    assert status("9999-12-01", "9999-12-31", "day") == 400
+    assert status("0001-01-01", "0001-01-31", "day") == 400
+
+
+def test_timezone_change_rebuckets_days():
+    client = build_test_client()
+    credentials = {"email": "a@example.com", "password": "secret123"}
+    res = client.post("/auth/signup", json={**credentials, "timezone": "Mars/Olympus"})
+    assert res.status_code == 422
+    res = client.post("/auth/signup", json={**credentials, "timezone": "Asia/Tokyo"})
+    assert res.json()["timezone"] == "Asia/Tokyo"
+    res = client.post("/auth/login/json", json=credentials)
+    headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+    payload = {
+        "type": "walk",
+        "amount": 20,
+        "unit": "min",
+        "started_at": "2024-06-01T20:00:00+00:00",
+    }
+    client.post("/activities", json=payload, headers=headers)
+    # 20:00 UTC is already the next morning in Tokyo
+    res = client.get("/stats/daily?date=2024-06-02", headers=headers)
+    assert res.json()["walk_min"] == 20
+    res = client.patch("/auth/me", json={"timezone": "UTC"}, headers=headers)
+    assert res.json()["timezone"] == "UTC"
+    res = client.get("/stats/daily?date=2024-06-02", headers=headers)
+    assert res.json()["walk_min"] == 0
+    res = client.get("/stats/daily?date=2024-06-01", headers=headers)
+    assert res.json()["walk_min"] == 20
+
+
+def test_stats_responses_are_cached_per_data_version():
+    client = build_test_client()
+    credentials = {"email": "a@example.com", "password": "secret123"}
+    client.post("/auth/signup", json=credentials)
+    res = client.post("/auth/login/json", json=credentials)
+    headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+    today = datetime.utcnow().date().isoformat()
+    url = f"/stats/daily?date={today}"
+    hits, misses = stats_api.stats_cache.hits.value, stats_api.stats_cache.misses.value
+
+    first = client.get(url, headers=headers)
+    etag = first.headers["etag"]
+    assert "no-cache" in first.headers["cache-control"]
+    second = client.get(url, headers=headers)
+    assert second.json() == first.json() and second.headers["etag"] == etag
+    assert stats_api.stats_cache.hits.value == hits + 1
+    assert stats_api.stats_cache.misses.value == misses + 1
+    res = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert res.status_code == 304
+
+    # a pet write bumps the data version, so the old validator stops matching
+    client.post("/pets", json={"name": "Milo"}, headers=headers)
+    res = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert res.status_code == 200 and res.headers["etag"] != etag
+    payload = {
+        "type": "walk",
+        "amount": 5,
+        "unit": "min",
+        "started_at": datetime.utcnow().isoformat(),
+    }
+    client.post("/activities", json=payload, headers=headers)
+    assert client.get(url, headers=headers).json()["walk_min"] == 5
+    assert "stats_cache_hits_total" in client.get("/metrics").text
+
+
+def test_activity_pagination_and_stream():
+    client = build_test_client()
+    client.post(
+        "/auth/signup", json={"email": "p@example.com", "password": "secret123"}
+    )
+    res = client.post(
+        "/auth/login/json", json={"email": "p@example.com", "password": "secret123"}
+    )
+    headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+    base = datetime.utcnow() - timedelta(days=2)
+    for i in range(7):
+        payload = {
+            "type": "walk" if i % 2 else "treat",
+            "amount": i,
+            "unit": "min" if i % 2 else "count",
+            # two rows share a timestamp so the id tie-breaker matters
+            "started_at": (base + timedelta(minutes=i // 2 * 2)).isoformat(),
+        }
+        res = client.post("/activities", json=payload, headers=headers)
+        assert res.status_code == 200
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 3, **({"before": cursor} if cursor else {})}
+        page = client.get("/activities", params=params, headers=headers).json()
+        seen.extend(item["id"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert seen == sorted(seen, reverse=True) and len(seen) == 7
+
+    first = client.get("/activities", params={"limit": 3}, headers=headers).json()
+    second = client.get(
+        "/activities",
+        params={"limit": 3, "before": first["next_cursor"]},
+        headers=headers,
+    ).json()
+    back = client.get(
+        "/activities",
+        params={"limit": 3, "after": second["prev_cursor"]},
+        headers=headers,
+    ).json()
+    assert back["items"] == first["items"]
+
+    walks = client.get("/activities", params={"type": "walk"}, headers=headers).json()
+    assert {item["type"] for item in walks["items"]} == {"walk"}
+
+    res = client.get("/activities", params={"format": "ndjson"}, headers=headers)
+    assert res.headers["content-type"].startswith("application/x-ndjson")
+    lines = res.text.strip().splitlines()
+    assert [json.loads(line)["id"] for line in lines] == seen
+
+
+def test_activity_batch_ingest_is_idempotent():
+    client = build_test_client()
+    client.post(
+        "/auth/signup", json={"email": "b@example.com", "password": "secret123"}
+    )
+    res = client.post(
+        "/auth/login/json", json={"email": "b@example.com", "password": "secret123"}
+    )
+    headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+    pet_id = client.post("/pets", json={"name": "Milo"}, headers=headers).json()["id"]
+    now = datetime.utcnow()
+    items = [
+        {
+            "pet_id": pet_id,
+            "type": "walk",
+            "amount": 5,
+            "unit": "min",
+            "started_at": (now - timedelta(minutes=i)).isoformat(),
+            "source": "auto_gps",
+            "idempotency_key": f"gps-{i}",
+        }
+        for i in range(5)
+    ]
+    items.append({**items[0]})
+    items.append({**items[1], "pet_id": pet_id + 100, "idempotency_key": "gps-x"})
+
+    res = client.post("/activities/batch", json={"items": items}, headers=headers)
+    assert res.status_code == 200
+    body = res.json()
+    statuses = [result["status"] for result in body["results"]]
+    assert statuses == ["created"] * 5 + ["duplicate", "error"]
+    assert body["results"][5]["id"] == body["results"][0]["id"]
+
+    # a retry of the same batch creates nothing new
+    res = client.post("/activities/batch", json={"items": items[:5]}, headers=headers)
+    assert res.json()["created"] == 0
+    today = now.date().isoformat()
+    res = client.get(f"/stats/daily?date={today}", headers=headers)
+    expected = sum(
+        5 for i in range(5) if (now - timedelta(minutes=i)).date() == now.date()
+    )
+    assert res.json()["walk_min"] == expected
+
+
+def test_idempotency_key_race_reports_duplicate(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'race.db'}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        user = entities.User(email="r@example.com", password_hash="x")
+        session.add(user)
+        session.commit()
+        user_id = user.id
+    item = {
+        "type": "walk",
+        "amount": 5,
+        "unit": "min",
+        "started_at": datetime.utcnow().isoformat(),
+        "idempotency_key": "gps-1",
+    }
+
+    def race(session):
+        # another request stores the same keys right after our lookup
+        fired = []
+
+        def store_first(state):
+            if fired or "idempotency_key" not in str(state.statement):
+                return
+            fired.append(True)
+            with Session(engine) as other:
+                for key in ("gps-1", "gps-2"):
+                    activity = ActivityCreate(**{**item, "idempotency_key": key})
+                    other.add(activities_api._build_activity(activity, user_id))
+                other.commit()
+
+        event.listen(session, "do_orm_execute", store_first)
+
+    with Session(engine) as session:
+        race(session)
+        activity = activities_api.add_activity(session, ActivityCreate(**item), user_id)
+        assert activity.idempotency_key == "gps-1"
+
+    items = [{**item, "idempotency_key": key} for key in ("gps-2", "gps-3")]
+    with Session(engine) as session:
+        race(session)
+        result = activities_api.ingest_batch(
+            session, ActivityBatchCreate(items=items), user_id
+        )
+        assert [r.status for r in result.results] == ["duplicate", "created"]
+        assert result.created == 1
+        assert len(session.exec(select(entities.Activity)).all()) == 3
+
+
+def test_weekly_report_etag():
+    client = build_test_client()
+    client.post(
+        "/auth/signup", json={"email": "r@example.com", "password": "secret123"}
+    )
+    res = client.post(
+        "/auth/login/json", json={"email": "r@example.com", "password": "secret123"}
+    )
+    headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+    res = client.get("/export/weekly-report.png?start=2024-01-01", headers=headers)
+    assert res.status_code == 200
+    assert res.headers["content-type"] == "image/png"
+    etag = res.headers["etag"]
+
+    res = client.get(
+        "/export/weekly-report.png?start=2024-01-01",
+        headers={**headers, "If-None-Match": etag},
+    )
+    assert res.status_code == 304
+
+    payload = {
+        "type": "walk",
+        "amount": 10,
+        "unit": "min",
+        "started_at": "2024-01-02T08:00:00",
+    }
+    client.post("/activities", json=payload, headers=headers)
+    res = client.get(
+        "/export/weekly-report.png?start=2024-01-01",
+        headers={**headers, "If-None-Match": etag},
+    )
+    assert res.status_code == 200
+    assert res.headers["etag"] != etag
+
+
+def test_cpu_pool_backpressure(monkeypatch):
+    client = build_test_client()
+    client.post(
+        "/auth/signup", json={"email": "c@example.com", "password": "secret123"}
+    )
+    monkeypatch.setattr(cpu_pool, "max_pending", 0)
+    res = client.post(
+        "/auth/login/json", json={"email": "c@example.com", "password": "secret123"}
+    )
+    assert res.status_code == 503
+    assert res.headers["retry-after"]
+    metrics = client.get("/metrics").text
+    assert "cpu_pool_rejected_total" in metrics
+    assert "cpu_pool_queue_depth 0" in metrics
+
+
+def test_stateless_auth_honours_revocation(monkeypatch):
+    monkeypatch.setattr(settings, "auth_stateless", True)
+    client = build_test_client()
+    client.post(
+        "/auth/signup", json={"email": "v@example.com", "password": "secret123"}
+    )
+    res = client.post(
+        "/auth/login/json", json={"email": "v@example.com", "password": "secret123"}
+    )
+    tokens = res.json()
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    assert client.get("/pets", headers=headers).status_code == 200
+    assert client.get("/pets", headers=headers).status_code == 200
+
+    assert client.post("/auth/revoke", headers=headers).status_code == 204
+    assert client.get("/pets", headers=headers).status_code == 401
+    res = client.post("/auth/refresh", params={"token": tokens["refresh_token"]})
+    assert res.status_code == 401
+
+
+def test_read_replica_routing_with_stickiness(tmp_path, monkeypatch):
+    primary_path, replica_path = tmp_path / "primary.db", tmp_path / "replica.db"
+    primary = create_engine(f"sqlite:///{primary_path}")
+    SQLModel.metadata.create_all(primary)
+
+    def get_session_override():
+        with Session(primary) as session:
+            yield session
+
+    app = create_app()
+    app.dependency_overrides[db_utils.get_session] = get_session_override
+    client = TestClient(app)
+    credentials = {"email": "a@example.com", "password": "secret123"}
+    client.post("/auth/signup", json=credentials)
+    res = client.post("/auth/login/json", json=credentials)
+    headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+    user_id = client.get("/auth/me", headers=headers).json()["id"]
+    pet_id = client.post("/pets", json={"name": "Milo"}, headers=headers).json()["id"]
+
+    def replicate():
+        primary.dispose()
+        shutil.copyfile(primary_path, replica_path)
+        replica.dispose()
+
+    replica = create_engine(f"sqlite:///{replica_path}")
+    replicate()
+    monkeypatch.setattr(settings, "read_database_url", f"sqlite:///{replica_path}")
+    monkeypatch.setattr(db_utils, "read_engine", replica)
+
+    payload = {
+        "pet_id": pet_id,
+        "type": "walk",
+        "amount": 15,
+        "unit": "min",
+        "started_at": datetime.utcnow().isoformat(),
+    }
+    client.post("/activities", json=payload, headers=headers)
+    today = datetime.utcnow().date().isoformat()
+
+    def walked():
+        res = client.get(f"/stats/daily?date={today}", headers=headers)
+        return res.json()["walk_min"]
+
+    # the writer reads its own write from the primary
+    assert walked() == 15
+    # once the sticky window has passed, reads go to the lagging replica
+    db_utils.recent_writers.invalidate(user_id)
+    assert walked() == 0
+    report = client.get(f"/export/weekly-report.png?start={today}", headers=headers)
+    replicate()
+    assert walked() == 15
+    # the report rendered from the lagging replica is not reused afterwards
+    res = client.get(f"/export/weekly-report.png?start={today}", headers=headers)
+    assert res.headers["ETag"] != report.headers["ETag"]
+    assert res.content != report.content
+
+
+def build_async_test_client(path):
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlmodel.ext.asyncio.session import AsyncSession
+
+    SQLModel.metadata.create_all(create_engine(f"sqlite:///{path}"))
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+
+    async def get_async_session_override():
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
+
+    app = create_app(async_db=True)
+    app.dependency_overrides[db_utils.get_async_session] = get_async_session_override
+    return TestClient(app)
+
+
+def test_async_routes_flow(tmp_path):
+    client = build_async_test_client(tmp_path / "async.db")
+    res = client.post(
+        "/auth/signup", json={"email": "a@example.com", "password": "secret123"}
+    )
+    assert res.status_code == 200
+    res = client.post(
+        "/auth/login/json", json={"email": "a@example.com", "password": "secret123"}
+    )
+    headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+    pet_id = client.post("/pets", json={"name": "Milo"}, headers=headers).json()["id"]
+    pets = client.get("/pets", headers=headers).json()
+    assert [pet["id"] for pet in pets] == [pet_id]
+    payload = {
+        "pet_id": pet_id,
+        "type": "walk",
+        "amount": 15,
+        "unit": "min",
+        "started_at": datetime.utcnow().isoformat(),
+    }
+    assert client.post("/activities", json=payload, headers=headers).status_code == 200
+    res = client.post("/activities/batch", json={"items": [payload]}, headers=headers)
+    assert res.json()["created"] == 1
+    assert len(client.get("/activities", headers=headers).json()["items"]) == 2
+    res = client.get("/activities", params={"format": "ndjson"}, headers=headers)
+    assert len(res.text.strip().splitlines()) == 2
+    today = datetime.utcnow().date().isoformat()
+    res = client.get(f"/stats/daily?date={today}", headers=headers)
+    assert res.json()["walk_min"] == 30
+    res = client.get(f"/stats/weekly?start={today}", headers=headers)
+    assert res.json()["days"][0]["walk_min"] == 30
+
+
+def test_json_fallback_matches_orjson(monkeypatch):
+    # orjson is an optional extra; the stdlib path must render the same bytes
+    rows = [
+        {"id": 1, "type": entities.ActivityType.WALK, "amount": 5.0, "pet_id": None},
+        {"started_at": datetime(2024, 3, 4, 7, 30, 15, 250), "day": date(2024, 3, 4)},
+    ]
+    fast = (responses.dumps(rows), responses.dumps_lines(rows))
+    monkeypatch.setattr(responses, "orjson", None)
+    assert (responses.dumps(rows), responses.dumps_lines(rows)) == fast
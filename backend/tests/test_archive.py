@@ -0,0 +1,259 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import inspect
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, func, select
+
+from app.api import auth
+from app.api.aio import activities as aio_activities
+from app.main import create_app
+from app.models.entities import Activity, ActivityArchive, StreakState, User
+from app.services import archival, archive
+from app.services.archival import archive_activities, archive_cutoff
+from app.services.rollups import record_activity, verify_rollups
+from app.services.streaks import compute_streak, rebuild_streak
+from app.utils import db as db_utils
+from app.utils.cache import TTLCache
+from app.utils.settings import settings
+from tests.test_api import build_async_test_client
+from tests.test_live import login
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture
+def client(engine):
+    def get_session_override():
+        with Session(engine) as session:
+            yield session
+
+    app = create_app()
+    app.dependency_overrides[db_utils.get_session] = get_session_override
+    client = TestClient(app)
+    client.headers["Authorization"] = f"Bearer {login(client)}"
+    return client
+
+
+def _log(client, days_ago: int, kind: str = "walk", pet_id=None) -> None:
+    started = datetime.utcnow() - timedelta(days=days_ago, minutes=days_ago % 7)
+    payload = {
+        "type": kind,
+        "amount": 10 + days_ago % 5,
+        "unit": "min" if kind == "walk" else "count",
+        "started_at": started.isoformat(),
+        "pet_id": pet_id,
+    }
+    assert client.post("/activities", json=payload).status_code == 200
+
+
+def _all_pages(client, limit: int) -> list[int]:
+    ids, cursor = [], None
+    while True:
+        query = f"/activities?limit={limit}" + (f"&before={cursor}" if cursor else "")
+        page = client.get(query).json()
+        ids += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids
+
+
+def test_archive_moves_old_rows_and_reads_stay_transparent(client, engine):
+    pet_id = client.post("/pets", json={"name": "Milo"}).json()["id"]
+    for days_ago in (500, 499, 498, 430, 429, 3, 2, 1, 0):
+        _log(client, days_ago, pet_id=pet_id if days_ago % 2 else None)
+    _log(client, 430, kind="treat")
+    before = client.get("/activities?limit=500").json()["items"]
+    series_from = (datetime.utcnow() - timedelta(days=505)).date()
+    series_url = f"/stats/series?from={series_from}&to={datetime.utcnow().date()}"
+    series = client.get(f"{series_url}&bucket=month").json()
+
+    with Session(engine) as session:
+        streak = rebuild_streak(session, 1).current_run
+        moved = archive_activities(session, horizon_days=365)
+        assert moved == {1: 6}
+        assert session.exec(select(func.count(Activity.id))).one() == 4
+        assert session.exec(select(func.count(ActivityArchive.id))).one() == 2
+        assert verify_rollups(session, 1) == []
+        assert rebuild_streak(session, 1).current_run == streak
+
+    assert client.get("/activities?limit=500").json()["items"] == before
+    assert _all_pages(client, 3) == [item["id"] for item in before]
+    # paging back up from the archive with after= crosses into live rows
+    oldest = client.get("/activities?limit=8").json()["next_cursor"]
+    page = client.get(f"/activities?limit=4&after={oldest}").json()
+    assert [item["id"] for item in page["items"]] == [
+        item["id"] for item in before[3:7]
+    ]
+    treats = client.get("/activities?type=treat").json()["items"]
+    assert [item["type"] for item in treats] == ["treat"]
+    by_pet = client.get(f"/activities?pet_id={pet_id}&limit=500").json()["items"]
+    assert by_pet == [item for item in before if item["pet_id"] == pet_id]
+
+    lines = client.get("/export/activities.ndjson").text.splitlines()
+    assert len(lines) == len(before)
+    assert client.get(f"{series_url}&bucket=month").json() == series
+
+
+def test_archive_appends_backdated_rows_to_their_month(client, engine):
+    _log(client, 450)
+    with Session(engine) as session:
+        archive_activities(session, horizon_days=365)
+    _log(client, 451)  # lands in the live table, older than the cutoff
+    assert len(client.get("/activities").json()["items"]) == 2
+
+    with Session(engine) as session:
+        assert archive_activities(session, horizon_days=365) == {1: 1}
+        blocks = session.exec(select(ActivityArchive)).all()
+        assert sum(block.row_count for block in blocks) == 2
+        assert verify_rollups(session, 1) == []
+        assert session.get(StreakState, 1) is not None
+    assert len(client.get("/activities").json()["items"]) == 2
+
+
+def test_streaks_over_archived_days_read_rollups(client, engine, monkeypatch):
+    for days_ago in (402, 401, 400, 399, 398, 2, 1, 0):
+        _log(client, days_ago)
+    cutoff = archive_cutoff(365)
+    target = (datetime.utcnow() - timedelta(days=398)).date()
+
+    def streaks(session):
+        run = rebuild_streak(session, 1).current_run
+        return compute_streak(session, 1, target), run
+
+    with Session(engine) as session:
+        assert streaks(session) == (5, 3)
+        archive_activities(session, horizon_days=365)
+        assert session.get(User, 1).archived_before == cutoff
+
+    def no_decoding(*_):
+        raise AssertionError("streaks must not decode archive blocks")
+
+    monkeypatch.setattr(archive, "decode_block", no_decoding)
+    with Session(engine) as session:
+        assert streaks(session) == (5, 3)
+
+
+def test_archive_keeps_rows_inserted_while_it_runs(client, engine, monkeypatch):
+    _log(client, 450)
+    append = archival._append
+
+    def append_then_race(session, user_id, month, rows):
+        # a backdated write lands between the archive's SELECT and DELETE
+        activity = Activity(
+            user_id=user_id,
+            type="walk",
+            amount=7,
+            unit="min",
+            started_at=datetime.utcnow() - timedelta(days=460),
+        )
+        session.add(activity)
+        record_activity(session, activity)
+        append(session, user_id, month, rows)
+
+    monkeypatch.setattr(archival, "_append", append_then_race)
+    with Session(engine) as session:
+        assert archive_activities(session, horizon_days=365) == {1: 1}
+    monkeypatch.setattr(archival, "_append", append)
+    assert len(client.get("/activities").json()["items"]) == 2
+    with Session(engine) as session:
+        assert session.exec(select(func.count(Activity.id))).one() == 1
+
+
+def test_series_after_archive_ignores_cached_principal(client, engine, monkeypatch):
+    # stateless auth serves a principal cached from before the archive run
+    monkeypatch.setattr(settings, "auth_stateless", True)
+    monkeypatch.setattr(auth, "known_users", TTLCache(60))
+    _log(client, 450)
+    _log(client, 2)
+    start = (datetime.utcnow() - timedelta(days=460)).date()
+    url = f"/stats/series?from={start}&to={datetime.utcnow().date()}&bucket=month"
+    series = client.get(url).json()
+    with Session(engine) as session:
+        archive_activities(session, horizon_days=365)
+    assert client.get(url).json() == series
+
+
+def test_async_ndjson_merges_archive_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(aio_activities, "STREAM_BATCH_SIZE", 2)
+    path = tmp_path / "async.db"
+    client = build_async_test_client(path)
+    client.headers["Authorization"] = f"Bearer {login(client)}"
+    for days_ago in (500, 470, 440, 400, 3, 2, 1):
+        _log(client, days_ago)
+    with Session(create_engine(f"sqlite:///{path}")) as session:
+        assert archive_activities(session, horizon_days=365) == {1: 4}
+
+    listing = client.get("/activities?limit=500").json()["items"]
+    lines = client.get("/activities?format=ndjson").text.splitlines()
+    assert [json.loads(line)["id"] for line in lines] == [
+        item["id"] for item in listing
+    ]
+    assert len(lines) == 7
+    lines = client.get("/activities?format=ndjson&limit=5").text.splitlines()
+    assert [json.loads(line)["id"] for line in lines] == [
+        item["id"] for item in listing[:5]
+    ]
+    # paging back up from an archived cursor
+    cursor = client.get("/activities?limit=6").json()["next_cursor"]
+    lines = client.get(f"/activities?format=ndjson&after={cursor}").text.splitlines()
+    assert [json.loads(line)["id"] for line in lines] == [
+        item["id"] for item in reversed(listing[:5])
+    ]
+
+
+def test_ids_of_archived_rows_are_not_reused(client, engine):
+    _log(client, 0)
+    _log(client, 450)  # the highest id, about to be archived
+    with Session(engine) as session:
+        assert archive_activities(session, horizon_days=365) == {1: 1}
+    _log(client, 1)
+    ids = [item["id"] for item in client.get("/activities").json()["items"]]
+    assert sorted(ids) == [1, 2, 3]
+
+
+def test_migration_rebuilds_activity_table_with_autoincrement(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        # the table as databases created before sqlite_autoincrement have it
+        ddl = conn.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE name = 'activity'"
+        ).scalar()
+        conn.exec_driver_sql("DROP TABLE activity")
+        conn.exec_driver_sql(ddl.replace(" AUTOINCREMENT", ""))
+        conn.exec_driver_sql(
+            "INSERT INTO user (email, password_hash, created_at, timezone, "
+            "data_version, token_version) "
+            "VALUES ('a@example.com', 'x', '2024-01-01', 'UTC', 0, 0)"
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO activity (user_id, type, amount, unit, started_at, "
+            "created_at, source) VALUES (1, 'WALK', 5, 'MIN', '2024-01-01', "
+            "'2024-01-01', 'MANUAL')"
+        )
+    with engine.begin() as conn:
+        db_utils._migrate(conn)
+        ddl = conn.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE name = 'activity'"
+        ).scalar()
+        assert "AUTOINCREMENT" in ddl
+        indexes = {index["name"] for index in inspect(conn).get_indexes("activity")}
+        assert "ux_activity_user_idempotency_key" in indexes
+    with Session(engine) as session:
+        assert session.exec(select(Activity.id, Activity.amount)).all() == [(1, 5.0)]
+
+
+def test_archive_cutoff_is_a_month_start():
+    now = datetime(2025, 3, 14, 15, 30)
+    assert archive_cutoff(365, now) == datetime(2024, 3, 1)
+    assert archive_cutoff(0, now) == datetime(2025, 3, 1)
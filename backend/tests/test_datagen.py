@@ -0,0 +1,29 @@
+from sqlmodel import Session, create_engine, select
+
+from app.models.entities import Activity, ActivitySource, ActivityType
+from app.services.rollups import verify_rollups
+from benchmarks.datagen import generate
+from benchmarks.suite import regressions
+
+
+def test_generator_is_reproducible_and_covers_every_enum():
+    def build():
+        engine = create_engine("sqlite://")
+        count = generate(engine, users=3, pets=2, years=0.5, seed=7)
+        return engine, count
+
+    engine, count = build()
+    assert count == build()[1] > 0
+    with Session(engine) as session:
+        rows = session.exec(select(Activity.type, Activity.source)).all()
+        assert {kind for kind, _ in rows} == set(ActivityType)
+        assert {source for _, source in rows} == set(ActivitySource)
+        assert verify_rollups(session, 1) == []
+
+
+def test_regressions_compare_p95_queries_and_allocation():
+    base = {"scenarios": {"a": {"p95_ms": 10.0, "queries": 2, "alloc_kib": 100}}}
+    same = {"scenarios": {"a": {"p95_ms": 12.0, "queries": 2, "alloc_kib": 110}}}
+    assert regressions(same, base, tolerance=0.25, slack_ms=1.0) == []
+    worse = {"scenarios": {"a": {"p95_ms": 14.0, "queries": 3, "alloc_kib": 130}}}
+    assert len(regressions(worse, base, tolerance=0.25, slack_ms=1.0)) == 3
@@ -0,0 +1,102 @@
+import threading
+from datetime import datetime
+
+from sqlalchemy import inspect
+from sqlmodel import Session, SQLModel
+
+from app.models.entities import Activity, Pet, StreakSnapshot, User
+from app.services.rollups import backfill_rollups
+from app.services.stats import daily_stats
+from app.utils import db as db_utils
+
+
+def test_sqlite_engine_applies_performance_profile(tmp_path):
+    engine = db_utils.build_engine(f"sqlite:///{tmp_path / 'tuned.db'}")
+    with engine.connect() as conn:
+        effective = db_utils.describe_engine(conn)
+    assert effective["pool"] == "QueuePool"
+    assert effective["pool_pre_ping"] is True
+    assert effective["journal_mode"] == "wal"
+    assert effective["synchronous"] == 1  # NORMAL
+    assert effective["busy_timeout"] == 5000
+
+
+def test_concurrent_inserts_do_not_lock(tmp_path):
+    engine = db_utils.build_engine(f"sqlite:///{tmp_path / 'writers.db'}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        user = User(email="a@example.com", password_hash="x")
+        session.add(user)
+        session.commit()
+        pet = Pet(user_id=user.id, name="Milo")
+        session.add(pet)
+        session.commit()
+        user_id, pet_id = user.id, pet.id
+    errors = []
+
+    def writer():
+        try:
+            for _ in range(20):
+                with Session(engine) as session:
+                    session.add(
+                        Activity(
+                            user_id=user_id,
+                            pet_id=pet_id,
+                            type="walk",
+                            amount=5,
+                            unit="min",
+                            started_at=datetime.utcnow(),
+                        )
+                    )
+                    session.commit()
+        except Exception as exc:  # noqa: BLE001
+            errors.append(exc)
+
+    threads = [threading.Thread(target=writer) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    with Session(engine) as session:
+        assert len(session.query(Activity).all()) == 160
+
+
+def test_migrate_adds_missing_columns_to_reserved_table_name(tmp_path):
+    # "user" is a reserved word on Postgres; the ALTERs must quote it
+    engine = db_utils.build_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            'CREATE TABLE "user" (id INTEGER PRIMARY KEY, email VARCHAR, '
+            "password_hash VARCHAR, created_at DATETIME)"
+        )
+    with engine.begin() as conn:
+        db_utils._migrate(conn)
+        columns = {column["name"] for column in inspect(conn).get_columns("user")}
+    assert {"data_version", "token_version", "timezone", "archived_before"} <= columns
+
+
+def test_migrate_builds_rollups_for_pre_rollup_activities(tmp_path):
+    engine = db_utils.build_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    SQLModel.metadata.create_all(engine)
+    day = datetime(2024, 3, 4, 9, 0)
+    with Session(engine) as session:
+        # rows written before rollups existed: no totals, only a legacy
+        # snapshot that GET requests used to leave behind
+        user = User(email="a@example.com", password_hash="x")
+        session.add(user)
+        session.commit()
+        walk = Activity(
+            user_id=user.id, type="walk", amount=30, unit="min", started_at=day
+        )
+        session.add(walk)
+        session.add(StreakSnapshot(user_id=user.id, date=day.date()))
+        session.commit()
+        user_id = user.id
+
+    with engine.begin() as conn:
+        db_utils._migrate(conn)
+    with Session(engine) as session:
+        stats = daily_stats(session, user_id, day.date())
+        assert (stats.walk_min, stats.streak_info) == (30, 1)
+        assert backfill_rollups(session) == []
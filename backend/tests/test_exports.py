@@ -0,0 +1,185 @@
+import gzip
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app.models.entities import ExportJob, JobStatus, User
+from app.services import activity_export, exports
+from app.services.exports import export_runner
+from app.utils.settings import settings
+from tests.test_api import build_test_client
+from tests.test_live import login, walk
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_runner, "workers", 0)
+    monkeypatch.setattr(export_runner, "retry_seconds", 0)
+    monkeypatch.setattr(settings, "export_artifact_dir", str(tmp_path))
+    client = build_test_client()
+    client.headers["Authorization"] = f"Bearer {login(client)}"
+    return client
+
+
+def test_export_job_produces_csv_and_dedupes(client):
+    today = datetime.utcnow().date()
+    client.post("/activities", json=walk(25))
+    job = {"kind": "csv", "start": str(today - timedelta(days=1)), "end": str(today)}
+    res = client.post("/export/jobs", json=job)
+    assert res.status_code == 202
+    job_id = res.json()["id"]
+    assert res.json()["status"] == "done"
+
+    res = client.get(f"/export/jobs/{job_id}")
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/csv")
+    lines = res.text.splitlines()
+    assert lines[0] == "date,walk_min,play_min,treat_count,care_count,activity_count"
+    assert lines[2] == f"{today},25.0,0.0,0.0,0.0,1"
+
+    # identical request reuses the job until the data changes
+    res = client.post("/export/jobs", json=job)
+    assert (res.status_code, res.json()["id"]) == (200, job_id)
+    client.post("/activities", json=walk(5))
+    assert client.post("/export/jobs", json=job).json()["id"] != job_id
+
+    for kind in ("month_png", "year_png"):
+        res = client.post("/export/jobs", json={"kind": kind})
+        png = client.get(f"/export/jobs/{res.json()['id']}")
+        assert png.headers["content-type"] == "image/png"
+        assert png.content.startswith(b"\x89PNG")
+
+
+def test_export_job_retries_then_fails(client, monkeypatch):
+    calls = []
+
+    def flaky(session, job, params):
+        calls.append(job.attempts)
+        if len(calls) < 2:
+            raise RuntimeError("disk full")
+        return b"ok", "text/plain"
+
+    monkeypatch.setitem(exports.BUILDERS, "week_png", flaky)
+    res = client.post("/export/jobs", json={"kind": "week_png"})
+    assert res.json()["status"] == "done" and calls == [1, 2]
+
+    monkeypatch.setitem(exports.BUILDERS, "week_png", lambda *_: 1 / 0)
+    res = client.post("/export/jobs", json={"kind": "week_png", "start": "2024-01-01"})
+    body = client.get(f"/export/jobs/{res.json()['id']}").json()
+    assert body["status"] == "failed"
+    assert body["attempts"] == settings.export_job_max_attempts
+    assert body["error"].startswith("ZeroDivisionError")
+
+
+def test_resume_requeues_only_stale_running_jobs(client, monkeypatch):
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    SQLModel.metadata.create_all(engine)
+    ran = []
+    monkeypatch.setitem(
+        exports.BUILDERS, "csv", lambda s, job, p: ran.append(job.id) or (b"", "")
+    )
+    now = datetime.utcnow()
+    with Session(engine) as session:
+        user = User(email="r@example.com", password_hash="x")
+        session.add(user)
+        session.commit()
+        for age in (60, 3600):  # one still running elsewhere, one orphaned
+            session.add(
+                ExportJob(
+                    user_id=user.id,
+                    kind="csv",
+                    dedup_key=str(age),
+                    status=JobStatus.RUNNING,
+                    attempts=1,
+                    updated_at=now - timedelta(seconds=age),
+                )
+            )
+        session.commit()
+
+    monkeypatch.setattr(settings, "export_job_stale_seconds", 900)
+    assert export_runner.resume(engine) == 1
+    with Session(engine) as session:
+        jobs = session.exec(select(ExportJob).order_by(ExportJob.id)).all()
+        assert [job.status for job in jobs] == [JobStatus.RUNNING, JobStatus.DONE]
+        assert ran == [jobs[1].id]
+
+
+def test_export_artifacts_expire(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "export_artifact_ttl_seconds", -1)
+    res = client.post("/export/jobs", json={"kind": "csv"})
+    job_id = res.json()["id"]
+    assert len(list(tmp_path.iterdir())) == 1
+    assert client.get(f"/export/jobs/{job_id}").status_code == 410
+
+    # the next submission purges expired artifacts and starts a fresh job
+    res = client.post("/export/jobs", json={"kind": "csv"})
+    assert res.status_code == 202 and res.json()["id"] != job_id
+    assert client.get(f"/export/jobs/{job_id}").status_code == 410
+    assert client.get("/export/jobs/999").status_code == 404
+
+
+def test_activity_export_streams_filtered_csv_and_ndjson(client, monkeypatch):
+    monkeypatch.setattr(settings, "export_batch_rows", 2)
+    pet_id = client.post("/pets", json={"name": "Milo"}).json()["id"]
+    for minutes in (10, 20, 30):
+        client.post("/activities", json={**walk(minutes), "pet_id": pet_id})
+    client.post("/activities", json={**walk(5), "type": "play"})
+
+    res = client.get("/export/activities.csv", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in res.headers
+    header, *rows = res.text.splitlines()
+    assert header.startswith("id,pet_id,type,amount,unit,started_at")
+    assert len(rows) == 4 and rows[0].split(",")[2:4] == ["play", "5.0"]
+
+    res = client.get(
+        "/export/activities.ndjson",
+        params={"type": "walk", "pet_id": pet_id},
+        headers={"Accept-Encoding": "gzip"},
+    )
+    assert res.headers["content-encoding"] == "gzip"
+    lines = [json.loads(line) for line in res.text.splitlines()]
+    assert [line["amount"] for line in lines] == [30, 20, 10]
+
+
+def test_activity_export_gzip_is_valid_stream():
+    chunks = activity_export.gzip_chunks(iter([b"a,b\n", b"", b"1,2\n"]), 6)
+    assert gzip.decompress(b"".join(chunks)) == b"a,b\n1,2\n"
+
+
+@pytest.mark.skipif(activity_export.parquet_available(), reason="pyarrow installed")
+def test_parquet_export_needs_pyarrow(client):
+    assert client.get("/export/activities.parquet").status_code == 501
+
+
+def test_parquet_export_streams_row_groups(client, monkeypatch):
+    pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    monkeypatch.setattr(settings, "export_batch_rows", 2)
+    for minutes in (10, 20, 30):
+        client.post("/activities", json=walk(minutes))
+    client.post("/activities", json={**walk(5), "type": "play"})
+    res = client.get("/export/activities.parquet")
+    assert res.status_code == 200
+
+    parquet = pq.ParquetFile(io.BytesIO(res.content))
+    assert parquet.metadata.num_rows == 4
+    assert parquet.num_row_groups == 2
+    table = parquet.read()
+    assert table.column("type").to_pylist() == ["play", "walk", "walk", "walk"]
+    assert table.column("unit").to_pylist() == ["min"] * 4
+    started = table.column("started_at").to_pylist()
+    assert all(isinstance(value, datetime) for value in started)
+    assert started == sorted(started, reverse=True)
+
+    # each row group leaves the encoder as soon as it is written
+    rows = [tuple(table.slice(i, 1).to_pylist()[0].values()) for i in range(4)]
+    chunks = list(activity_export.parquet_chunks([rows[:2], rows[2:]]))
+    assert len(chunks) == 3 and all(chunks[:2])
+    assert pq.read_table(io.BytesIO(b"".join(chunks))).equals(table)
@@ -0,0 +1,105 @@
+import asyncio
+import json
+import threading
+from datetime import datetime
+
+from app.api.live import _sse
+from app.utils.pubsub import Broker, broker
+from app.utils.settings import settings
+from tests.test_api import build_test_client
+
+
+def login(client):
+    credentials = {"email": "a@example.com", "password": "secret123"}
+    client.post("/auth/signup", json=credentials)
+    res = client.post("/auth/login/json", json=credentials)
+    return res.json()["access_token"]
+
+
+def walk(minutes: int) -> dict:
+    return {
+        "type": "walk",
+        "amount": minutes,
+        "unit": "min",
+        "started_at": datetime.utcnow().isoformat(),
+    }
+
+
+def test_broker_fans_out_across_threads_and_drops_slow_consumers():
+    async def scenario():
+        broker = Broker(queue_size=2)
+        fast, slow = broker.subscribe(1), broker.subscribe(1)
+        other = broker.subscribe(2)
+        publisher = threading.Thread(target=broker.publish, args=(1, "a"))
+        publisher.start()
+        publisher.join()
+        await asyncio.sleep(0)
+        assert await anext(fast.messages(1)) == "a"
+
+        for message in "bc":
+            broker.publish(1, message)
+        await asyncio.sleep(0)
+        # slow never read "a", so "c" overflows its queue of two
+        assert slow.dropped and not fast.dropped
+        assert [m async for m in slow.messages(1)] == []
+        assert await anext(other.messages(0.01)) is None  # heartbeat
+        broker.unsubscribe(slow)
+        assert broker.subscriber_count() == 2
+
+    asyncio.run(scenario())
+
+
+def test_websocket_pushes_daily_stats_after_writes():
+    client = build_test_client()
+    token = login(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    with client.websocket_connect(f"/stats/ws?access_token={token}") as websocket:
+        snapshot = json.loads(websocket.receive_text())
+        assert snapshot["event"] == "daily" and snapshot["data"]["walk_min"] == 0
+        client.post("/activities", json=walk(15), headers=headers)
+        update = json.loads(websocket.receive_text())
+        assert update["data"]["walk_min"] == 15
+        client.post("/activities/batch", json={"items": [walk(5)]}, headers=headers)
+        assert json.loads(websocket.receive_text())["data"]["walk_min"] == 20
+
+
+def test_sse_stream_sends_snapshot_updates_and_heartbeats(monkeypatch):
+    monkeypatch.setattr(settings, "stream_heartbeat_seconds", 0.01)
+
+    async def snapshot():
+        return '{"walk_min":0.0}'
+
+    async def scenario():
+        stream = _sse(7, snapshot)
+        # nothing subscribes until the response starts iterating
+        assert not broker.has_subscribers(7)
+        first = await anext(stream)
+        assert first.endswith(b'event: daily\ndata: {"walk_min":0.0}\n\n')
+        assert await anext(stream) == b": ping\n\n"
+        broker.publish(7, '{"walk_min":15.0}')
+        assert await anext(stream) == b'event: daily\ndata: {"walk_min":15.0}\n\n'
+        await stream.aclose()
+        assert not broker.has_subscribers(7)
+
+    asyncio.run(scenario())
+
+
+def test_sse_stream_unsubscribes_when_the_snapshot_fails():
+    async def broken():
+        raise RuntimeError("database unavailable")
+
+    async def scenario():
+        stream = _sse(8, broken)
+        try:
+            await anext(stream)
+        except RuntimeError:
+            pass
+        assert not broker.has_subscribers(8)
+
+    asyncio.run(scenario())
+
+
+def test_sse_stream_requires_a_token():
+    client = build_test_client()
+    assert client.get("/stats/stream").status_code == 401
+    assert client.get("/stats/stream?access_token=bogus").status_code == 401
@@ -0,0 +1,61 @@
+from datetime import datetime
+
+from app.utils.metrics import Histogram
+from app.utils.profiling import request_statements, section_seconds
+from app.utils.settings import settings
+from tests.test_api import build_test_client
+from tests.test_live import login
+
+
+def test_histogram_renders_cumulative_labelled_buckets():
+    histogram = Histogram("h", "help", buckets=(1, 5), labelnames=("route",))
+    for value in (0.5, 3, 3, 9):
+        histogram.observe(value, '/a"b')
+    assert histogram.samples() == [
+        ('h_bucket{route="/a\\"b",le="1"}', 1),
+        ('h_bucket{route="/a\\"b",le="5"}', 3),
+        ('h_bucket{route="/a\\"b",le="+Inf"}', 4),
+        ('h_sum{route="/a\\"b"}', 15.5),
+        ('h_count{route="/a\\"b"}', 4),
+    ]
+
+
+def test_requests_record_route_latency_sql_and_sections():
+    client = build_test_client()
+    headers = {"Authorization": f"Bearer {login(client)}"}
+    labels = ("GET", "/stats/daily")
+    before = request_statements.count(*labels)
+    stats_before = section_seconds.count("stats")
+
+    res = client.get(f"/stats/daily?date={datetime.utcnow().date()}", headers=headers)
+    assert res.status_code == 200
+    timing = res.headers["server-timing"]
+    assert timing.startswith("sql;dur=")
+    assert "stats;dur=" in timing and "auth;dur=" in timing
+    assert request_statements.count(*labels) == before + 1
+    assert request_statements.total(*labels) > 0
+    assert section_seconds.count("stats") == stats_before + 1
+
+    body = client.get("/metrics").text
+    assert (
+        'http_request_duration_seconds_count{method="GET",route="/stats/daily"}'
+        in body
+    )
+    assert 'section_duration_seconds_bucket{section="password_hash",le="+Inf"}' in body
+    assert "db_statements_total" in body
+
+
+def test_x_profile_returns_a_profile_only_when_enabled(monkeypatch):
+    client = build_test_client()
+    headers = {"Authorization": f"Bearer {login(client)}", "X-Profile": "text"}
+    res = client.get("/pets", headers=headers)
+    assert res.headers["content-type"] == "application/json"
+
+    monkeypatch.setattr(settings, "profiling_enabled", True)
+    res = client.get("/pets", headers=headers)
+    assert res.status_code == 200 and res.headers["x-profile-status"] == "200"
+    assert "function calls" in res.text and "list_pets" in res.text
+
+    res = client.get("/stats/daily?date=bad", headers={**headers, "X-Profile": "prof"})
+    assert res.headers["x-profile-status"] == "400"
+    assert res.headers["content-type"] == "application/octet-stream"
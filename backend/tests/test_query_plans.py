@@ -0,0 +1,143 @@
+import re
+from datetime import date, datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, create_engine, Session
+
+from app.main import create_app
+from app.models.entities import Activity, ActivityType, StreakState
+from app.services.rollups import raw_daily_totals
+from app.services.stats import daily_stats, stats_series, weekly_stats
+from app.services.streaks import compute_streak
+from app.utils import db as db_utils
+
+# "SCAN activity" without "USING ... INDEX" is a full table scan
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+
+def build_engine():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def capture_selects(engine):
+    captured = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    return captured
+
+
+def full_scans(engine, captured) -> list[tuple[str, str]]:
+    scans = []
+    with engine.connect() as conn:
+        raw = conn.connection.driver_connection
+        for statement, parameters in captured:
+            for row in raw.execute(f"EXPLAIN QUERY PLAN {statement}", parameters):
+                detail = row[-1]
+                if FULL_SCAN.match(detail):
+                    scans.append((detail, statement))
+    return scans
+
+
+def seed(client: TestClient) -> dict:
+    credentials = {"email": "q@example.com", "password": "secret123"}
+    client.post("/auth/signup", json=credentials)
+    res = client.post("/auth/login/json", json=credentials)
+    headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+    pet_id = client.post("/pets", json={"name": "Milo"}, headers=headers).json()["id"]
+    today = datetime.utcnow().replace(hour=8, microsecond=0)
+    for offset in range(10):
+        client.post(
+            "/activities",
+            json={
+                "pet_id": pet_id,
+                "type": "walk",
+                "amount": 10,
+                "unit": "min",
+                "started_at": (today - timedelta(days=offset)).isoformat(),
+            },
+            headers=headers,
+        )
+    return headers
+
+
+def test_api_queries_use_indexes():
+    engine = build_engine()
+
+    def get_session_override():
+        with Session(engine) as session:
+            yield session
+
+    app = create_app()
+    app.dependency_overrides[db_utils.get_session] = get_session_override
+    client = TestClient(app)
+    headers = seed(client)
+    captured = capture_selects(engine)
+
+    today = date.today().isoformat()
+    week_start = (date.today() - timedelta(days=6)).isoformat()
+    page = client.get("/activities", params={"limit": 3}, headers=headers).json()
+    for params in (
+        {"before": page["next_cursor"]},
+        {"after": page["next_cursor"]},
+        {"type": ["walk", "play"], "start": week_start},
+    ):
+        res = client.get("/activities", params=params, headers=headers)
+        assert res.status_code == 200
+    assert client.get("/pets", headers=headers).status_code == 200
+    batch = [
+        {
+            "pet_id": 1,
+            "type": "play",
+            "amount": 3,
+            "unit": "min",
+            "started_at": week_start,
+            "idempotency_key": f"k{i}",
+        }
+        for i in range(3)
+    ]
+    res = client.post("/activities/batch", json={"items": batch}, headers=headers)
+    assert res.status_code == 200
+    for url in (f"/stats/daily?date={today}", f"/stats/weekly?start={week_start}"):
+        assert client.get(url, headers=headers).status_code == 200
+    assert captured
+    assert full_scans(engine, captured) == []
+
+
+def test_stats_service_queries_use_indexes():
+    engine = build_engine()
+    with Session(engine) as session:
+        for offset in range(20):
+            session.add(
+                Activity(
+                    user_id=1,
+                    type=ActivityType.PLAY,
+                    amount=5,
+                    started_at=datetime(2024, 1, 1) + timedelta(days=offset),
+                )
+            )
+        session.commit()
+        captured = capture_selects(engine)
+        target = date(2024, 1, 20)
+        # without stored streak state every read falls back to the raw queries
+        assert session.get(StreakState, 1) is None
+        compute_streak(session, 1, target)
+        raw_daily_totals(session, 1, date(2024, 1, 1), target)
+        raw_daily_totals(session, 1)
+        daily_stats(session, 1, target)
+        weekly_stats(session, 1, date(2024, 1, 14))
+        stats_series(session, 1, date(2024, 1, 1), target, "week")
+        stats_series(session, 1, date(2024, 1, 1), target, types=[ActivityType.PLAY])
+    assert captured
+    assert full_scans(engine, captured) == []
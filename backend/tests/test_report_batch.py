@@ -0,0 +1,59 @@
+from datetime import date, datetime, timedelta
+
+from PIL import Image
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.models.entities import Activity, ActivityType, ActivityUnit, User
+from app.services.report_batch import render_reports
+from app.services.rollups import record_activity
+
+
+def _seed(engine, active_days: dict[str, list[date]]) -> dict[str, int]:
+    ids = {}
+    with Session(engine) as session:
+        for email, days in active_days.items():
+            user = User(email=email, password_hash="x")
+            session.add(user)
+            session.commit()
+            ids[email] = user.id
+            for day in days:
+                activity = Activity(
+                    user_id=user.id,
+                    type=ActivityType.WALK,
+                    unit=ActivityUnit.MIN,
+                    amount=30,
+                    started_at=datetime.combine(day, datetime.min.time()),
+                )
+                session.add(activity)
+                record_activity(session, activity)
+                session.commit()
+    return ids
+
+
+def test_batch_renders_active_users_and_skips_idle_ones(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'batch.db'}")
+    SQLModel.metadata.create_all(engine)
+    week = date(2024, 3, 4)  # a Monday
+    ids = _seed(
+        engine,
+        {
+            "a@example.com": [week, week + timedelta(days=2)],
+            "b@example.com": [week - timedelta(days=10)],  # idle this week
+            "c@example.com": [week + timedelta(days=6)],
+        },
+    )
+
+    out = tmp_path / "week"
+    result = render_reports(engine, "week", week, out, chunk_size=2, workers=0)
+    assert (result.users, result.rendered, result.skipped) == (3, 2, 1)
+    assert sorted(path.name for path in out.iterdir()) == [
+        f"{ids['a@example.com']}.png",
+        f"{ids['c@example.com']}.png",
+    ]
+
+    # the month variant, rendered on a process pool
+    out = tmp_path / "month"
+    result = render_reports(engine, "month", date(2024, 3, 1), out, workers=1)
+    assert result.rendered == 2
+    with Image.open(out / f"{ids['a@example.com']}.png") as image:
+        assert image.size == (800, 420)
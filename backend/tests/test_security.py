@@ -0,0 +1,61 @@
+import pytest
+
+from app.auth import security
+from app.auth.security import build_pwd_context, calibrate_rounds
+from app.models.entities import User
+from app.utils import db as db_utils
+from app.utils.workers import cpu_pool
+from tests.test_api import build_test_client
+
+
+@pytest.fixture
+def in_process_hashing(monkeypatch):
+    # hash on threads so the patched context is the one in use
+    cpu_pool.shutdown()
+    monkeypatch.setattr(cpu_pool, "workers", 0)
+    yield
+    cpu_pool.shutdown()
+
+
+def test_unavailable_scheme_falls_back_and_old_schemes_still_verify():
+    context = build_pwd_context("no-such-scheme", rounds=1000)
+    assert context.default_scheme() == "pbkdf2_sha256"
+    old = build_pwd_context("scrypt", rounds=4).hash("pw")
+    assert context.verify("pw", old) and context.needs_update(old)
+
+
+def test_login_rehashes_outdated_scheme_and_cost(monkeypatch, in_process_hashing):
+    monkeypatch.setattr(
+        security, "pwd_context", build_pwd_context("pbkdf2_sha256", 1000)
+    )
+    client = build_test_client()
+    credentials = {"email": "h@example.com", "password": "secret123"}
+    client.post("/auth/signup", json=credentials)
+    session = next(client.app.dependency_overrides[db_utils.get_session]())
+
+    def stored_hash() -> str:
+        session.expire_all()
+        return session.get(User, 1).password_hash
+
+    assert stored_hash().startswith("$pbkdf2-sha256$1000$")
+
+    monkeypatch.setattr(
+        security, "pwd_context", build_pwd_context("pbkdf2_sha256", 2000)
+    )
+    assert client.post("/auth/login/json", json=credentials).status_code == 200
+    assert stored_hash().startswith("$pbkdf2-sha256$2000$")
+
+    monkeypatch.setattr(security, "pwd_context", build_pwd_context("scrypt", 4))
+    wrong = {**credentials, "password": "wrong"}
+    assert client.post("/auth/login/json", json=wrong).status_code == 401
+    assert stored_hash().startswith("$pbkdf2-sha256$2000$")
+    assert client.post("/auth/login/json", json=credentials).status_code == 200
+    assert stored_hash().startswith("$scrypt$ln=4,")
+    assert client.post("/auth/login/json", json=credentials).status_code == 200
+
+
+def test_calibrate_rounds_scales_linear_and_log_costs():
+    pbkdf2 = calibrate_rounds("pbkdf2_sha256", 0.002)
+    scrypt = calibrate_rounds("scrypt", 0.002)
+    assert pbkdf2 > calibrate_rounds("pbkdf2_sha256", 0.0005)
+    assert 1 <= scrypt < 16
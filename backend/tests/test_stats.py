@@ -0,0 +1,285 @@
+import random
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+from sqlmodel import SQLModel, create_engine, Session, select
+
+from app.models.entities import Activity, ActivityType, ActivityUnit, User
+from app.schemas.stats import (
+    DailyStats,
+    ReportTotals,
+    WeeklyReportResponse,
+    WeeklyStatsItem,
+)
+from app.services.rollups import record_activity, verify_rollups
+from app.services.stats import (
+    bucket_start,
+    daily_stats,
+    period_stats,
+    period_stats_many,
+    series_bucket_count,
+    series_buckets,
+    stats_series,
+    weekly_stats,
+)
+from app.services.streaks import backfill_streaks, compute_streak, streak_for
+
+
+def build_session():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    return engine, Session(engine)
+
+
+def count_queries(engine):
+    statements = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    return statements
+
+
+def add_activity(session: Session, activity: Activity) -> None:
+    session.add(activity)
+    record_activity(session, activity)
+    session.commit()
+
+
+def seed_user(
+    session: Session, start: date, days: int, email: str = "s@example.com"
+) -> int:
+    user = User(email=email, password_hash="x")
+    session.add(user)
+    session.commit()
+    kinds = [
+        (ActivityType.WALK, ActivityUnit.MIN, 20.5),
+        (ActivityType.PLAY, ActivityUnit.MIN, 10),
+        (ActivityType.TREAT, ActivityUnit.COUNT, 2),
+        (ActivityType.CARE, ActivityUnit.NONE, 0),
+        (ActivityType.NOTE, ActivityUnit.NONE, 0),
+    ]
+    offsets = [offset for offset in range(days) if offset % 5 != 3]
+    # insert out of order so rollups and streaks see backdated writes
+    random.Random(7).shuffle(offsets)
+    for offset in offsets:
+        day = start + timedelta(days=offset)
+        day_start = datetime.combine(day, datetime.min.time())
+        for idx, (kind, unit, amount) in enumerate(kinds[: 1 + offset % 5]):
+            add_activity(
+                session,
+                Activity(
+                    user_id=user.id,
+                    type=kind,
+                    unit=unit,
+                    amount=amount + offset,
+                    started_at=day_start + timedelta(hours=idx * 5, minutes=offset),
+                ),
+            )
+    return user.id
+
+
+def raw_daily(session: Session, user_id: int, target: date) -> DailyStats:
+    # the original per-day scan over raw activities, kept here as the oracle
+    start = datetime.combine(target, datetime.min.time())
+    records = session.exec(
+        select(Activity).where(
+            Activity.user_id == user_id,
+            Activity.started_at >= start,
+            Activity.started_at < start + timedelta(days=1),
+        )
+    ).all()
+    totals = {"walk_min": 0.0, "play_min": 0.0, "treat_count": 0.0, "care_count": 0.0}
+    for act in records:
+        if act.type == ActivityType.WALK:
+            totals["walk_min"] += act.amount
+        elif act.type == ActivityType.PLAY:
+            totals["play_min"] += act.amount
+        elif act.type == ActivityType.TREAT:
+            totals["treat_count"] += act.amount
+        elif act.type == ActivityType.CARE:
+            totals["care_count"] += act.amount or 1
+    streak = compute_streak(session, user_id, target)
+    return DailyStats(date=target, **totals, streak_info=streak)
+
+
+def raw_weekly(session: Session, user_id: int, start: date):
+    days = []
+    for i in range(7):
+        day_stats = raw_daily(session, user_id, start + timedelta(days=i))
+        days.append(WeeklyStatsItem(**day_stats.dict()))
+    last_week = 0.0
+    for i in range(7):
+        prev = raw_daily(session, user_id, start - timedelta(days=7 - i))
+        last_week += prev.walk_min + prev.play_min
+    current = sum(d.walk_min + d.play_min for d in days)
+    change = (current - last_week) / last_week if last_week > 0 else None
+    for d in days:
+        d.change_vs_last_week = change
+    return WeeklyReportResponse(
+        start=start,
+        end=start + timedelta(days=6),
+        days=days,
+        totals=ReportTotals.of(days),
+    )
+
+
+def test_stats_match_raw_aggregation():
+    engine, session = build_session()
+    first = date(2024, 1, 1)
+    user_id = seed_user(session, first, 40)
+    assert verify_rollups(session, user_id) == []
+    for offset in (0, 3, 9, 20, 33, 38):
+        start = first + timedelta(days=offset)
+        expected = raw_weekly(session, user_id, start)
+        assert weekly_stats(session, user_id, start).model_dump_json() == (
+            expected.model_dump_json()
+        )
+    for offset in range(-1, 42):
+        target = first + timedelta(days=offset)
+        assert daily_stats(session, user_id, target) == raw_daily(
+            session, user_id, target
+        )
+
+
+def test_weekly_stats_query_ceiling():
+    engine, session = build_session()
+    first = date(2024, 1, 1)
+    user_id = seed_user(session, first, 40)
+    statements = count_queries(engine)
+    weekly_stats(session, user_id, first + timedelta(days=20))
+    assert len(statements) <= 2
+
+
+def test_chunked_period_stats_match_per_user():
+    engine, session = build_session()
+    first = date(2024, 1, 1)
+    user_ids = [
+        seed_user(session, first, days, f"u{days}@example.com")
+        for days in (60, 45, 20)
+    ]
+    periods = [
+        (first + timedelta(days=30), 7),
+        # a fully active previous period makes streaks reach further back
+        (first + timedelta(days=31), 2),
+        (first + timedelta(days=36), 2),
+        (date(2024, 2, 1), 29),
+    ]
+    for start, length in periods:
+        statements = count_queries(engine)
+        reports = period_stats_many(session, user_ids, start, length)
+        assert len(statements) <= 3
+        for user_id in user_ids:
+            assert reports[user_id] == period_stats(session, user_id, start, length)
+
+
+def test_incremental_streak_matches_recount():
+    engine, session = build_session()
+    user = User(email="t@example.com", password_hash="x")
+    session.add(user)
+    session.commit()
+    first = date(2024, 3, 1)
+    # forward inserts, gaps, a backdated insert that bridges two runs and
+    # one that lands inside the current run
+    for offset in (0, 1, 2, 5, 6, 7, 8, 4, 3, 12, 6, 13):
+        day = first + timedelta(days=offset)
+        started_at = datetime.combine(day, datetime.min.time())
+        add_activity(
+            session,
+            Activity(user_id=user.id, type=ActivityType.NOTE, started_at=started_at),
+        )
+        for probe in range(-1, 16):
+            target = first + timedelta(days=probe)
+            assert streak_for(session, user.id, target) == compute_streak(
+                session, user.id, target
+            )
+    assert verify_rollups(session, user.id) == []
+
+    last = first + timedelta(days=13)
+    expected = streak_for(session, user.id, last)
+    assert backfill_streaks(session) == 1
+    assert streak_for(session, user.id, last) == expected == 2
+
+
+def test_series_matches_daily_stats_for_every_bucket():
+    engine, session = build_session()
+    start = date(2024, 1, 29)
+    user_id = seed_user(session, start, 75)
+    first, last = date(2024, 2, 3), date(2024, 4, 10)
+    daily = [
+        raw_daily(session, user_id, first + timedelta(days=offset))
+        for offset in range((last - first).days + 1)
+    ]
+    statements = count_queries(engine)
+    for bucket in ("day", "week", "month"):
+        statements.clear()
+        series = stats_series(session, user_id, first, last, bucket, timezone="UTC")
+        assert len(statements) == 1
+        assert series.buckets[0] == bucket_start(first, bucket)
+        for field in ("walk_min", "play_min", "treat_count", "care_count"):
+            expected = [0.0] * len(series.buckets)
+            for day in daily:
+                expected[series.buckets.index(bucket_start(day.date, bucket))] += (
+                    getattr(day, field)
+                )
+            assert getattr(series, field) == pytest.approx(expected)
+        assert [pet.pet_id for pet in series.pets] == [None]
+        assert series.pets[0].walk_min == series.walk_min
+
+
+def test_series_filters_and_per_pet_breakdown():
+    engine, session = build_session()
+    user = User(email="p@example.com", password_hash="x")
+    session.add(user)
+    session.commit()
+    day = datetime(2024, 3, 5, 9)
+    for pet_id, kind, amount in [
+        (1, ActivityType.WALK, 10),
+        (2, ActivityType.WALK, 25),
+        (2, ActivityType.TREAT, 3),
+    ]:
+        add_activity(
+            session,
+            Activity(
+                user_id=user.id,
+                pet_id=pet_id,
+                type=kind,
+                unit=ActivityUnit.MIN,
+                amount=amount,
+                started_at=day,
+            ),
+        )
+    series = stats_series(
+        session, user.id, date(2024, 3, 1), date(2024, 3, 31), "month"
+    )
+    assert series.buckets == [date(2024, 3, 1)]
+    assert series.walk_min == [35] and series.activity_count == [3]
+    assert [(pet.pet_id, pet.walk_min, pet.treat_count) for pet in series.pets] == [
+        (1, [10], [0]),
+        (2, [25], [3]),
+    ]
+    series = stats_series(
+        session,
+        user.id,
+        date(2024, 3, 1),
+        date(2024, 3, 7),
+        "day",
+        pet_id=2,
+        types=[ActivityType.TREAT],
+    )
+    assert series.treat_count[4] == 3 and sum(series.walk_min) == 0
+    assert [pet.pet_id for pet in series.pets] == [2]
+
+
+def test_series_bucket_count_matches_buckets():
+    for start, end in (
+        (date(2024, 1, 1), date(2024, 12, 31)),
+        (date(2024, 2, 29), date(2024, 3, 4)),
+        (date(2023, 12, 31), date(2025, 1, 1)),
+        (date(2024, 3, 5), date(2024, 3, 5)),
+    ):
+        for bucket in ("day", "week", "month"):
+            buckets = series_buckets(start, end, bucket)
+            assert series_bucket_count(start, end, bucket) == len(buckets)
@@ -0,0 +1,125 @@
+import random
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from sqlmodel import SQLModel, Session, create_engine
+
+from app.models.entities import Activity, ActivityType, ActivityUnit, User
+from app.services.rollups import raw_daily_totals, record_activity, verify_rollups
+from app.services.stats import daily_stats, stats_series
+from app.services.streaks import compute_streak, streak_for
+from app.utils.timezones import day_bounds, get_zone, offset_segments
+
+NEW_YORK = get_zone("America/New_York")
+
+
+def python_local_date(moment: datetime, name: str) -> date:
+    # per-row conversion, the oracle the SQL bucketing must agree with
+    return moment.replace(tzinfo=timezone.utc).astimezone(get_zone(name)).date()
+
+
+def seed(session: Session, name: str, moments: list[datetime]) -> int:
+    user = User(email=f"{name}@example.com", password_hash="x", timezone=name)
+    session.add(user)
+    session.commit()
+    for moment in moments:
+        activity = Activity(
+            user_id=user.id,
+            type=ActivityType.WALK,
+            unit=ActivityUnit.MIN,
+            amount=10,
+            started_at=moment,
+        )
+        session.add(activity)
+        record_activity(session, activity)
+        session.commit()
+    return user.id
+
+
+def test_offset_segments_pin_dst_transitions():
+    spring = offset_segments(NEW_YORK, datetime(2024, 3, 1), datetime(2024, 4, 1))
+    assert spring == ((datetime(2024, 3, 10, 7), -5 * 3600), (None, -4 * 3600))
+    fall = offset_segments(NEW_YORK, datetime(2024, 10, 1), datetime(2024, 12, 1))
+    assert fall == ((datetime(2024, 11, 3, 6), -4 * 3600), (None, -5 * 3600))
+    # half-hour DST shift
+    lord_howe = get_zone("Australia/Lord_Howe")
+    (until, before), (_, after) = offset_segments(
+        lord_howe, datetime(2024, 4, 1), datetime(2024, 4, 30)
+    )
+    assert until == datetime(2024, 4, 6, 15) and before - after == 1800
+
+
+def test_day_bounds_on_dst_edge_days():
+    start, end = day_bounds(date(2024, 3, 10), date(2024, 3, 10), NEW_YORK)
+    assert (start, end - start) == (datetime(2024, 3, 10, 5), timedelta(hours=23))
+    start, end = day_bounds(date(2024, 11, 3), date(2024, 11, 3), NEW_YORK)
+    assert (start, end - start) == (datetime(2024, 11, 3, 4), timedelta(hours=25))
+
+
+@pytest.mark.parametrize(
+    "name", ["America/New_York", "Europe/London", "Australia/Lord_Howe", "Asia/Kolkata"]
+)
+def test_local_day_buckets_match_per_row_conversion(name):
+    session = Session(create_engine("sqlite://"))
+    SQLModel.metadata.create_all(session.get_bind())
+    rng = random.Random(name)
+    # dense around the DST edges plus a spread over the year
+    edges = [
+        datetime(2024, 3, 10, 5),
+        datetime(2024, 3, 31),
+        datetime(2024, 4, 6, 15),
+        datetime(2024, 10, 6, 15),
+        datetime(2024, 10, 27),
+        datetime(2024, 11, 3, 4),
+    ]
+    moments = [
+        edge + timedelta(minutes=rng.randint(-180, 1620))
+        for edge in edges
+        for _ in range(6)
+    ]
+    moments += [
+        datetime(2024, 1, 1) + timedelta(minutes=rng.randint(0, 525_000))
+        for _ in range(60)
+    ]
+    user_id = seed(session, name, moments)
+
+    expected: dict[date, float] = defaultdict(float)
+    for moment in moments:
+        expected[python_local_date(moment, name)] += 10
+
+    totals = raw_daily_totals(session, user_id)
+    assert {day: row["walk_min"] for day, row in totals.items()} == expected
+    assert verify_rollups(session, user_id) == []
+    for day, minutes in expected.items():
+        assert daily_stats(session, user_id, day).walk_min == minutes
+
+    first, last = date(2024, 3, 1), date(2024, 11, 30)
+    for bucket in ("day", "month"):
+        series = stats_series(session, user_id, first, last, bucket, timezone=name)
+        by_bucket: dict[date, float] = defaultdict(float)
+        for day, minutes in expected.items():
+            if first <= day <= last:
+                by_bucket[day if bucket == "day" else day.replace(day=1)] += minutes
+        assert {
+            bucket_day: value
+            for bucket_day, value in zip(series.buckets, series.walk_min)
+            if value
+        } == by_bucket
+
+
+def test_streak_follows_local_days_across_spring_forward():
+    session = Session(create_engine("sqlite://"))
+    SQLModel.metadata.create_all(session.get_bind())
+    # 23:30 local on four consecutive evenings spanning the 2024-03-10 change;
+    # in UTC these straddle midnight differently before and after the switch
+    moments = [
+        datetime(2024, 3, 9, 4, 30),  # Mar 8 23:30 EST
+        datetime(2024, 3, 10, 4, 30),  # Mar 9 23:30 EST
+        datetime(2024, 3, 11, 3, 30),  # Mar 10 23:30 EDT
+        datetime(2024, 3, 12, 3, 30),  # Mar 11 23:30 EDT
+    ]
+    user_id = seed(session, "America/New_York", moments)
+    assert streak_for(session, user_id, date(2024, 3, 11)) == 4
+    assert compute_streak(session, user_id, date(2024, 3, 11)) == 4
+    assert daily_stats(session, user_id, date(2024, 3, 12)).walk_min == 0